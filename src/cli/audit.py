@@ -0,0 +1,155 @@
+# API key audit helpers: paginated, filtered DynamoDB scans streamed page by page.
+
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from src.shared.pagination import encode_cursor, decode_cursor
+
+KEY_STATUSES = ("active", "revoked", "expired")
+
+_deserializer = TypeDeserializer()
+
+
+def build_key_filter(
+    owner: Optional[str] = None,
+    status: Optional[str] = None,
+    now: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Build the Scan filter arguments for the API keys table.
+    - owner: exact match on the 'owner' attribute
+    - status: 'revoked' matches keys with status=revoked; 'expired' matches
+      non-revoked keys whose ISO 'expiry' is in the past; 'active' matches the rest
+      (keys without a status attribute are active).
+    Filtering happens in DynamoDB so only matching items cross the network.
+    Returns an empty dict when no filters are given.
+    """
+    if status and status not in KEY_STATUSES:
+        raise ValueError(f"Unknown key status '{status}'. Use one of: {', '.join(KEY_STATUSES)}")
+    now = now or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    clauses = []
+    names: Dict[str, str] = {}
+    values: Dict[str, Any] = {}
+    if owner:
+        clauses.append("#owner = :owner")
+        names["#owner"] = "owner"
+        values[":owner"] = {"S": owner}
+    if status:
+        names["#status"] = "status"
+        values[":revoked"] = {"S": "revoked"}
+        not_revoked = "(attribute_not_exists(#status) OR #status <> :revoked)"
+        if status == "revoked":
+            clauses.append("#status = :revoked")
+        else:
+            names["#expiry"] = "expiry"
+            values[":now"] = {"S": now}
+            if status == "expired":
+                clauses.append(f"{not_revoked} AND #expiry < :now")
+            else:
+                clauses.append(
+                    f"{not_revoked} AND (attribute_not_exists(#expiry) OR #expiry >= :now)"
+                )
+    if not clauses:
+        return {}
+    return {
+        "FilterExpression": " AND ".join(clauses),
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+
+
+def deserialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a low-level DynamoDB item into plain Python values."""
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+def _scan_segment(ddb, request: Dict[str, Any], start_key=None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one page dict per Scan call for a single segment, following LastEvaluatedKey.
+    Pages may be empty when the filter removes every item DynamoDB read.
+    """
+    while True:
+        kwargs = dict(request)
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        resp = ddb.scan(**kwargs)
+        start_key = resp.get("LastEvaluatedKey")
+        yield {
+            "items": [deserialize_item(i) for i in resp.get("Items", [])],
+            "next_cursor": encode_cursor(start_key),
+        }
+        if not start_key:
+            return
+
+
+def scan_key_pages(
+    ddb,
+    table_name: str,
+    owner: Optional[str] = None,
+    status: Optional[str] = None,
+    page_size: Optional[int] = None,
+    segments: int = 1,
+    cursor: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream pages of API key items from DynamoDB as they arrive.
+    Each yielded page is {"items": [...], "next_cursor": str|None, "segment": int}.
+    With segments > 1 the table is scanned in parallel (one thread per segment)
+    and pages are yielded in arrival order; resuming from a cursor is only
+    supported for a single-segment scan.
+    """
+    if segments < 1:
+        raise ValueError("segments must be >= 1")
+    if cursor and segments > 1:
+        raise ValueError("--cursor can only be used with a single segment")
+    request: Dict[str, Any] = {"TableName": table_name, **build_key_filter(owner, status)}
+    if page_size:
+        request["Limit"] = page_size
+
+    if segments == 1:
+        for page in _scan_segment(ddb, request, decode_cursor(cursor)):
+            yield {**page, "segment": 0}
+        return
+
+    pages: "queue.Queue" = queue.Queue(maxsize=segments * 2)
+    done = object()
+
+    def worker(segment):
+        try:
+            seg_request = {**request, "Segment": segment, "TotalSegments": segments}
+            for page in _scan_segment(ddb, seg_request):
+                pages.put({**page, "segment": segment})
+        except Exception as e:
+            pages.put(e)
+        finally:
+            pages.put(done)
+
+    threads = [
+        threading.Thread(target=worker, args=(s,), daemon=True) for s in range(segments)
+    ]
+    for t in threads:
+        t.start()
+    remaining = segments
+    while remaining:
+        page = pages.get()
+        if page is done:
+            remaining -= 1
+        elif isinstance(page, Exception):
+            raise page
+        else:
+            yield page
+
+
+def key_status(item: Dict[str, Any], now: Optional[str] = None) -> str:
+    """Derive the display status (active/revoked/expired) for a key item."""
+    if item.get("status") == "revoked":
+        return "revoked"
+    now = now or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    expiry = item.get("expiry")
+    if expiry and str(expiry) < now:
+        return "expired"
+    return "active"
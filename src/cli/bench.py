@@ -0,0 +1,295 @@
+# Load generator and latency report for the `pennyworth bench` command.
+
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+REQUEST_KINDS = ("chat", "embeddings", "models")
+
+PERCENTILES = (50.0, 75.0, 90.0, 95.0, 99.0, 99.9, 100.0)
+
+DEFAULT_PROMPT = "Reply with one short sentence about benchmarking."
+
+
+def parse_mix(mix: str) -> List[tuple]:
+    """
+    Parse a request mix such as "chat=70,embeddings=20,models=10" into
+    [(kind, weight), ...]. A bare kind ("chat") has weight 1.
+    """
+    entries = []
+    for part in mix.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in REQUEST_KINDS:
+            raise ValueError(
+                f"Unknown request kind '{kind}'. Use one of: {', '.join(REQUEST_KINDS)}"
+            )
+        try:
+            value = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight for '{kind}': {weight}")
+        if value < 0:
+            raise ValueError(f"Weight for '{kind}' must be >= 0")
+        entries.append((kind, value))
+    if not entries or sum(w for _, w in entries) <= 0:
+        raise ValueError("Request mix must contain at least one positive weight")
+    return entries
+
+
+def build_request(kind: str, options: Dict[str, Any]) -> tuple:
+    """Return (method, path, json_body) for one request of the given kind."""
+    if kind == "chat":
+        body = {
+            "model": options["chat_model"],
+            "messages": [{"role": "user", "content": options.get("prompt") or DEFAULT_PROMPT}],
+            "max_tokens": options.get("max_tokens", 64),
+        }
+        if options.get("stream"):
+            body["stream"] = True
+        return "POST", "/chat/completions", body
+    if kind == "embeddings":
+        return "POST", "/embeddings", {
+            "model": options["embedding_model"],
+            "input": options.get("prompt") or DEFAULT_PROMPT,
+        }
+    return "GET", "/models", None
+
+
+async def _send(client: httpx.AsyncClient, kind: str, request: tuple, scheduled: float):
+    """
+    Issue one (method, path, json_body) request and return its result record.
+    Latency is measured from the scheduled start so that queueing in the load
+    generator is not hidden (avoids coordinated omission in open-loop mode).
+    """
+    method, path, body = request
+    started = time.perf_counter()
+    record: Dict[str, Any] = {
+        "kind": kind,
+        "status": None,
+        "latency_ms": None,
+        "service_ms": None,
+        "ttft_ms": None,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "error": None,
+    }
+    try:
+        if body is not None and body.get("stream"):
+            async with client.stream(method, path, json=body) as resp:
+                record["status"] = resp.status_code
+                chunks = 0
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    if record["ttft_ms"] is None:
+                        record["ttft_ms"] = (time.perf_counter() - scheduled) * 1000
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunks += 1
+                    usage = _safe_json(data).get("usage")
+                    if usage:
+                        record["prompt_tokens"] = usage.get("prompt_tokens", 0)
+                        record["completion_tokens"] = usage.get("completion_tokens", 0)
+                if not record["completion_tokens"]:
+                    record["completion_tokens"] = chunks
+        else:
+            resp = await client.request(method, path, json=body)
+            record["status"] = resp.status_code
+            usage = _safe_json(resp.text).get("usage") or {}
+            record["prompt_tokens"] = usage.get("prompt_tokens", 0)
+            record["completion_tokens"] = usage.get("completion_tokens", 0)
+    except httpx.HTTPError as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    finished = time.perf_counter()
+    record["latency_ms"] = (finished - scheduled) * 1000
+    record["service_ms"] = (finished - started) * 1000
+    return record
+
+
+def _safe_json(text: str) -> Dict[str, Any]:
+    try:
+        value = json.loads(text)
+        return value if isinstance(value, dict) else {}
+    except ValueError:
+        return {}
+
+
+async def run_bench(
+    base_url: str,
+    mix: str = "chat",
+    duration: float = 10.0,
+    concurrency: Optional[int] = None,
+    rps: Optional[float] = None,
+    total_requests: Optional[int] = None,
+    token: Optional[str] = None,
+    arrival: str = "constant",
+    max_inflight: int = 1000,
+    seed: Optional[int] = None,
+    timeout: float = 60.0,
+    **options,
+) -> Dict[str, Any]:
+    """
+    Drive the API with a weighted mix of requests and return the raw results.
+    - rps: open-loop mode; requests are started on a fixed ("constant") or
+      exponential ("poisson") arrival schedule regardless of completions.
+      Arrivals that find max_inflight requests outstanding are counted as dropped.
+    - concurrency: closed-loop mode with that many workers (used when rps is unset).
+    The run stops after `duration` seconds or `total_requests` requests, whichever first.
+    """
+    if rps is None and not concurrency:
+        concurrency = 1
+    if rps is not None and rps <= 0:
+        raise ValueError("rps must be > 0")
+    if arrival not in ("constant", "poisson"):
+        raise ValueError("arrival must be 'constant' or 'poisson'")
+    kinds, weights = zip(*parse_mix(mix))
+    rng = random.Random(seed)
+    options.setdefault("chat_model", "claude-instant")
+    options.setdefault("embedding_model", "titan-embed-text")
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    pool = max_inflight if rps is not None else concurrency
+    limits = httpx.Limits(max_connections=pool, max_keepalive_connections=pool)
+    results: List[Dict[str, Any]] = []
+    dropped = 0
+
+    async with httpx.AsyncClient(
+        base_url=base_url.rstrip("/"), headers=headers, limits=limits, timeout=timeout
+    ) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+
+        def budget_left(issued):
+            return total_requests is None or issued < total_requests
+
+        if rps is not None:
+            tasks = set()
+            issued = 0
+            next_at = start
+            while next_at < deadline and budget_left(issued):
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if len(tasks) >= max_inflight:
+                    dropped += 1
+                else:
+                    kind = rng.choices(kinds, weights)[0]
+                    task = asyncio.create_task(_send(client, kind, build_request(kind, options), next_at))
+                    tasks.add(task)
+                    task.add_done_callback(lambda t: (tasks.discard(t), results.append(t.result())))
+                issued += 1
+                gap = rng.expovariate(rps) if arrival == "poisson" else 1.0 / rps
+                next_at += gap
+            if tasks:
+                await asyncio.gather(*tasks)
+        else:
+            counter = {"issued": 0}
+
+            async def worker():
+                while time.perf_counter() < deadline and budget_left(counter["issued"]):
+                    counter["issued"] += 1
+                    kind = rng.choices(kinds, weights)[0]
+                    results.append(
+                        await _send(client, kind, build_request(kind, options), time.perf_counter())
+                    )
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "results": results,
+        "elapsed_s": elapsed,
+        "dropped": dropped,
+        "mode": "open" if rps is not None else "closed",
+        "target_rps": rps,
+        "concurrency": concurrency if rps is None else None,
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list (None when empty)."""
+    if not sorted_values:
+        return None
+    if pct >= 100.0:
+        return sorted_values[-1]
+    rank = max(1, int(-(-pct * len(sorted_values) // 100)))
+    return sorted_values[rank - 1]
+
+
+def _distribution(values: List[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(values)
+    return {f"p{p:g}": percentile(ordered, p) for p in PERCENTILES}
+
+
+def summarize(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregate raw results into per-kind and overall latency/TTFT/token statistics."""
+    results = run["results"]
+    elapsed = run["elapsed_s"] or 1e-9
+    groups: Dict[str, List[Dict[str, Any]]] = {"all": results}
+    for r in results:
+        groups.setdefault(r["kind"], []).append(r)
+    summary: Dict[str, Any] = {
+        "mode": run["mode"],
+        "elapsed_s": round(elapsed, 3),
+        "target_rps": run["target_rps"],
+        "concurrency": run["concurrency"],
+        "dropped": run["dropped"],
+        "kinds": {},
+    }
+    for name, rows in groups.items():
+        statuses: Dict[str, int] = {}
+        for r in rows:
+            key = str(r["status"]) if r["status"] is not None else "error"
+            statuses[key] = statuses.get(key, 0) + 1
+        ok = [r for r in rows if r["status"] is not None and r["status"] < 400]
+        ttfts = [r["ttft_ms"] for r in rows if r["ttft_ms"] is not None]
+        summary["kinds"][name] = {
+            "count": len(rows),
+            "ok": len(ok),
+            "errors": len(rows) - len(ok),
+            "throughput_rps": round(len(rows) / elapsed, 2),
+            "status_codes": statuses,
+            "latency_ms": _distribution([r["latency_ms"] for r in rows]),
+            "ttft_ms": _distribution(ttfts) if ttfts else None,
+            "prompt_tokens": sum(r["prompt_tokens"] for r in rows),
+            "completion_tokens": sum(r["completion_tokens"] for r in rows),
+        }
+    return summary
+
+
+def format_report(summary: Dict[str, Any]) -> str:
+    """Render a summary as HDR-style percentile tables (one per request kind)."""
+    lines = [
+        f"mode={summary['mode']} elapsed={summary['elapsed_s']}s "
+        f"target_rps={summary['target_rps']} concurrency={summary['concurrency']} "
+        f"dropped={summary['dropped']}"
+    ]
+    for name, stats in summary["kinds"].items():
+        lines.append("")
+        lines.append(
+            f"[{name}] count={stats['count']} ok={stats['ok']} errors={stats['errors']} "
+            f"rps={stats['throughput_rps']} tokens={stats['prompt_tokens']}/{stats['completion_tokens']} "
+            f"status={stats['status_codes']}"
+        )
+        header = f"{'Percentile':>12} {'Latency(ms)':>12}"
+        if stats["ttft_ms"]:
+            header += f" {'TTFT(ms)':>12}"
+        lines.append(header)
+        for p in PERCENTILES:
+            key = f"p{p:g}"
+            row = f"{p:>11g}% {_fmt(stats['latency_ms'][key]):>12}"
+            if stats["ttft_ms"]:
+                row += f" {_fmt(stats['ttft_ms'][key]):>12}"
+            lines.append(row)
+    return "\n".join(lines)
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.2f}"
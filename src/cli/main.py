@@ -1,4 +1,5 @@
 import os
+import asyncio
 import typer
 from typing import Optional
 import requests
@@ -7,7 +8,12 @@ import boto3
 import hashlib
 import secrets
 from .auth import login_flow
+from .audit import scan_key_pages, key_status
+from .bench import run_bench, summarize, format_report
+from .replay import load_shapes, run_replay
+from .proxy import PennyworthProxy, ResponseCache, SessionCredentials, build_server
 from src.shared.constants import *
+from src.shared.session import get_session
 
 app = typer.Typer(help="Pennyworth API Key Management CLI.")
 
@@ -142,16 +148,57 @@ def revoke(
 
 @app.command()
 def audit(
-    status: Optional[str] = typer.Option(None, help="Filter by key status (active, revoked, etc.)."),
-    output: str = typer.Option("text", "--output", "-o", help="Output format: text or json.")
+    owner: Optional[str] = typer.Option(None, help="Filter by owner."),
+    status: Optional[str] = typer.Option(None, help="Filter by key status (active, revoked, expired)."),
+    page_size: int = typer.Option(100, "--page-size", help="Items read per DynamoDB Scan page."),
+    segments: int = typer.Option(1, "--segments", help="Number of parallel scan segments."),
+    cursor: Optional[str] = typer.Option(None, "--cursor", help="Resume from a cursor printed by a previous run."),
+    output: str = typer.Option("text", "--output", "-o", help="Output format: text or json (one JSON object per line).")
 ):
-    """Audit all API keys and their metadata."""
-    creds = login_flow(cognito_config)
-    # TODO: Implement audit logic using creds
-    if output == "json":
-        print(json.dumps({"aws_creds": creds}, indent=2))
-    else:
-        print("[audit] (no-op, creds obtained)")
+    """Audit all API keys and their metadata, streaming results page by page."""
+    session = get_session()
+    if not session:
+        raise RuntimeError("No valid session.")
+    protected = fetch_protected_config(session["jwt_token"])
+    creds = session["aws_credentials"]
+    ddb = boto3.Session(
+        aws_access_key_id=creds["AccessKeyId"],
+        aws_secret_access_key=creds["SecretKey"],
+        aws_session_token=creds["SessionToken"],
+        region_name=cognito_config.get("Region", "us-west-2"),
+    ).client("dynamodb")
+    count = 0
+    resume_cursor = cursor
+    pages = scan_key_pages(
+        ddb,
+        protected["ApiKeysTableName"],
+        owner=owner,
+        status=status,
+        page_size=page_size,
+        segments=segments,
+        cursor=cursor,
+    )
+    try:
+        for page in pages:
+            for item in page["items"]:
+                item["status"] = key_status(item)
+                count += 1
+                if output == "json":
+                    print(json.dumps(item, default=str), flush=True)
+                else:
+                    print(
+                        f"Hash: {item.get('api_key_hash')}  Owner: {item.get('owner')}  "
+                        f"Status: {item['status']}  Permissions: {item.get('permissions', '')}  "
+                        f"Expiry: {item.get('expiry', '')}",
+                        flush=True,
+                    )
+            resume_cursor = page["next_cursor"]
+    except KeyboardInterrupt:
+        if segments == 1 and resume_cursor:
+            typer.echo(f"[audit] interrupted; resume with --cursor {resume_cursor}", err=True)
+        raise typer.Exit(130)
+    if output != "json":
+        print(f"[audit] {count} key(s)")
 
 @app.command()
 def status(
@@ -177,5 +224,111 @@ def rotate(
     else:
         print("[rotate] (no-op)")
 
+@app.command()
+def bench(
+    url: str = typer.Option(cli_config["api_url"], "--url", help="Base API URL including the version prefix (e.g. http://localhost:8080/v1)."),
+    mix: str = typer.Option("chat", "--mix", help="Weighted request mix, e.g. chat=70,embeddings=20,models=10."),
+    duration: float = typer.Option(10.0, "--duration", help="Run length in seconds."),
+    rps: Optional[float] = typer.Option(None, "--rps", help="Open-loop target requests per second."),
+    concurrency: Optional[int] = typer.Option(None, "--concurrency", "-c", help="Closed-loop worker count (used when --rps is not set)."),
+    requests_total: Optional[int] = typer.Option(None, "--requests", "-n", help="Stop after this many requests."),
+    arrival: str = typer.Option("constant", "--arrival", help="Open-loop arrival schedule: constant or poisson."),
+    stream: bool = typer.Option(False, "--stream", help="Request streamed chat completions and record TTFT."),
+    chat_model: str = typer.Option("claude-instant", "--chat-model", help="Model for chat requests."),
+    embedding_model: str = typer.Option("titan-embed-text", "--embedding-model", help="Model for embedding requests."),
+    max_tokens: int = typer.Option(64, "--max-tokens", help="max_tokens for chat requests."),
+    token: Optional[str] = typer.Option(None, "--token", envvar="PENNYWORTH_API_KEY", help="Bearer token. Defaults to the current session JWT."),
+    seed: Optional[int] = typer.Option(None, "--seed", help="Random seed for the request mix."),
+    output: str = typer.Option("text", "--output", "-o", help="Output format: text or json.")
+):
+    """Drive the API with a request mix and report latency percentiles."""
+    if token is None:
+        session = get_session()
+        if not session:
+            raise RuntimeError("No valid session; pass --token.")
+        token = session["jwt_token"]
+    run = asyncio.run(
+        run_bench(
+            url,
+            mix=mix,
+            duration=duration,
+            concurrency=concurrency,
+            rps=rps,
+            total_requests=requests_total,
+            token=token,
+            arrival=arrival,
+            seed=seed,
+            stream=stream,
+            chat_model=chat_model,
+            embedding_model=embedding_model,
+            max_tokens=max_tokens,
+        )
+    )
+    summary = summarize(run)
+    if output == "json":
+        print(json.dumps(summary, indent=2))
+    else:
+        print(format_report(summary))
+
+@app.command()
+def replay(
+    capture: str = typer.Argument(..., help="Capture file: JSONL request shapes, or exported log lines containing them."),
+    url: str = typer.Option(cli_config["api_url"], "--url", help="Base API URL including the version prefix (e.g. http://localhost:8080/v1)."),
+    speedup: float = typer.Option(1.0, "--speedup", help="Divide captured inter-arrival times by this factor."),
+    model: Optional[str] = typer.Option(None, "--model", help="Send every request to this model instead of the captured one."),
+    limit: Optional[int] = typer.Option(None, "--limit", "-n", help="Replay only the first N captured requests."),
+    token: Optional[str] = typer.Option(None, "--token", envvar="PENNYWORTH_API_KEY", help="Bearer token. Defaults to the current session JWT."),
+    output: str = typer.Option("text", "--output", "-o", help="Output format: text or json.")
+):
+    """Re-drive captured production traffic and report latency percentiles."""
+    if token is None:
+        session = get_session()
+        if not session:
+            raise RuntimeError("No valid session; pass --token.")
+        token = session["jwt_token"]
+    shapes = load_shapes(capture)[:limit]
+    run = asyncio.run(run_replay(url, shapes, speedup=speedup, token=token, model=model))
+    summary = summarize(run)
+    summary["skipped"] = run["skipped"]
+    if output == "json":
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"replayed {len(shapes) - run['skipped']} of {len(shapes)} captured requests at {speedup:g}x")
+        print(format_report(summary))
+
+@app.command()
+def proxy(
+    port: int = typer.Option(PENNYWORTH_PROXY_PORT, "--port", "-p", help="Local port to listen on."),
+    host: str = typer.Option("127.0.0.1", "--host", help="Local address to listen on."),
+    url: str = typer.Option(cli_config["api_url"], "--url", help="Deployed API base URL including the version prefix."),
+    pool_size: int = typer.Option(16, "--pool-size", help="Keep-alive connections held open to the API."),
+    cache: bool = typer.Option(False, "--cache", help="Answer repeated non-streaming requests from a local cache."),
+    cache_ttl: float = typer.Option(300.0, "--cache-ttl", help="Seconds a cached response stays valid."),
+    cache_size: int = typer.Option(512, "--cache-size", help="Most responses kept in the cache."),
+):
+    """Run a local OpenAI-compatible endpoint that forwards to the API with your session."""
+    session = get_session()
+    if not session:
+        raise RuntimeError("No valid session.")
+    credentials = SessionCredentials(session, margin=PENNYWORTH_PROXY_REFRESH_MARGIN_SECONDS)
+    forwarder = PennyworthProxy(
+        url,
+        credentials,
+        pool_size=pool_size,
+        cache=ResponseCache(cache_size, cache_ttl) if cache else None,
+    )
+    httpd = build_server(forwarder, host, port)
+    credentials.start()
+    print(f"[proxy] http://{host}:{httpd.server_address[1]}/v1 -> {url}" + (" (cache on)" if cache else ""), flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        forwarder.close()
+        if cache:
+            print(f"[proxy] cache hits: {forwarder.cache.hits}, misses: {forwarder.cache.misses}")
+
 if __name__ == "__main__":
     app() 
\ No newline at end of file
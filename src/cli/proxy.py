@@ -0,0 +1,325 @@
+# Local OpenAI-compatible proxy for the `pennyworth proxy` command. Editors and
+# tools talk plain HTTP to http://localhost:PORT/v1; the proxy forwards each
+# request to the deployed API over a pool of keep-alive connections, adding the
+# session's JWT, which it renews in the background before it expires (and
+# before a request, should the background renewal have been missed). With
+# caching on, identical non-streaming requests are answered from memory.
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from src.shared.session import refresh_session
+
+# Headers that describe one connection rather than the request, plus the ones
+# the proxy sets itself.
+HOP_BY_HOP = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+    "content-encoding",
+}
+
+CACHEABLE_POSTS = ("/chat/completions", "/completions", "/embeddings")
+
+CACHE_HEADER = "X-Pennyworth-Proxy-Cache"
+
+
+def _jwt_expiry(token: str) -> Optional[float]:
+    """The `exp` claim of a JWT (not verified; the API does that), or None."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def session_expiry(session: Dict[str, Any]) -> float:
+    """Epoch seconds at which the first of the session's JWT and AWS credentials expires (0 if unknown)."""
+    expiries = []
+    jwt_exp = _jwt_expiry(session.get("jwt_token") or "")
+    if jwt_exp is not None:
+        expiries.append(jwt_exp)
+    expiration = (session.get("aws_credentials") or {}).get("Expiration")
+    if hasattr(expiration, "timestamp"):
+        expiries.append(expiration.timestamp())
+    elif isinstance(expiration, str):
+        try:
+            parsed = datetime.fromisoformat(expiration.replace("Z", "+00:00"))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            expiries.append(parsed.timestamp())
+        except ValueError:
+            pass
+    return min(expiries) if expiries else 0.0
+
+
+class SessionCredentials:
+    """
+    The bearer token for upstream calls. A daemon thread renews the session
+    (see refresh_session) once it is within `margin` seconds of expiring, so
+    requests never wait on Cognito.
+    """
+
+    def __init__(
+        self,
+        session: Dict[str, Any],
+        margin: float = 300.0,
+        interval: float = 30.0,
+        refresh: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]] = refresh_session,
+    ):
+        self.session = session
+        self.margin = margin
+        self.interval = interval
+        self._refresh = refresh
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def token(self) -> str:
+        with self._lock:
+            return self.session["jwt_token"]
+
+    def fresh_token(self, now: Optional[float] = None, skew: float = 30.0) -> str:
+        """
+        The bearer token, renewed first if its JWT expires within `skew` seconds:
+        the background renewal is missed when the machine sleeps or it fails.
+        """
+        now = time.time() if now is None else now
+        expires = _jwt_expiry(self.token())
+        if expires is not None and expires - now <= skew:
+            with self._refreshing:
+                # Another request may have renewed it while this one waited.
+                expires = _jwt_expiry(self.token())
+                if expires is not None and expires - now <= skew:
+                    self.refresh_now()
+        return self.token()
+
+    def refresh_now(self) -> bool:
+        """Renew the session immediately; returns False (keeping the old one) on failure."""
+        with self._lock:
+            current = self.session
+        renewed = self._refresh(current)
+        if not renewed:
+            return False
+        with self._lock:
+            self.session = renewed
+        return True
+
+    def refresh_if_needed(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        with self._lock:
+            expires = session_expiry(self.session)
+        if expires - now > self.margin:
+            return False
+        if not self.refresh_now():
+            print(f"[proxy] session refresh failed; current session expires in {max(expires - now, 0):.0f}s")
+            return False
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pennyworth-proxy-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_if_needed()
+            self._stop.wait(self.interval)
+
+
+class ResponseCache:
+    """In-memory LRU cache of complete upstream responses, each kept for `ttl` seconds."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(method: str, path: str, body: bytes) -> Optional[str]:
+        """Cache key for a request, or None if its response must not be cached."""
+        if method == "GET":
+            if not path.split("?")[0].rstrip("/").endswith("/models"):
+                return None
+        elif method == "POST" and path.split("?")[0].endswith(CACHEABLE_POSTS):
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                return None
+            if not isinstance(payload, dict) or payload.get("stream"):
+                return None
+        else:
+            return None
+        return hashlib.sha256(b"\n".join([method.encode(), path.encode(), body or b""])).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, response: tuple):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class PennyworthProxy:
+    """Forwards local /v1 requests to `api_url` (which includes the version prefix)."""
+
+    def __init__(
+        self,
+        api_url: str,
+        credentials: SessionCredentials,
+        pool_size: int = 16,
+        cache: Optional[ResponseCache] = None,
+        timeout: float = 300.0,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.credentials = credentials
+        self.cache = cache
+        self.client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=60
+            ),
+            timeout=httpx.Timeout(timeout, connect=10),
+        )
+
+    def upstream_url(self, path: str) -> Optional[str]:
+        """Upstream URL for a local path, or None if it is not under /v1."""
+        if path != "/v1" and not path.startswith(("/v1/", "/v1?")):
+            return None
+        return self.api_url + path[len("/v1"):]
+
+    def send(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> httpx.Response:
+        """Send a request upstream with the session token; the response is left open for streaming."""
+        url = self.upstream_url(path)
+        forwarded = {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP | {"authorization"}}
+        for attempt in range(2):
+            forwarded["Authorization"] = f"Bearer {self.credentials.fresh_token()}"
+            request = self.client.build_request(method, url, headers=forwarded, content=body or None)
+            response = self.client.send(request, stream=True)
+            # A token can be revoked or expire early (the API answers 403 for an
+            # expired JWT); renew once and retry.
+            if response.status_code not in (401, 403) or attempt or not self.credentials.refresh_now():
+                return response
+            response.close()
+
+    def close(self):
+        self.credentials.stop()
+        self.client.close()
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._proxy()
+
+    def do_POST(self):
+        self._proxy()
+
+    def do_PUT(self):
+        self._proxy()
+
+    def do_DELETE(self):
+        self._proxy()
+
+    def _send(self, status, headers, body, extra=None):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        for name, value in (extra or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _proxy(self):
+        proxy = self.server.proxy
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if proxy.upstream_url(self.path) is None:
+            message = json.dumps({"message": "Not Found"}).encode()
+            return self._send(404, [("Content-Type", "application/json")], message)
+
+        key = proxy.cache.key(self.command, self.path, body) if proxy.cache is not None else None
+        if key is not None:
+            cached = proxy.cache.get(key)
+            if cached is not None:
+                status, headers, content = cached
+                return self._send(status, headers, content, {CACHE_HEADER: "hit"})
+
+        try:
+            response = proxy.send(self.command, self.path, dict(self.headers), body)
+        except httpx.HTTPError as e:
+            message = json.dumps({"message": f"Upstream request failed: {e}"}).encode()
+            return self._send(502, [("Content-Type", "application/json")], message)
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in HOP_BY_HOP]
+        try:
+            if response.headers.get("content-type", "").startswith("text/event-stream"):
+                return self._stream(response, headers)
+            content = response.read()
+        finally:
+            response.close()
+        extra = None
+        if key is not None:
+            extra = {CACHE_HEADER: "miss"}
+            if response.status_code == 200:
+                proxy.cache.put(key, (response.status_code, headers, content))
+        self._send(response.status_code, headers, content, extra)
+
+    def _stream(self, response, headers):
+        """Relay a server-sent event stream chunk by chunk as it arrives."""
+        self.send_response(response.status_code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in response.iter_bytes():
+            if chunk:
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def build_server(proxy: PennyworthProxy, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """HTTP server for `proxy` (port 0 picks a free port; see server_address)."""
+    httpd = ThreadingHTTPServer((host, port), ProxyHandler)
+    httpd.daemon_threads = True
+    httpd.proxy = proxy
+    return httpd
@@ -0,0 +1,148 @@
+# Re-drives captured request shapes (capture.py) for the `pennyworth replay` command.
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .bench import _send
+
+# Captured route -> request path. Other routes are counted as skipped.
+REPLAY_ROUTES = {
+    "chat_completions": "/chat/completions",
+    "completions": "/completions",
+    "embeddings": "/embeddings",
+    "list_models": "/models",
+}
+
+FILLER = "lorem ipsum dolor sit amet "
+
+
+def _filler(chars: int) -> str:
+    """Placeholder text of exactly `chars` characters."""
+    return (FILLER * (chars // len(FILLER) + 1))[:chars]
+
+
+def _parse_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    A shape from one line of a capture: either a bare shape (file sink) or a
+    structured log record carrying it as message.shape (log sink, possibly
+    exported from CloudWatch Logs with a timestamp prefix).
+    """
+    start = line.find("{")
+    if start < 0:
+        return None
+    try:
+        record = json.loads(line[start:])
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    message = record.get("message")
+    if isinstance(message, dict) and isinstance(message.get("shape"), dict):
+        return message["shape"]
+    if isinstance(record.get("shape"), dict):
+        return record["shape"]
+    return record if "route" in record and "ts" in record else None
+
+
+def load_shapes(path: str) -> List[Dict[str, Any]]:
+    """Read a capture file and return its shapes in arrival order."""
+    shapes = []
+    with open(path) as f:
+        for line in f:
+            shape = _parse_line(line)
+            if shape is not None:
+                shapes.append(shape)
+    shapes.sort(key=lambda s: s["ts"])
+    return shapes
+
+
+def build_replay_request(shape: Dict[str, Any], model: Optional[str] = None) -> Optional[tuple]:
+    """
+    Return (method, path, json_body) reproducing the shape's sizes with filler
+    text, or None if its route is not replayable. `model` overrides the
+    captured model (e.g. to replay against a deployment with other models).
+    """
+    path = REPLAY_ROUTES.get(shape.get("route"))
+    if path is None:
+        return None
+    if shape["route"] == "list_models":
+        return "GET", path, None
+    body: Dict[str, Any] = {"model": model or shape.get("model")}
+    if shape["route"] == "embeddings":
+        body["input"] = [_filler(n) for n in shape.get("input_chars") or [0]]
+        return "POST", path, body
+    if shape["route"] == "chat_completions":
+        sizes = shape.get("message_chars") or [0]
+        roles = ["user" if (len(sizes) - i) % 2 else "assistant" for i in range(len(sizes))]
+        body["messages"] = [{"role": r, "content": _filler(n)} for r, n in zip(roles, sizes)]
+    else:
+        body["prompt"] = _filler(shape.get("prompt_chars") or 0)
+    max_tokens = shape.get("max_tokens") or shape.get("completion_tokens")
+    if max_tokens:
+        body["max_tokens"] = max_tokens
+    if shape.get("stream"):
+        body["stream"] = True
+    return "POST", path, body
+
+
+async def run_replay(
+    base_url: str,
+    shapes: List[Dict[str, Any]],
+    speedup: float = 1.0,
+    token: Optional[str] = None,
+    model: Optional[str] = None,
+    max_inflight: int = 1000,
+    timeout: float = 60.0,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> Dict[str, Any]:
+    """
+    Replay shapes open-loop at their captured inter-arrival times divided by
+    `speedup`, and return raw results in the same form as run_bench (the
+    request kind is the captured route). Arrivals that find max_inflight
+    requests outstanding are counted as dropped.
+    """
+    if speedup <= 0:
+        raise ValueError("speedup must be > 0")
+    requests = [(s, build_replay_request(s, model)) for s in shapes]
+    skipped = sum(1 for _, r in requests if r is None)
+    requests = [(s, r) for s, r in requests if r is not None]
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=max_inflight, max_keepalive_connections=max_inflight)
+    results: List[Dict[str, Any]] = []
+    dropped = 0
+    span = (requests[-1][0]["ts"] - requests[0][0]["ts"]) / speedup if requests else 0.0
+
+    async with httpx.AsyncClient(
+        base_url=base_url.rstrip("/"), headers=headers, limits=limits, timeout=timeout, transport=transport
+    ) as client:
+        start = time.perf_counter()
+        tasks = set()
+        for shape, request in requests:
+            scheduled = start + (shape["ts"] - requests[0][0]["ts"]) / speedup
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(tasks) >= max_inflight:
+                dropped += 1
+                continue
+            task = asyncio.create_task(_send(client, shape["route"], request, scheduled))
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), results.append(t.result())))
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "results": results,
+        "elapsed_s": elapsed,
+        "dropped": dropped,
+        "skipped": skipped,
+        "mode": "replay",
+        "target_rps": round(len(requests) / span, 2) if span > 0 else None,
+        "concurrency": None,
+        "speedup": speedup,
+    }
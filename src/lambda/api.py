@@ -1,5 +1,18 @@
 import os
 import json
+import threading
+
+import timing  # First, so the init phase covers the heavy imports below.
+import metrics
+import budgets
+import deadline
+import offload
+import idempotency
+import static_responses
+import tracing
+import profiling
+import capture
+import lanes
 
 from aws_lambda_powertools.event_handler import APIGatewayRestResolver, Response
 from aws_lambda_powertools.event_handler.exceptions import NotFoundError
@@ -20,6 +33,20 @@ from handlers.openai import (
     embeddings_handler,
 )
 from handlers.mcp import mcp_handler
+from handlers.files import (
+    upload_file_handler,
+    list_files_handler,
+    get_file_handler,
+    get_file_content_handler,
+    delete_file_handler,
+)
+from handlers.payloads import create_payload_handler
+from handlers.batches import (
+    create_batch_handler,
+    get_batch_handler,
+    list_batches_handler,
+    cancel_batch_handler,
+)
 from handlers.well_known import well_known_handler
 from handlers.protected import protected_handler
 from handlers.version import version_handler
@@ -36,7 +63,60 @@ from handlers.users import (
 )
 from src.shared.constants import *
 
-app = APIGatewayRestResolver()
+class ConcurrentRestResolver(APIGatewayRestResolver):
+    """
+    APIGatewayRestResolver whose per-request state (current event, Lambda
+    context, route context) is thread-local. Powertools keeps that state on
+    the shared BaseRouter class, which suits Lambda's one request per container
+    but not server.py, which resolves requests on several threads at once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        super().__init__(*args, **kwargs)
+
+    def _state(self, name, default=None):
+        if not hasattr(self._local, name):
+            setattr(self._local, name, default() if callable(default) else default)
+        return getattr(self._local, name)
+
+    current_event = property(
+        lambda self: self._state("current_event"),
+        lambda self, value: setattr(self._local, "current_event", value),
+    )
+    lambda_context = property(
+        lambda self: self._state("lambda_context"),
+        lambda self, value: setattr(self._local, "lambda_context", value),
+    )
+    context = property(
+        lambda self: self._state("context", dict),
+        lambda self, value: setattr(self._local, "context", value),
+    )
+    processed_stack_frames = property(
+        lambda self: self._state("processed_stack_frames", list),
+        lambda self, value: setattr(self._local, "processed_stack_frames", value),
+    )
+
+    def _to_proxy_event(self, event):
+        proxy_event = super()._to_proxy_event(event)
+        self.current_event = proxy_event
+        return proxy_event
+
+    def resolve(self, event, context):
+        self.lambda_context = context
+        return super().resolve(event, context)
+
+    def build_middleware_stacks(self):
+        """
+        Build every route's middleware stack up front; Powertools builds them
+        lazily on first use, which is not safe when two threads race to do it.
+        """
+        for route in self._static_routes + self._dynamic_routes:
+            if not route._middleware_stack_built:
+                route._build_middleware_stack(router_middlewares=self._router_middlewares)
+
+
+app = ConcurrentRestResolver()
 
 PENNYWORTH_API_VERSION = PENNYWORTH_API_VERSION
 API_VER = PENNYWORTH_API_VERSION  # Local alias for brevity
@@ -81,17 +161,49 @@ def public_auth_middleware(app, next_middleware):
     return next_middleware(app)
 
 
+def body_reference_middleware(app, next_middleware):
+    """
+    Replaces the JSON body with the payload named by the X-Pennyworth-Body-Ref
+    header (an s3:// reference from POST /payloads), for requests too large to
+    send through API Gateway and Lambda directly.
+    """
+    ref = app.current_event.headers.get(offload.BODY_REF_HEADER)
+    if ref:
+        # json_body is a cached property; prime it so routes read the payload.
+        app.current_event.__dict__["json_body"] = offload.load_json_reference(ref)
+    return next_middleware(app)
+
+
 # Register global middlewares (order matters if you want stacking)
 # Example: app.use([user_session_middleware, ...])
 # Add or remove as needed for your routes
 app.use(
     [
-        # Add global middlewares here if needed
+        body_reference_middleware,
+        idempotency.idempotency_middleware,
     ]
 )
 
 
 # --- SafeResponse utility ---
+def _loggable(body):
+    """Response body for logging; binary content is summarized by its size."""
+    return f"<{len(body)} bytes>" if isinstance(body, bytes) else body
+
+
+# Longest response body lambda_handler logs in full; longer ones (e.g. the
+# pre-encoded model list) are summarized by their size.
+LOG_BODY_CHARS = 1024
+
+
+def _loggable_response(response):
+    """A resolved proxy response for logging, without its body if that is long."""
+    body = response.get("body")
+    if isinstance(body, str) and len(body) > LOG_BODY_CHARS:
+        response = {**response, "body": f"<{len(body)} chars>"}
+    return str(response)
+
+
 def SafeResponse(*, status_code, body=None, message=None, exception=None, **kwargs):
     """
     Ensures the response body is a JSON string for API Gateway, logs the response, and can handle normal payloads, messages, or exceptions.
@@ -105,13 +217,14 @@ def SafeResponse(*, status_code, body=None, message=None, exception=None, **kwar
         logger.info({"status": status_code, "message": message})
     elif body is not None:
         response_body = body
-        logger.info({"status": status_code, "body": body})
+        logger.info({"status": status_code, "body": _loggable(body)})
     else:
         response_body = {}
         logger.info({"status": status_code, "body": {}})
 
-    if not isinstance(response_body, str):
-        response_body = json.dumps(response_body)
+    if not isinstance(response_body, (str, bytes)):
+        with timing.phase("encode"):
+            response_body = json.dumps(response_body)
 
     return Response(status_code=status_code, body=response_body, **kwargs)
 
@@ -119,94 +232,160 @@ def SafeResponse(*, status_code, body=None, message=None, exception=None, **kwar
 # --- Handler utility ---
 def wrap_handler(handler, *args, **kwargs):
     """
-    Calls the given handler function, expecting a (body, status) tuple,
-    and returns a properly formatted Response for API Gateway.
+    Calls the given handler function, expecting a (body, status) or
+    (body, status, headers) tuple, and returns a properly formatted Response
+    for API Gateway.
     This reduces boilerplate in endpoint functions.
     """
-    body, status = handler(*args, **kwargs)
-    logger.info({"msg": "wrap_handler returning", "body": body, "status": status})
-    return SafeResponse(status_code=status, body=body)
+    invocation = metrics.current()
+    if invocation is not None:
+        invocation.set_route(handler.__name__.removesuffix("_handler"))
+    body, status, *rest = handler(*args, **kwargs)
+    headers = rest[0] if rest else None
+    logger.info({"msg": "wrap_handler returning", "body": _loggable(body), "status": status})
+    return SafeResponse(status_code=status, body=body, headers=headers)
 
 
 # --- OpenAI-compatible endpoints ---
 
 
-@tracer.capture_method
 @app.get(f"/{API_VER}/models")
+@tracing.capture("route")
 def list_models():
-    return wrap_handler(list_models_handler)
+    return static_responses.respond("list_models", app.current_event)
 
 
-@tracer.capture_method
 @app.post(f"/{API_VER}/chat/completions")
+@tracing.capture("route")
 def chat_completions():
     return wrap_handler(chat_completions_handler, app.current_event.json_body or {})
 
 
-@tracer.capture_method
 @app.post(f"/{API_VER}/completions")
+@tracing.capture("route")
 def completions():
     return wrap_handler(completions_handler, app.current_event.json_body or {})
 
 
-@tracer.capture_method
 @app.post(f"/{API_VER}/embeddings")
+@tracing.capture("route")
 def embeddings():
     return wrap_handler(embeddings_handler, app.current_event.json_body or {})
 
 
+# --- Files and batches endpoints ---
+
+
+@app.post(f"/{API_VER}/files")
+@tracing.capture("route")
+def upload_file():
+    return wrap_handler(upload_file_handler, app.current_event)
+
+
+@app.get(f"/{API_VER}/files")
+@tracing.capture("route")
+def list_files():
+    return wrap_handler(list_files_handler, app.current_event)
+
+
+@app.get(f"/{API_VER}/files/<file_id>")
+@tracing.capture("route")
+def get_file(file_id):
+    return wrap_handler(get_file_handler, app.current_event, file_id)
+
+
+@app.get(f"/{API_VER}/files/<file_id>/content")
+@tracing.capture("route")
+def get_file_content(file_id):
+    return wrap_handler(get_file_content_handler, app.current_event, file_id)
+
+
+@app.delete(f"/{API_VER}/files/<file_id>")
+@tracing.capture("route")
+def delete_file(file_id):
+    return wrap_handler(delete_file_handler, app.current_event, file_id)
+
+
+@app.post(f"/{API_VER}/batches")
+@tracing.capture("route")
+def create_batch():
+    return wrap_handler(create_batch_handler, app.current_event)
+
+
+@app.get(f"/{API_VER}/batches")
+@tracing.capture("route")
+def list_batches():
+    return wrap_handler(list_batches_handler, app.current_event)
+
+
+@app.get(f"/{API_VER}/batches/<batch_id>")
+@tracing.capture("route")
+def get_batch(batch_id):
+    return wrap_handler(get_batch_handler, app.current_event, batch_id)
+
+
+@app.post(f"/{API_VER}/batches/<batch_id>/cancel")
+@tracing.capture("route")
+def cancel_batch(batch_id):
+    return wrap_handler(cancel_batch_handler, app.current_event, batch_id)
+
+
+@app.post(f"/{API_VER}/payloads")
+@tracing.capture("route")
+def create_payload():
+    return wrap_handler(create_payload_handler)
+
+
 # --- MCP endpoints ---
 
 
-@tracer.capture_method
 @app.route(
-    f"/{API_VER}/mcp/{{proxy+}}",
+    f"/{API_VER}/mcp/<server>",
     method=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
 )
-def mcp():
-    return wrap_handler(mcp_handler, app.current_event.path)
+@tracing.capture("route")
+def mcp(server):
+    return wrap_handler(mcp_handler, app.current_event, server)
 
 
 # --- Parameters endpoints ---
 
 
-@tracer.capture_method
 @app.get(f"/{API_VER}/parameters/well-known")
+@tracing.capture("route")
 def well_known():
-    return wrap_handler(well_known_handler)
+    return static_responses.respond("well_known", app.current_event)
 
 
-@tracer.capture_method
 @app.get(f"/{API_VER}/parameters/protected")
+@tracing.capture("route")
 def protected():
     return wrap_handler(protected_handler)
 
 
-@tracer.capture_method
 @app.get(f"/{API_VER}/version")
+@tracing.capture("route")
 def version():
-    return wrap_handler(version_handler)
+    return static_responses.respond("version", app.current_event)
 
 
 # --- Users endpoints ---
 
 
-@tracer.capture_method
 @app.post(f"/{API_VER}/users")
+@tracing.capture("route")
 def create_user():
-    return wrap_handler(
-        create_user_handler, app.current_event, app.current_event.json_body or {}
-    )
+    return wrap_handler(create_user_handler, app.current_event)
 
 
-@tracer.capture_method
 @app.get(f"/{API_VER}/users/{{user_id}}")
+@tracing.capture("route")
 def get_user(user_id):
     return wrap_handler(get_user_handler, app.current_event, user_id)
 
 
-@tracer.capture_method
 @app.put(f"/{API_VER}/users/{{user_id}}")
+@tracing.capture("route")
 def update_user(user_id):
     return wrap_handler(
         update_user_handler,
@@ -216,64 +395,121 @@ def update_user(user_id):
     )
 
 
-@tracer.capture_method
 @app.delete(f"/{API_VER}/users/{{user_id}}")
+@tracing.capture("route")
 def delete_user(user_id):
     return wrap_handler(delete_user_handler, app.current_event, user_id)
 
 
-@tracer.capture_method
 @app.get(f"/{API_VER}/users")
+@tracing.capture("route")
 def list_users():
     return wrap_handler(list_users_handler, app.current_event)
 
 
-@tracer.capture_method
 @app.post(f"/{API_VER}/users/{{user_id}}/apikey")
+@tracing.capture("route")
 def create_or_rotate_apikey(user_id):
     return wrap_handler(create_or_rotate_apikey_handler, app.current_event, user_id)
 
 
-@tracer.capture_method
 @app.delete(f"/{API_VER}/users/{{user_id}}/apikey")
+@tracing.capture("route")
 def revoke_apikey(user_id):
     return wrap_handler(revoke_apikey_handler, app.current_event, user_id)
 
 
-@tracer.capture_method
 @app.get(f"/{API_VER}/users/{{user_id}}/apikey")
+@tracing.capture("route")
 def get_apikey_status(user_id):
     return wrap_handler(get_apikey_status_handler, app.current_event, user_id)
 
 
+# Metadata routes only change on deploy; they are encoded once per container.
+static_responses.register("list_models", list_models_handler, "public, max-age=300")
+static_responses.register("well_known", well_known_handler, "public, max-age=3600")
+static_responses.register("version", version_handler, "public, max-age=60")
+static_responses.warm()
+
+
 # --- Catch-all for unsupported endpoints ---
 
 
-@tracer.capture_method
 @app.not_found
+@tracing.capture("route")
 def not_found(e: NotFoundError):
+    invocation = metrics.current()
+    if invocation is not None:
+        invocation.set_route("not_found")
     return SafeResponse(status_code=404, message="Not Found")
 
 
 # --- Exception handlers ---
 
 
-@tracer.capture_method
 @app.exception_handler(APIException)
+@tracing.capture("route")
 def handle_api_exception(ex):
-    return SafeResponse(status_code=ex.status_code, exception=ex)
+    return SafeResponse(
+        status_code=ex.status_code, exception=ex, headers=getattr(ex, "headers", None)
+    )
 
 
 # --- Lambda entrypoint ---
 
 
-@tracer.capture_lambda_handler
+def add_response_header(response, name, value):
+    """
+    Adds a header to a resolved proxy response, whichever header shape
+    (multiValueHeaders for REST APIs, headers otherwise) the resolver produced.
+    """
+    if "multiValueHeaders" in response:
+        response["multiValueHeaders"][name] = [value]
+    else:
+        response.setdefault("headers", {})[name] = value
+
+
+@tracer.capture_lambda_handler(capture_response=False)
 def lambda_handler(event, context):
+    cold = timing.consume_cold_start()
+    timer = timing.start(cold)
+    invocation = metrics.start(cold)
+    tracker = budgets.start(event)
+    deadline.start(context, event.get("headers"))
+    tracing.start(event)
+    lanes.start(event)
+    shape = capture.start(event)
     logger.info({"msg": "lambda_handler invoked", "event": event})
+    status_code = 500
     try:
-        response = app.resolve(event, context)
-        logger.info({"msg": "lambda_handler returning", "response": str(response)})
+        profile = profiling.start(event, context)
+        if profile is None:
+            response = app.resolve(event, context)
+        else:
+            response = profile.run(app.resolve, event, context)
+            add_response_header(response, profiling.PROFILE_HEADER, profile.location)
+        offload.offload_response(response, add_response_header)
+        status_code = response["statusCode"]
+        if tracker is not None and tracker.checked and status_code != 429:
+            for name, value in tracker.headers().items():
+                add_response_header(response, name, value)
+        log = {"msg": "lambda_handler returning", "response": _loggable_response(response)}
+        if timer is not None:
+            add_response_header(response, "Server-Timing", timer.header())
+            log["timing"] = timer.as_log()
+        logger.info(log)
         return response
     except Exception as e:
         logger.exception({"msg": "Exception in lambda_handler", "error": str(e)})
         raise
+    finally:
+        if invocation is not None:
+            if context is not None:
+                invocation.metadata["request_id"] = context.aws_request_id
+            invocation.finish(status_code, timer)
+            invocation.flush()
+        if shape is not None:
+            shape.finish(status_code, invocation, timer)
+
+
+timing.init_complete()
@@ -3,17 +3,21 @@
 import os
 import json
 import base64
+import hashlib
 import urllib.request
 from jose import jwt
-from utils import logger, tracer
+from utils import logger
+import tracing
 from errors import ForbiddenException
+import timing
+import deadline
 import boto3
 from botocore.exceptions import ClientError
 from src.shared.constants import *
 
 
 # --- Robust Bearer Token Extraction Helper ---
-@tracer.capture_method
+@tracing.capture("auth")
 def extract_bearer_token(headers):
     """
     Extracts a Bearer token from the Authorization header.
@@ -37,7 +41,7 @@ def extract_bearer_token(headers):
 
 
 # --- API Key Authentication ---
-@tracer.capture_method
+@tracing.capture("auth")
 def require_api_key_auth(event):
     """
     Centralized API key authentication for all endpoints.
@@ -56,7 +60,7 @@ def require_api_key_auth(event):
 _JWKS = None
 
 
-@tracer.capture_method
+@tracing.capture("auth")
 def get_jwks():
     global _JWKS
     if _JWKS is not None:
@@ -65,7 +69,7 @@ def get_jwks():
     user_pool_id = PENNYWORTH_USER_POOL_ID
     jwks_url = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}/.well-known/jwks.json"
     try:
-        with urllib.request.urlopen(jwks_url) as resp:
+        with urllib.request.urlopen(jwks_url, timeout=deadline.timeout("auth", 10)) as resp:
             _JWKS = json.loads(resp.read().decode())
         return _JWKS
     except Exception as e:
@@ -73,8 +77,13 @@ def get_jwks():
         raise Exception(f"Unable to fetch or parse Cognito JWKS: {e}")
 
 
-@tracer.capture_method
+@tracing.capture("auth")
 def require_cognito_jwt(event):
+    with timing.phase("auth"):
+        return _validate_cognito_jwt(event)
+
+
+def _validate_cognito_jwt(event):
     headers = event.get("headers", {})
     token = extract_bearer_token(headers)
     if not token:
@@ -108,7 +117,51 @@ def require_cognito_jwt(event):
         raise ForbiddenException(f"Invalid or expired Cognito JWT: {e}")
 
 
-@tracer.capture_method
+@tracing.capture("auth")
+def caller_principal(event):
+    """
+    Identify the caller as (identity, claims). The identity is stable across
+    requests, for scoping per-caller state such as idempotency records and
+    budgets. A valid Cognito JWT identifies its user (claims are its decoded
+    claims); any other bearer token (an API key) is identified by its SHA-256
+    digest, and unauthenticated requests by source IP (claims are None).
+    """
+    token = extract_bearer_token(event.get("headers") or {})
+    if token:
+        if token.count(".") == 2:
+            try:
+                claims = require_cognito_jwt(event)
+                return f"user:{claims.get('cognito:username') or claims['sub']}", claims
+            except ForbiddenException:
+                pass
+        return "key:" + hashlib.sha256(token.encode()).hexdigest()[:32], None
+    return _source_ip(event), None
+
+
+def _source_ip(event):
+    identity = (event.get("requestContext") or {}).get("identity") or {}
+    return f"ip:{identity.get('sourceIp') or 'unknown'}"
+
+
+def caller_identity(event):
+    """The caller's identity string from caller_principal()."""
+    return caller_principal(event)[0]
+
+
+def verified_principal(event):
+    """
+    caller_principal(), for state a caller must not be able to reset by
+    changing tokens (budgets): only a valid Cognito JWT identifies its user.
+    Any other caller, including one sending a JWT that fails verification or
+    an API key (not validated here yet), is identified by source IP.
+    """
+    identity, claims = caller_principal(event)
+    if claims is None:
+        return _source_ip(event), None
+    return identity, claims
+
+
+@tracing.capture("auth")
 def get_user_boto3_session(event):
     """
     Given a Lambda event, extract the Cognito JWT and exchange it for AWS credentials
@@ -128,20 +181,23 @@ def get_user_boto3_session(event):
     if not identity_pool_id or not region or not user_pool_id:
         raise ForbiddenException("Missing Cognito Identity Pool configuration.")
 
-    cognito_identity = boto3.client("cognito-identity", region_name=region)
-    try:
-        resp = cognito_identity.get_id(
-            IdentityPoolId=identity_pool_id,
-            Logins={f"cognito-idp.{region}.amazonaws.com/{user_pool_id}": token},
-        )
-        identity_id = resp["IdentityId"]
-        creds_resp = cognito_identity.get_credentials_for_identity(
-            IdentityId=identity_id,
-            Logins={f"cognito-idp.{region}.amazonaws.com/{user_pool_id}": token},
+    with timing.phase("cred"):
+        cognito_identity = boto3.client(
+            "cognito-identity", region_name=region, config=deadline.boto_config("cred")
         )
-        creds = creds_resp["Credentials"]
-    except ClientError as e:
-        raise ForbiddenException("Could not obtain AWS credentials for user.")
+        try:
+            resp = cognito_identity.get_id(
+                IdentityPoolId=identity_pool_id,
+                Logins={f"cognito-idp.{region}.amazonaws.com/{user_pool_id}": token},
+            )
+            identity_id = resp["IdentityId"]
+            creds_resp = cognito_identity.get_credentials_for_identity(
+                IdentityId=identity_id,
+                Logins={f"cognito-idp.{region}.amazonaws.com/{user_pool_id}": token},
+            )
+            creds = creds_resp["Credentials"]
+        except ClientError as e:
+            raise ForbiddenException("Could not obtain AWS credentials for user.")
 
     return boto3.Session(
         aws_access_key_id=creds["AccessKeyId"],
@@ -0,0 +1,14 @@
+# Entry point of the batch worker Lambda (PennyworthBatchWorker). Invoked
+# asynchronously with {"pennyworth_batch": {"batch_id": ...}} by the API when a
+# batch is created, and by itself to continue a batch near its deadline.
+
+import batches
+from utils import logger, tracer
+
+
+@tracer.capture_lambda_handler
+def lambda_handler(event, context):
+    batch_id = event["pennyworth_batch"]["batch_id"]
+    logger.info({"msg": "batch worker invoked", "batch_id": batch_id})
+    batch = batches.run_batch(batch_id, context)
+    return {"batch_id": batch_id, "status": batch["status"]}
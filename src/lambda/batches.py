@@ -0,0 +1,327 @@
+# OpenAI-compatible batch jobs. A batch is a JSONL file of requests processed
+# asynchronously by the batch worker Lambda (batch_worker.py) with bounded
+# parallelism. Progress is checkpointed to the object store after every chunk,
+# so a worker nearing its deadline (or retried after a crash) hands over to a
+# fresh invocation that resumes where the last one stopped.
+#
+# Object store layout, under batches/<id>/:
+#   batch.json           batch object (OpenAI fields plus internal "_progress")
+#   parts/<n>.out.jsonl  results of chunk n
+#   parts/<n>.err.jsonl  failed requests of chunk n
+# On completion the parts are joined into output/error files (see handlers/files.py).
+# A batch, and its output and error files, belong to the caller that created it
+# ("_owner"); other callers get 404 for it. Batches are listed from the
+# owner's index (listings.py). Requests are charged to the spend budgets of the
+# caller that created the batch ("_budget", see budgets.py) and each runs under
+# its own deadline (PENNYWORTH_BATCH_REQUEST_TIMEOUT_SECONDS).
+
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import boto3
+
+from errors import APIException, BadRequestException, NotFoundException
+from handlers.files import create_file, get_file_content, get_file_meta
+from handlers.openai import chat_completions_handler, completions_handler, embeddings_handler
+from storage import get_object_store
+from utils import logger
+import budgets
+import deadline
+import lanes
+import listings
+import tracing
+from src.shared.constants import *
+
+ENDPOINT_HANDLERS = {
+    f"/{PENNYWORTH_API_VERSION}/chat/completions": chat_completions_handler,
+    f"/{PENNYWORTH_API_VERSION}/completions": completions_handler,
+    f"/{PENNYWORTH_API_VERSION}/embeddings": embeddings_handler,
+}
+
+COMPLETION_WINDOWS = {"24h": 24 * 3600}
+MAX_REQUESTS = 50000
+MAX_REPORTED_ERRORS = 100
+TERMINAL_STATUSES = ("failed", "completed", "expired", "cancelled")
+ACTIVE_STATUSES = ("validating", "in_progress")
+
+
+def _batch_key(batch_id):
+    return f"batches/{batch_id}/batch.json"
+
+
+def _part_key(batch_id, part, kind):
+    return f"batches/{batch_id}/parts/{part:05d}.{kind}.jsonl"
+
+
+def load_batch(batch_id, owner=None):
+    """A batch; with `owner`, raises NotFoundException unless the batch is theirs."""
+    raw = get_object_store().get(_batch_key(batch_id))
+    batch = json.loads(raw) if raw is not None else None
+    if batch is None or (owner is not None and batch.get("_owner") != owner):
+        raise NotFoundException(f"No such batch: '{batch_id}'.")
+    return batch
+
+
+def save_batch(batch):
+    get_object_store().put(_batch_key(batch["id"]), json.dumps(batch), "application/json")
+
+
+def public_view(batch):
+    """The batch object as returned by the API (internal fields removed)."""
+    return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+
+def list_batches(owner, limit, after=None):
+    """(`owner`'s batches after `after`, newest first, at most `limit`; whether more follow)."""
+    ids, has_more = listings.page(listings.ids("batches", owner), limit, after)
+    store = get_object_store()
+    raws = (store.get(_batch_key(batch_id)) for batch_id in ids)
+    return [json.loads(raw) for raw in raws if raw is not None], has_more  # None: expired.
+
+
+@tracing.capture("handler")
+def create_batch(
+    input_file_id, endpoint, completion_window="24h", metadata=None, owner=None, budget=None
+):
+    """`budget`: the creator's budget subjects (budgets.subjects()), charged for its requests."""
+    if endpoint not in ENDPOINT_HANDLERS:
+        raise BadRequestException(
+            f"Unsupported endpoint '{endpoint}'; use one of {', '.join(ENDPOINT_HANDLERS)}."
+        )
+    if completion_window not in COMPLETION_WINDOWS:
+        raise BadRequestException("completion_window must be '24h'.")
+    if get_file_meta(input_file_id, owner)["purpose"] != "batch":
+        raise BadRequestException(f"File '{input_file_id}' was not uploaded with purpose 'batch'.")
+    now = int(time.time())
+    batch = {
+        "id": f"batch_{uuid.uuid4().hex}",
+        "object": "batch",
+        "endpoint": endpoint,
+        "errors": None,
+        "input_file_id": input_file_id,
+        "completion_window": completion_window,
+        "status": "validating",
+        "output_file_id": None,
+        "error_file_id": None,
+        "created_at": now,
+        "in_progress_at": None,
+        "expires_at": now + COMPLETION_WINDOWS[completion_window],
+        "finalizing_at": None,
+        "completed_at": None,
+        "failed_at": None,
+        "expired_at": None,
+        "cancelling_at": None,
+        "cancelled_at": None,
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        "metadata": metadata,
+        "_progress": {"next": 0, "parts": 0},
+        "_owner": owner,
+        "_budget": budget,
+    }
+    save_batch(batch)
+    if owner is not None:
+        listings.add("batches", owner, now, batch["id"])
+    dispatch(batch["id"])
+    return batch
+
+
+def cancel_batch(batch_id, owner=None):
+    batch = load_batch(batch_id, owner)
+    if batch["status"] in ACTIVE_STATUSES:
+        batch["status"] = "cancelling"
+        batch["cancelling_at"] = int(time.time())
+        save_batch(batch)
+    return batch
+
+
+def dispatch(batch_id, function_name=None):
+    """
+    Start (or continue) processing a batch asynchronously: an Event invocation
+    of the batch worker Lambda, or a background thread when running locally.
+    """
+    function_name = function_name or PENNYWORTH_BATCH_FUNCTION
+    if function_name:
+        client = boto3.client("lambda", region_name=PENNYWORTH_AWS_REGION)
+        client.invoke(
+            FunctionName=function_name,
+            InvocationType="Event",
+            Payload=json.dumps({"pennyworth_batch": {"batch_id": batch_id}}).encode(),
+        )
+    else:
+        threading.Thread(target=run_batch, args=(batch_id,), daemon=True).start()
+
+
+def _parse_requests(batch, data):
+    """Parse and validate the input JSONL; returns (requests, errors)."""
+    requests, errors, seen = [], [], set()
+
+    def error(line, message):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"code": "invalid_request", "message": message, "param": None, "line": line})
+
+    for line_no, line in enumerate(data.decode().splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError:
+            error(line_no, "Line is not valid JSON.")
+            continue
+        if not isinstance(request, dict) or not isinstance(request.get("body"), dict):
+            error(line_no, "Each line needs 'custom_id', 'method', 'url' and a 'body' object.")
+            continue
+        if request.get("method", "POST") != "POST" or request.get("url") != batch["endpoint"]:
+            error(line_no, f"Requests must be POST {batch['endpoint']}.")
+            continue
+        custom_id = request.get("custom_id")
+        if not custom_id or custom_id in seen:
+            error(line_no, "Each request needs a unique 'custom_id'.")
+            continue
+        seen.add(custom_id)
+        requests.append(request)
+    if not requests and not errors:
+        error(None, "The input file contains no requests.")
+    if len(requests) > MAX_REQUESTS:
+        error(None, f"A batch may contain at most {MAX_REQUESTS} requests.")
+    return requests, errors
+
+
+def _execute(request, budget=None, context=None):
+    """
+    Run one batch request through its endpoint handler, charged to the `budget`
+    subjects and under its own deadline; returns (ok, output line).
+    """
+    lanes.enter("batch")
+    budgets.start(None, budget)
+    deadline.start(context, seconds=PENNYWORTH_BATCH_REQUEST_TIMEOUT_SECONDS)
+    handler = ENDPOINT_HANDLERS[request["url"]]
+    line = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"], "error": None}
+    request_id = uuid.uuid4().hex
+    try:
+        body, status, *_ = handler({**request["body"], "stream": False})
+        line["response"] = {"status_code": status, "request_id": request_id, "body": body}
+        return True, line
+    except APIException as e:
+        status, message = e.status_code, str(e)
+    except Exception as e:
+        logger.exception({"msg": "batch request failed", "custom_id": request["custom_id"]})
+        status, message = 500, str(e)
+    line["response"] = {
+        "status_code": status,
+        "request_id": request_id,
+        "body": {"error": {"message": message}},
+    }
+    return False, line
+
+
+def _write_part(batch_id, part, kind, lines):
+    if lines:
+        body = "".join(json.dumps(line) + "\n" for line in lines)
+        get_object_store().put(_part_key(batch_id, part, kind), body, "application/jsonl")
+
+
+def _join_parts(batch, kind, suffix):
+    store = get_object_store()
+    prefix = f"batches/{batch['id']}/parts/"
+    keys = [k for k in store.list(prefix) if k.endswith(f".{kind}.jsonl")]
+    if not keys:
+        return None
+    data = b"".join(store.get(k) for k in keys)
+    meta = create_file(data, f"{batch['id']}_{suffix}.jsonl", "batch_output", batch.get("_owner"))
+    for key in keys:
+        store.delete(key)
+    return meta["id"]
+
+
+def _finish(batch, status):
+    now = int(time.time())
+    batch["status"] = "finalizing"
+    batch["finalizing_at"] = now
+    save_batch(batch)
+    batch["output_file_id"] = _join_parts(batch, "out", "output")
+    batch["error_file_id"] = _join_parts(batch, "err", "error")
+    batch["status"] = status
+    batch[f"{status}_at"] = int(time.time())
+    save_batch(batch)
+    logger.info({"msg": "batch finished", "batch": public_view(batch)})
+
+
+def _fail(batch, errors):
+    batch["status"] = "failed"
+    batch["failed_at"] = int(time.time())
+    batch["errors"] = {"object": "list", "data": errors}
+    save_batch(batch)
+
+
+def _merge_cancellation(batch):
+    """Pick up a cancel request saved by the API since the worker last read the batch."""
+    latest = load_batch(batch["id"])
+    if latest["status"] == "cancelling":
+        batch["status"] = "cancelling"
+        batch["cancelling_at"] = latest["cancelling_at"]
+
+
+@tracing.capture("handler")
+def run_batch(batch_id, context=None):
+    """
+    Process a batch from its last checkpoint. With a Lambda `context`, stops
+    once less than PENNYWORTH_BATCH_DEADLINE_MARGIN_MS remains and dispatches
+    a continuation invocation of the same function.
+    """
+    batch = load_batch(batch_id)
+    if batch["status"] in TERMINAL_STATUSES or batch["status"] == "finalizing":
+        return batch
+    if batch["status"] == "cancelling":
+        _finish(batch, "cancelled")
+        return batch
+
+    requests, errors = _parse_requests(batch, get_file_content(batch["input_file_id"]))
+    if errors:
+        _fail(batch, errors)
+        return batch
+    if batch["status"] == "validating":
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        batch["request_counts"]["total"] = len(requests)
+        save_batch(batch)
+
+    progress = batch["_progress"]
+    chunk_size = PENNYWORTH_BATCH_CONCURRENCY * 4
+    with ThreadPoolExecutor(max_workers=PENNYWORTH_BATCH_CONCURRENCY) as pool:
+        while progress["next"] < len(requests):
+            _merge_cancellation(batch)
+            if batch["status"] == "cancelling":
+                _finish(batch, "cancelled")
+                return batch
+            if time.time() > batch["expires_at"]:
+                _finish(batch, "expired")
+                return batch
+            if (
+                context is not None
+                and context.get_remaining_time_in_millis() < PENNYWORTH_BATCH_DEADLINE_MARGIN_MS
+            ):
+                logger.info({"msg": "batch checkpointed for continuation", "batch_id": batch_id})
+                dispatch(batch_id, context.invoked_function_arn)
+                return batch
+
+            chunk = requests[progress["next"] : progress["next"] + chunk_size]
+            # Batches created without budget subjects are not charged.
+            execute = partial(_execute, budget=batch.get("_budget") or {}, context=context)
+            results = list(pool.map(execute, chunk))
+            part = progress["parts"] + 1
+            _write_part(batch_id, part, "out", [line for ok, line in results if ok])
+            _write_part(batch_id, part, "err", [line for ok, line in results if not ok])
+            ok_count = sum(1 for ok, _ in results if ok)
+            batch["request_counts"]["completed"] += ok_count
+            batch["request_counts"]["failed"] += len(results) - ok_count
+            progress["next"] += len(chunk)
+            progress["parts"] = part
+            _merge_cancellation(batch)
+            save_batch(batch)
+
+    _finish(batch, "completed")
+    return batch
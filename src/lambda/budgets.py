@@ -0,0 +1,178 @@
+# Per-key and per-owner spend budgets. Spend is kept in atomic counters in the
+# shared state store, one per subject and calendar period (UTC day and month),
+# in micro-dollars. Before dispatch a request's projected cost is checked
+# against cached counter values (refreshed at most every
+# PENNYWORTH_BUDGET_CACHE_SECONDS), so the check normally makes no network
+# call; after the response, the actual cost is added to every counter.
+#
+# Subjects: "key" is the verified caller identity (the Cognito user, or else
+# the source IP, see auth.verified_principal); "owner" is the Cognito user's
+# custom:owner attribute, or the user itself. Batch requests are charged to the
+# subjects recorded when their batch was created (batches.py).
+
+import calendar
+import threading
+import time
+from contextvars import ContextVar
+
+from auth import verified_principal
+from errors import TooManyRequestsException
+from utils import logger
+import state
+from src.shared.constants import *
+
+_current = ContextVar("pennyworth_budget", default=None)
+
+# Counter values by state-store key: (micro-dollars spent, time fetched).
+_cache = {}
+_cache_lock = threading.Lock()
+
+MICRO = 1_000_000
+
+PERIOD_NAMES = {"day": "daily", "month": "monthly"}
+
+REMAINING_HEADERS = {
+    "day": "X-Pennyworth-Budget-Remaining-Day",
+    "month": "X-Pennyworth-Budget-Remaining-Month",
+}
+
+
+def limits():
+    """Configured limits in USD by (scope, period); 0 means unlimited."""
+    return {
+        ("key", "day"): PENNYWORTH_KEY_DAILY_BUDGET_USD,
+        ("key", "month"): PENNYWORTH_KEY_MONTHLY_BUDGET_USD,
+        ("owner", "day"): PENNYWORTH_OWNER_DAILY_BUDGET_USD,
+        ("owner", "month"): PENNYWORTH_OWNER_MONTHLY_BUDGET_USD,
+    }
+
+
+def _period(period, now):
+    """(label, seconds until the period resets) for the UTC period containing `now`."""
+    t = time.gmtime(now)
+    if period == "day":
+        label = time.strftime("%Y%m%d", t)
+        start = calendar.timegm((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0))
+        return label, start + 86400 - now
+    label = time.strftime("%Y%m", t)
+    days = calendar.monthrange(t.tm_year, t.tm_mon)[1]
+    start = calendar.timegm((t.tm_year, t.tm_mon, 1, 0, 0, 0))
+    return label, start + days * 86400 - now
+
+
+def _spent(store, key):
+    now = time.time()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and now - cached[1] < PENNYWORTH_BUDGET_CACHE_SECONDS:
+        return cached[0]
+    value = int(store.get_counter(key, "spent"))
+    with _cache_lock:
+        _cache[key] = (value, now)
+    return value
+
+
+def subjects(event):
+    """The subjects a request event is charged to, by scope."""
+    identity, claims = verified_principal(event)
+    result = {"key": identity}
+    if claims is not None:
+        result["owner"] = claims.get("custom:owner") or identity
+    return result
+
+
+class BudgetTracker:
+    """
+    Budget state for one request. The caller is identified lazily, so requests
+    that never check a budget (model listings, health checks) skip it; a
+    tracker given `subjects` charges those instead.
+    """
+
+    def __init__(self, event, subjects=None):
+        self.event = event
+        self.subjects = subjects
+        self._counters = None
+        self.checked = False
+
+    def counters(self):
+        """[(state key, limit in micro-dollars, period, seconds to reset)] for limited subjects."""
+        if self._counters is None:
+            configured = {k: v for k, v in limits().items() if v > 0}
+            self._counters = []
+            if configured:
+                if self.subjects is None:
+                    self.subjects = subjects(self.event)
+                now = time.time()
+                for (scope, period), limit in configured.items():
+                    if scope in self.subjects:
+                        label, resets = _period(period, now)
+                        key = f"spend#{scope}#{self.subjects[scope]}#{label}"
+                        self._counters.append((key, int(limit * MICRO), period, resets))
+        return self._counters
+
+    def remaining(self):
+        """Remaining USD by period (the smallest across subjects); empty if unlimited."""
+        store = state.get_store()
+        result = {}
+        for key, limit, period, _ in self.counters():
+            left = max(limit - _spent(store, key), 0) / MICRO
+            result[period] = min(result.get(period, left), left)
+        return result
+
+    def headers(self):
+        return {REMAINING_HEADERS[p]: f"{usd:.6f}" for p, usd in self.remaining().items()}
+
+    def check(self, projected_usd):
+        """Raise TooManyRequestsException (429) if `projected_usd` exceeds any remaining budget."""
+        self.checked = True
+        store = state.get_store()
+        projected = int(projected_usd * MICRO)
+        for key, limit, period, resets in self.counters():
+            if _spent(store, key) + projected > limit:
+                headers = self.headers()
+                headers["Retry-After"] = str(int(resets) + 1)
+                raise TooManyRequestsException(
+                    f"Budget exceeded: the {PERIOD_NAMES[period]} spend limit of "
+                    f"${limit / MICRO:.2f} would be exceeded by this request.",
+                    headers=headers,
+                )
+
+    def charge(self, cost_usd):
+        """Add the actual cost of the request to every counter."""
+        amount = int(round(cost_usd * MICRO))
+        if amount <= 0 or not self.counters():
+            return
+        store = state.get_store()
+        now = time.time()
+        for key, _, period, resets in self.counters():
+            # Keep counters a little past the end of their period.
+            total = store.increment(key, "spent", amount, ttl_seconds=int(resets) + 86400)
+            with _cache_lock:
+                _cache[key] = (int(total), now)
+        logger.debug({"msg": "budget charged", "usd": cost_usd})
+
+
+def start(event, subjects=None):
+    """
+    Begin budget tracking for a new request (None when no budget is configured).
+    With `subjects` (see subjects()), the request is charged to them rather than
+    to the caller of `event`.
+    """
+    if not any(v > 0 for v in limits().values()):
+        _current.set(None)
+        return None
+    tracker = BudgetTracker(event, subjects)
+    _current.set(tracker)
+    return tracker
+
+
+def current():
+    """Return the budget tracker for the request being handled, or None."""
+    return _current.get()
+
+
+def remaining_usd():
+    """Smallest remaining budget of the current caller in USD, or None if unlimited."""
+    tracker = current()
+    remaining = tracker.remaining() if tracker is not None else {}
+    return min(remaining.values()) if remaining else None
@@ -0,0 +1,116 @@
+# Traffic capture for replay. When PENNYWORTH_CAPTURE_RATE is above zero, that
+# fraction of requests is recorded as a redacted "shape": the route, model,
+# message count and sizes, stream flag, token usage, status and timing. The
+# content, headers and caller are never recorded. Shapes are written as JSON lines to
+# PENNYWORTH_CAPTURE_SINK: "log" (one structured log line each, exportable
+# from CloudWatch Logs) or a file path (appended; for server mode and local
+# runs). `pennyworth replay` re-drives a capture against a deployment.
+
+import base64
+import json
+import random
+import threading
+import time
+
+from utils import logger
+from src.shared.constants import *
+
+_file_lock = threading.Lock()
+
+
+def _text_size(content):
+    """Characters of text in an OpenAI message content (string or list of parts)."""
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, list):
+        return sum(len(part.get("text") or "") for part in content if isinstance(part, dict))
+    return 0
+
+
+def _inputs(value):
+    """Embedding inputs as a list: strings, or token arrays (lists of ints)."""
+    if isinstance(value, list) and value and all(isinstance(t, int) for t in value):
+        return [value]
+    return value if isinstance(value, list) else [value]
+
+
+def request_shape(body):
+    """The size-only description of an OpenAI request body; no content is kept."""
+    if not isinstance(body, dict):
+        return {}
+    shape = {"model": body.get("model"), "stream": bool(body.get("stream"))}
+    if body.get("max_tokens") is not None:
+        shape["max_tokens"] = body["max_tokens"]
+    messages = body.get("messages")
+    if isinstance(messages, list):
+        shape["message_chars"] = [_text_size(m.get("content")) for m in messages if isinstance(m, dict)]
+        shape["tools"] = len(body.get("tools") or [])
+    if isinstance(body.get("prompt"), str):
+        shape["prompt_chars"] = len(body["prompt"])
+    if "input" in body:
+        shape["input_chars"] = [len(i) if isinstance(i, (str, list)) else 1 for i in _inputs(body["input"])]
+    return shape
+
+
+def _event_body(event):
+    body = event.get("body")
+    if not body:
+        return None
+    try:
+        if event.get("isBase64Encoded"):
+            body = base64.b64decode(body)
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+class Capture:
+    """The shape of one sampled request, completed and written by finish()."""
+
+    def __init__(self, event):
+        self.event = event
+        self.started = time.time()
+        self.perf_started = time.perf_counter()
+
+    def finish(self, status_code, invocation=None, timer=None):
+        """Complete and write the shape. Never raises: capture must not fail the request."""
+        try:
+            write(self._shape(status_code, invocation, timer))
+        except Exception as e:
+            logger.warning({"msg": "request capture failed", "error": str(e)})
+
+    def _shape(self, status_code, invocation, timer):
+        shape = {
+            "ts": round(self.started, 3),
+            "method": self.event.get("httpMethod"),
+            "route": invocation.route if invocation is not None else None,
+            "status": status_code,
+            "latency_ms": round((time.perf_counter() - self.perf_started) * 1000, 1),
+        }
+        shape.update(request_shape(_event_body(self.event)))
+        if invocation is not None:
+            for field, name in (("prompt_tokens", "PromptTokens"), ("completion_tokens", "CompletionTokens")):
+                if name in invocation.values:
+                    shape[field] = invocation.values[name][0]
+        if timer is not None:
+            for phase in ("ttfb", "upstream"):
+                if phase in timer.phases:
+                    shape[f"{phase}_ms"] = round(timer.phases[phase], 1)
+        return shape
+
+
+def write(shape):
+    if PENNYWORTH_CAPTURE_SINK == "log":
+        logger.info({"msg": "request shape", "shape": shape})
+        return
+    line = json.dumps(shape, separators=(",", ":")) + "\n"
+    with _file_lock:
+        with open(PENNYWORTH_CAPTURE_SINK, "a") as f:
+            f.write(line)
+
+
+def start(event):
+    """A Capture for this request if it was sampled, else None."""
+    if PENNYWORTH_CAPTURE_RATE <= 0 or random.random() >= PENNYWORTH_CAPTURE_RATE:
+        return None
+    return Capture(event)
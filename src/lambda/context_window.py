@@ -0,0 +1,162 @@
+# Pre-dispatch context-window check: count prompt tokens for the target model
+# and reject (400) or trim conversations that cannot fit, before the provider
+# round-trip bills us for the input.
+
+from functools import lru_cache
+
+import litellm
+
+from errors import BadRequestException
+from utils import logger
+import metrics
+from src.shared.constants import *
+
+# Strategies for conversations that exceed the context window:
+#   disabled     - reject with 400
+#   keep_system  - drop the oldest non-system turns, keeping system prompts
+#   drop_oldest  - drop the oldest messages, including system prompts
+TRUNCATION_STRATEGIES = ("disabled", "keep_system", "drop_oldest")
+
+# OpenAI's Responses API `truncation` values, accepted as aliases.
+TRUNCATION_ALIASES = {"auto": "keep_system"}
+
+# Completion tokens reserved when the request does not set max_tokens.
+DEFAULT_OUTPUT_RESERVE = 1024
+
+SYSTEM_ROLES = ("system", "developer")
+
+
+@lru_cache(maxsize=None)
+def _has_tokenizer(model_id):
+    """
+    Whether LiteLLM's public token_counter can count for `model_id`, checked
+    once per container and model (the first count also loads the tokenizer).
+    If not, counts fall back to an estimate.
+    """
+    try:
+        litellm.token_counter(model=model_id, text="probe")
+        return True
+    except Exception as e:
+        logger.warning({"msg": "tokenizer unavailable", "model": model_id, "error": str(e)})
+        return False
+
+
+def _message_bytes(message):
+    content = message.get("content")
+    if isinstance(content, list):
+        content = " ".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+    size = len(str(content or "").encode())
+    if message.get("tool_calls"):
+        size += len(str(message["tool_calls"]).encode())
+    return size
+
+
+# Upper bound on tokens per message beyond its content (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 8
+
+
+def _upper_bound(messages):
+    """
+    Cheap upper bound on the prompt size: byte-level BPE tokens cover at least
+    one byte each, so the UTF-8 length of the content plus per-message framing
+    is never exceeded.
+    """
+    return sum(_message_bytes(m) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def count_message_tokens(model_config, message):
+    """Token count of a single chat message for the configured model."""
+    if not _has_tokenizer(model_config["model_id"]):
+        return _message_bytes(message) // 4 + MESSAGE_OVERHEAD_TOKENS
+    return litellm.token_counter(model=model_config["model_id"], messages=[message])
+
+
+def count_text_tokens(model_config, text):
+    if not _has_tokenizer(model_config["model_id"]):
+        return len(str(text).encode()) // 4
+    return litellm.token_counter(model=model_config["model_id"], text=str(text))
+
+
+def _budget(model_config, max_tokens):
+    """(context window, completion reserve, prompt budget); budget is None if unknown."""
+    reserve = max_tokens or DEFAULT_OUTPUT_RESERVE
+    if model_config.get("max_output_tokens"):
+        reserve = min(reserve, model_config["max_output_tokens"])
+    window = model_config.get("context_window")
+    return window, reserve, (window - reserve if window else None)
+
+
+def _too_long(model_name, window, reserve, tokens):
+    return BadRequestException(
+        f"Model '{model_name}' has a context window of {window} tokens; the request "
+        f"needs {tokens} prompt tokens plus {reserve} reserved for the completion. "
+        "Shorten the messages, lower max_tokens, or set truncation to 'auto'."
+    )
+
+
+def resolve_strategy(requested=None):
+    """Pick the truncation strategy from the request, falling back to the deployment default."""
+    strategy = TRUNCATION_ALIASES.get(requested, requested) or PENNYWORTH_TRUNCATION_STRATEGY
+    if strategy not in TRUNCATION_STRATEGIES:
+        raise BadRequestException(
+            f"Unknown truncation strategy '{requested}'; "
+            f"use one of {', '.join(TRUNCATION_STRATEGIES + tuple(TRUNCATION_ALIASES))}."
+        )
+    return strategy
+
+
+def fit_messages(model_name, model_config, messages, max_tokens=None, strategy=None):
+    """
+    Return `messages` (possibly with old turns removed) so that the prompt plus
+    the completion reserve fits the model's context window, or raise
+    BadRequestException. Models without a registered window are not checked.
+    """
+    window, reserve, budget = _budget(model_config, max_tokens)
+    if budget is None or _upper_bound(messages) <= budget:
+        return messages
+    strategy = resolve_strategy(strategy)
+    counts = [count_message_tokens(model_config, m) for m in messages]
+    total = sum(counts)
+    if total <= budget:
+        return messages
+    if strategy == "disabled":
+        raise _too_long(model_name, window, reserve, total)
+
+    # The latest turn (and any tool results answering it) is never dropped.
+    last = len(messages) - 1
+    while last > 0 and messages[last].get("role") == "tool":
+        last -= 1
+    droppable = [
+        i
+        for i in range(last)
+        if strategy == "drop_oldest" or messages[i].get("role") not in SYSTEM_ROLES
+    ]
+    dropped = set()
+    for i in droppable:
+        if total <= budget:
+            break
+        dropped.add(i)
+        total -= counts[i]
+    # Tool results are meaningless without the assistant turn that requested them.
+    for i in range(last):
+        if messages[i].get("role") == "tool" and i not in dropped and i - 1 in dropped:
+            dropped.add(i)
+            total -= counts[i]
+    if total > budget:
+        raise _too_long(model_name, window, reserve, total)
+
+    logger.info({"msg": "truncated conversation", "model": model_name, "dropped": len(dropped)})
+    invocation = metrics.current()
+    if invocation is not None:
+        invocation.add("TruncatedMessages", len(dropped))
+    return [m for i, m in enumerate(messages) if i not in dropped]
+
+
+def check_prompt(model_name, model_config, prompt, max_tokens=None):
+    """Raise BadRequestException if a text prompt cannot fit the context window."""
+    window, reserve, budget = _budget(model_config, max_tokens)
+    if budget is None or len(str(prompt).encode()) <= budget:
+        return
+    tokens = count_text_tokens(model_config, prompt)
+    if tokens > budget:
+        raise _too_long(model_name, window, reserve, tokens)
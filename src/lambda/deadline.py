@@ -0,0 +1,102 @@
+# Per-request deadlines. Each request gets a deadline from the Lambda's
+# remaining time (less PENNYWORTH_DEADLINE_MARGIN_MS, kept for writing the
+# response) and, if sent, the client's `x-request-timeout` header (seconds).
+# Auth, credential exchange and provider calls take their timeouts from the
+# remaining time, so a slow upstream produces a clean 504 (or a truncated
+# stream) instead of the function being killed mid-request.
+
+import time
+from contextvars import ContextVar
+
+from botocore.config import Config
+
+from errors import GatewayTimeoutException
+from utils import logger
+from src.shared.constants import *
+
+_current = ContextVar("pennyworth_deadline", default=None)
+
+TIMEOUT_HEADER = "x-request-timeout"
+
+# Calls are not started (or retried) with less time than this left.
+MIN_CALL_SECONDS = 0.25
+
+
+class Deadline:
+    """Absolute deadline for one request, on the time.monotonic() clock."""
+
+    def __init__(self, seconds):
+        self.budget = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left before the deadline (negative once it has passed)."""
+        return self.expires - time.monotonic()
+
+    def timeout(self, stage):
+        """
+        Seconds available to a call made for `stage`; raises a 504 if too little
+        time is left to start it.
+        """
+        remaining = self.remaining()
+        if remaining < MIN_CALL_SECONDS:
+            logger.warning({"msg": "deadline exceeded", "stage": stage, "budget": self.budget})
+            raise GatewayTimeoutException(
+                f"Request deadline of {self.budget:.1f}s exceeded before {stage} could complete."
+            )
+        return remaining
+
+
+def _client_timeout(headers):
+    """Seconds from the x-request-timeout header; malformed values are ignored."""
+    value = next((v for k, v in (headers or {}).items() if k.lower() == TIMEOUT_HEADER), None)
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = 0
+    if seconds <= 0:
+        logger.warning({"msg": f"ignoring invalid {TIMEOUT_HEADER}", "value": value})
+        return None
+    return seconds
+
+
+def start(context, headers=None, seconds=None):
+    """
+    Begin a request's deadline: the Lambda's remaining time less the margin,
+    shortened by the client's x-request-timeout and by `seconds`. Without any
+    of them there is no deadline and None is returned.
+    """
+    limits = [seconds] if seconds is not None else []
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        limits.append((context.get_remaining_time_in_millis() - PENNYWORTH_DEADLINE_MARGIN_MS) / 1000)
+    client = _client_timeout(headers)
+    if client is not None:
+        limits.append(client)
+    deadline = Deadline(min(limits)) if limits else None
+    _current.set(deadline)
+    return deadline
+
+
+def current():
+    """Return the deadline of the request being handled, or None."""
+    return _current.get()
+
+
+def timeout(stage, default=None):
+    """Seconds available to a call made for `stage` (`default` when there is no deadline)."""
+    deadline = current()
+    return deadline.timeout(stage) if deadline is not None else default
+
+
+def boto_config(stage):
+    """botocore Config whose timeouts fit the remaining time, or None without a deadline."""
+    seconds = timeout(stage)
+    if seconds is None:
+        return None
+    return Config(
+        connect_timeout=min(seconds, 5),
+        read_timeout=seconds,
+        retries={"max_attempts": 1 if seconds < 5 else 3, "mode": "standard"},
+    )
@@ -0,0 +1,190 @@
+# Cross-request micro-batching of embedding calls, for server mode (server.py)
+# where many requests share a process. Inputs from concurrent /embeddings
+# requests for the same model (one flagged supports_batch_embedding in
+# model_router.MODEL_MAP) are collected for up to max_wait_ms or
+# max_items inputs, sent to the provider as one call, and the vectors are
+# scattered back to the waiting requests. The first request of a batch (the
+# leader) starts a thread that makes the call in the context (deadline, lane,
+# metrics) of the member with the most time left; every member waits for the
+# result only as long as its own deadline allows. If the call fails for a
+# reason that may lie in one member's inputs (a 4xx from the provider), each
+# member retries its own inputs alone, so one bad input fails only its request.
+
+import contextvars
+import threading
+
+from errors import GatewayTimeoutException
+from utils import logger
+import deadline
+import metrics
+
+
+def _as_list(input_data):
+    """A request's inputs as a list: strings, or token arrays (lists of ints)."""
+    if isinstance(input_data, str):
+        return [input_data]
+    if isinstance(input_data, list) and input_data and all(isinstance(t, int) for t in input_data):
+        return [input_data]
+    return list(input_data)
+
+
+def _size(item):
+    return len(item) if isinstance(item, (str, list)) else 1
+
+
+def _remaining(context):
+    """Seconds left to the deadline of the request whose context this is (inf without one)."""
+    request_deadline = context.run(deadline.current)
+    return float("inf") if request_deadline is None else request_deadline.remaining()
+
+
+def _applies_to_all(error):
+    """True for errors not caused by any one input: throttling, timeouts, server and network errors."""
+    status = getattr(error, "status_code", None)
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+class _Batch:
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.inputs = []
+        self.contexts = []
+        self.requests = 0
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.region = None
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests per model. `embed()` blocks until
+    the batch holding the request's inputs has been sent and answered.
+    """
+
+    def __init__(self, max_wait_ms, max_items):
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_items = max_items
+        self._open = {}
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "requests": 0, "items": 0, "full": 0, "retried": 0}
+
+    def stats(self):
+        """Counters since start, with the mean fill of batches (items / max_items)."""
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats["batches"] or 1
+        stats["mean_requests_per_batch"] = round(stats["requests"] / batches, 2)
+        stats["mean_fill"] = round(stats["items"] / batches / self.max_items, 3)
+        return stats
+
+    def _join(self, model_name, inputs, context):
+        """Add inputs (of the request running in `context`) to the model's open batch; returns (batch, offset, leader)."""
+        with self._lock:
+            batch = self._open.get(model_name)
+            if batch is not None and len(batch.inputs) + len(inputs) > self.max_items:
+                self._close(batch)
+                batch = None
+            leader = batch is None
+            if leader:
+                batch = self._open[model_name] = _Batch(model_name)
+            offset = len(batch.inputs)
+            batch.inputs.extend(inputs)
+            batch.contexts.append(context)
+            batch.requests += 1
+            if len(batch.inputs) >= self.max_items:
+                self._close(batch)
+                self._stats["full"] += 1
+            return batch, offset, leader
+
+    def _close(self, batch):
+        # Caller holds self._lock.
+        if self._open.get(batch.model_name) is batch:
+            del self._open[batch.model_name]
+        batch.full.set()
+
+    def _send(self, batch, call):
+        batch.full.wait(self.max_wait)
+        with self._lock:
+            self._close(batch)
+            self._stats["batches"] += 1
+            self._stats["requests"] += batch.requests
+            self._stats["items"] += len(batch.inputs)
+        context = max(batch.contexts, key=_remaining)
+        try:
+            batch.result = context.run(call, batch.inputs)
+            invocation = context.run(metrics.current)
+            batch.region = invocation.region if invocation is not None else None
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+        logger.debug({"msg": "embedding batch sent", "requests": batch.requests, "items": len(batch.inputs)})
+
+    def embed(self, model_name, input_data, call):
+        """
+        Embed `input_data` (a string, token array or list of either) as part of
+        a batch. `call(inputs)` sends one provider request for a list of inputs
+        and returns an OpenAI-style embedding response dict. Returns the
+        request's own response: its vectors, re-indexed, and its share of usage.
+        """
+        inputs = _as_list(input_data)
+        if len(inputs) >= self.max_items:
+            return call(inputs)
+        batch, offset, leader = self._join(model_name, inputs, contextvars.copy_context())
+        if leader:
+            sender = threading.Thread(
+                target=self._send, args=(batch, call), name="pennyworth-embedding-batch", daemon=True
+            )
+            sender.start()
+        request_deadline = deadline.current()
+        wait = max(request_deadline.remaining(), 0) if request_deadline is not None else None
+        if not batch.done.wait(wait):
+            raise GatewayTimeoutException(
+                f"Request deadline of {request_deadline.budget:.1f}s exceeded waiting for an embedding batch."
+            )
+        if batch.error is not None:
+            if batch.requests == 1 or _applies_to_all(batch.error):
+                raise batch.error
+            with self._lock:
+                self._stats["retried"] += 1
+            logger.info({"msg": "embedding batch failed; retrying alone", "error": str(batch.error)})
+            return call(inputs)
+
+        invocation = metrics.current()
+        if invocation is not None:
+            if batch.region is not None:
+                invocation.set_region(batch.region)
+            invocation.add("EmbeddingBatchItems", len(batch.inputs))
+            invocation.add("EmbeddingBatchRequests", batch.requests)
+        return self._scatter(batch, offset, inputs)
+
+    @staticmethod
+    def _scatter(batch, offset, inputs):
+        result = batch.result
+        data = sorted(result.get("data") or [], key=lambda d: d.get("index", 0))
+        mine = [
+            {**item, "index": n} for n, item in enumerate(data[offset : offset + len(inputs)])
+        ]
+        usage = dict(result.get("usage") or {})
+        total_size = sum(_size(i) for i in batch.inputs) or 1
+        share = sum(_size(i) for i in inputs) / total_size
+        for key in ("prompt_tokens", "total_tokens"):
+            if key in usage and usage[key] is not None:
+                usage[key] = round(usage[key] * share)
+        return {**result, "data": mine, "usage": usage}
+
+
+_batcher = None
+
+
+def get_batcher():
+    """The process-wide batcher, or None when batching is off (as in Lambda)."""
+    return _batcher
+
+
+def set_batcher(batcher):
+    """Install (or with None, remove) the process-wide batcher; server.py does this at startup."""
+    global _batcher
+    _batcher = batcher
@@ -24,3 +24,19 @@ class NotFoundException(APIException):
 
 class NotImplementedException(APIException):
     status_code = 501
+
+
+class UnprocessableEntityException(APIException):
+    status_code = 422
+
+
+class GatewayTimeoutException(APIException):
+    status_code = 504
+
+
+class TooManyRequestsException(APIException):
+    status_code = 429
+
+    def __init__(self, message, headers=None):
+        super().__init__(message)
+        self.headers = headers
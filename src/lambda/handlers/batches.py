@@ -0,0 +1,48 @@
+# handlers/batches.py
+# OpenAI-compatible Batch API; the processing itself lives in batches.py.
+
+import batches
+import budgets
+from auth import caller_identity
+from errors import BadRequestException
+import listings
+import tracing
+
+
+@tracing.capture("handler")
+def create_batch_handler(event):
+    body = event.json_body or {}
+    if not body.get("input_file_id") or not body.get("endpoint"):
+        raise BadRequestException("Missing 'input_file_id' or 'endpoint' in request body.")
+    batch = batches.create_batch(
+        body["input_file_id"],
+        body["endpoint"],
+        body.get("completion_window", "24h"),
+        body.get("metadata"),
+        caller_identity(event.raw_event),
+        budgets.subjects(event.raw_event),
+    )
+    return batches.public_view(batch), 200
+
+
+@tracing.capture("handler")
+def get_batch_handler(event, batch_id):
+    return batches.public_view(batches.load_batch(batch_id, caller_identity(event.raw_event))), 200
+
+
+@tracing.capture("handler")
+def list_batches_handler(event):
+    limit, after = listings.page_params(event.query_string_parameters or {}, 20, 100)
+    page, has_more = batches.list_batches(caller_identity(event.raw_event), limit, after)
+    return {
+        "object": "list",
+        "data": [batches.public_view(b) for b in page],
+        "first_id": page[0]["id"] if page else None,
+        "last_id": page[-1]["id"] if page else None,
+        "has_more": has_more,
+    }, 200
+
+
+@tracing.capture("handler")
+def cancel_batch_handler(event, batch_id):
+    return batches.public_view(batches.cancel_batch(batch_id, caller_identity(event.raw_event))), 200
@@ -0,0 +1,156 @@
+# handlers/files.py
+# OpenAI-compatible Files API. Content and metadata are kept in the object
+# store under files/<id>/content and files/<id>/meta.json. Each file belongs to
+# the caller that uploaded it (auth.caller_identity, kept as "_owner" in its
+# metadata); other callers get 404 for it. Listings read the owner's index
+# (listings.py) rather than every file's metadata.
+
+import base64
+import email.parser
+import email.policy
+import json
+import time
+import uuid
+
+from auth import caller_identity
+from errors import APIException, BadRequestException, NotFoundException
+from storage import get_object_store
+from utils import logger
+import listings
+import tracing
+
+FILE_PURPOSES = ("batch", "batch_output", "fine-tune", "assistants", "user_data")
+
+# Page sizes of the files list, as in OpenAI's API.
+DEFAULT_LIST_LIMIT = 10000
+MAX_LIST_LIMIT = 10000
+
+
+def _content_key(file_id):
+    return f"files/{file_id}/content"
+
+
+def _meta_key(file_id):
+    return f"files/{file_id}/meta.json"
+
+
+def create_file(data, filename, purpose, owner=None):
+    """Store `data` (bytes or str) as a new file of `owner` and return its metadata."""
+    if isinstance(data, str):
+        data = data.encode()
+    meta = {
+        "id": f"file-{uuid.uuid4().hex[:24]}",
+        "object": "file",
+        "bytes": len(data),
+        "created_at": int(time.time()),
+        "filename": filename,
+        "purpose": purpose,
+        "_owner": owner,
+    }
+    store = get_object_store()
+    store.put(_content_key(meta["id"]), data, "application/jsonl")
+    store.put(_meta_key(meta["id"]), json.dumps(meta), "application/json")
+    if owner is not None:
+        listings.add("files", owner, meta["created_at"], meta["id"], purpose)
+    return meta
+
+
+def public_view(meta):
+    """The file object as returned by the API (internal fields removed)."""
+    return {k: v for k, v in meta.items() if not k.startswith("_")}
+
+
+def get_file_meta(file_id, owner=None):
+    """A file's metadata; with `owner`, raises NotFoundException unless the file is theirs."""
+    raw = get_object_store().get(_meta_key(file_id))
+    meta = json.loads(raw) if raw is not None else None
+    if meta is None or (owner is not None and meta.get("_owner") != owner):
+        raise NotFoundException(f"No such file: '{file_id}'.")
+    return meta
+
+
+def get_file_content(file_id, owner=None):
+    if owner is not None:
+        get_file_meta(file_id, owner)
+    data = get_object_store().get(_content_key(file_id))
+    if data is None:
+        raise NotFoundException(f"No such file: '{file_id}'.")
+    return data
+
+
+def _raw_body(event):
+    body = event.body or ""
+    return base64.b64decode(body) if event.is_base64_encoded else body.encode()
+
+
+def _parse_multipart(body, content_type):
+    """Return {field name: (filename, bytes)} for a multipart/form-data body."""
+    header = f"Content-Type: {content_type}\r\n\r\n".encode()
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + body)
+    if not message.is_multipart():
+        raise BadRequestException("Expected a multipart/form-data body.")
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            fields[name] = (part.get_filename(), part.get_payload(decode=True) or b"")
+    return fields
+
+
+@tracing.capture("handler")
+def upload_file_handler(event):
+    content_type = event.headers.get("Content-Type") or ""
+    if not content_type.startswith("multipart/form-data"):
+        raise BadRequestException("Upload files as multipart/form-data with 'file' and 'purpose'.")
+    fields = _parse_multipart(_raw_body(event), content_type)
+    if "file" not in fields or "purpose" not in fields:
+        raise BadRequestException("Missing 'file' or 'purpose' form field.")
+    purpose = fields["purpose"][1].decode().strip()
+    if purpose not in FILE_PURPOSES:
+        raise BadRequestException(f"Unsupported purpose '{purpose}'.")
+    filename, data = fields["file"]
+    try:
+        meta = create_file(data, filename or "upload.jsonl", purpose, caller_identity(event.raw_event))
+    except Exception as e:
+        logger.error(f"Error storing file: {e}")
+        raise APIException(str(e))
+    return public_view(meta), 200
+
+
+@tracing.capture("handler")
+def list_files_handler(event):
+    params = event.query_string_parameters or {}
+    limit, after = listings.page_params(params, DEFAULT_LIST_LIMIT, MAX_LIST_LIMIT)
+    owner = caller_identity(event.raw_event)
+    ids, has_more = listings.page(listings.ids("files", owner, params.get("purpose")), limit, after)
+    store = get_object_store()
+    metas = (store.get(_meta_key(file_id)) for file_id in ids)
+    files = [public_view(json.loads(raw)) for raw in metas if raw is not None]  # None: deleted meanwhile.
+    return {
+        "object": "list",
+        "data": files,
+        "first_id": ids[0] if ids else None,
+        "last_id": ids[-1] if ids else None,
+        "has_more": has_more,
+    }, 200
+
+
+@tracing.capture("handler")
+def get_file_handler(event, file_id):
+    return public_view(get_file_meta(file_id, caller_identity(event.raw_event))), 200
+
+
+@tracing.capture("handler")
+def get_file_content_handler(event, file_id):
+    data = get_file_content(file_id, caller_identity(event.raw_event))
+    return data, 200, {"Content-Type": "application/octet-stream"}
+
+
+@tracing.capture("handler")
+def delete_file_handler(event, file_id):
+    meta = get_file_meta(file_id, caller_identity(event.raw_event))
+    store = get_object_store()
+    store.delete(_content_key(file_id))
+    store.delete(_meta_key(file_id))
+    listings.remove("files", meta["_owner"], meta["created_at"], file_id, meta["purpose"])
+    return {"id": file_id, "object": "file", "deleted": True}, 200
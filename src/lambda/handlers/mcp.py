@@ -1,8 +1,336 @@
 # handlers/mcp.py
-from errors import APIException
-from utils import tracer
+# MCP streamable HTTP transport (https://modelcontextprotocol.io, 2025-03-26+).
+#
+# POST carries one JSON-RPC message or a batch; GET returns queued
+# server-initiated messages as an SSE body (API Gateway buffers responses, so
+# the stream ends after the backlog and clients reconnect after `retry`);
+# DELETE ends the session. Sessions live in the shared state store so any warm
+# container can resume them, and each container keeps a short-lived copy so
+# repeated tools/list calls never leave the process.
 
+import json
+import time
+import uuid
 
-@tracer.capture_method
-def mcp_handler(path):
-    raise APIException(f"MCP endpoint '{path}' not implemented yet.")
+from errors import APIException, BadRequestException, NotFoundException
+from model_router import MODEL_MAP
+from utils import logger
+import tracing
+import state
+from src.shared.constants import *
+
+MCP_SERVERS = ("pennyworth",)
+SUPPORTED_PROTOCOL_VERSIONS = ("2025-06-18", "2025-03-26")
+SESSION_HEADER = "Mcp-Session-Id"
+SESSION_CACHE_SECONDS = 30
+SSE_RETRY_MS = 5000
+MAX_OUTBOX = 100
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+TOOLS = [
+    {
+        "name": "list_models",
+        "description": "List the model names this Pennyworth deployment can route to.",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+    {
+        "name": "chat",
+        "description": "Send a prompt to a Pennyworth model and return its reply.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "model": {"type": "string", "enum": sorted(MODEL_MAP)},
+                "prompt": {"type": "string"},
+                "system": {"type": "string"},
+            },
+            "required": ["model", "prompt"],
+        },
+    },
+]
+
+RESOURCES = [
+    {
+        "uri": "pennyworth://models",
+        "name": "models",
+        "description": "Models available through this deployment",
+        "mimeType": "application/json",
+    },
+    {
+        "uri": "pennyworth://version",
+        "name": "version",
+        "description": "API version and commit of this deployment",
+        "mimeType": "application/json",
+    },
+]
+
+# session id -> (expires at, session record); see SESSION_CACHE_SECONDS.
+_session_cache = {}
+
+
+class JsonRpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _session_key(session_id):
+    return f"mcp-session#{session_id}"
+
+
+def _cache_session(session_id, session):
+    _session_cache[session_id] = (time.monotonic() + SESSION_CACHE_SECONDS, session)
+
+
+def _load_session(session_id):
+    """Return the session record, preferring this container's cached copy."""
+    cached = _session_cache.get(session_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    session = state.get_store().get(_session_key(session_id))
+    if session is None:
+        _session_cache.pop(session_id, None)
+        return None
+    _cache_session(session_id, session)
+    return session
+
+
+def _save_session(session_id, session):
+    state.get_store().put(_session_key(session_id), session, ttl_seconds=PENNYWORTH_MCP_SESSION_TTL)
+    _cache_session(session_id, session)
+
+
+def _end_session(session_id):
+    state.get_store().delete(_session_key(session_id))
+    _session_cache.pop(session_id, None)
+
+
+def enqueue_server_message(session_id, message):
+    """
+    Queue a server-initiated JSON-RPC message (e.g. a list_changed notification)
+    for delivery on the session's next GET. Returns False if the session is gone.
+    """
+    session = state.get_store().get(_session_key(session_id))
+    if session is None:
+        return False
+    outbox = session.setdefault("outbox", [])
+    session["next_event_id"] = session.get("next_event_id", 0) + 1
+    outbox.append({"id": session["next_event_id"], "message": message})
+    del outbox[:-MAX_OUTBOX]
+    _save_session(session_id, session)
+    return True
+
+
+def _listings():
+    """Tool and resource listings, stored with each session at initialize."""
+    return {"tools/list": {"tools": TOOLS}, "resources/list": {"resources": RESOURCES}}
+
+
+def _text_result(text, is_error=False):
+    return {"content": [{"type": "text", "text": text}], "isError": is_error}
+
+
+def _call_tool(name, arguments):
+    if name == "list_models":
+        return _text_result(json.dumps(sorted(MODEL_MAP)))
+    if name == "chat":
+        from handlers.openai import chat_completions_handler
+
+        if not arguments.get("model") or not arguments.get("prompt"):
+            raise JsonRpcError(INVALID_PARAMS, "'model' and 'prompt' are required.")
+        messages = [{"role": "user", "content": arguments["prompt"]}]
+        if arguments.get("system"):
+            messages.insert(0, {"role": "system", "content": arguments["system"]})
+        try:
+            result, _ = chat_completions_handler(
+                {"model": arguments["model"], "messages": messages}
+            )
+        except APIException as e:
+            return _text_result(str(e), is_error=True)
+        return _text_result(result["choices"][0]["message"]["content"] or "")
+    raise JsonRpcError(INVALID_PARAMS, f"Unknown tool '{name}'.")
+
+
+def _read_resource(uri):
+    if uri == "pennyworth://models":
+        data = [{"id": k, **v} for k, v in MODEL_MAP.items()]
+    elif uri == "pennyworth://version":
+        data = {
+            "Version": PENNYWORTH_API_VERSION,
+            "SemanticVersion": PENNYWORTH_API_SEMANTIC_VERSION,
+            "Commit": PENNYWORTH_GIT_COMMIT,
+        }
+    else:
+        raise JsonRpcError(INVALID_PARAMS, f"Unknown resource '{uri}'.")
+    return {"contents": [{"uri": uri, "mimeType": "application/json", "text": json.dumps(data)}]}
+
+
+def _dispatch(method, params, session):
+    if method == "ping":
+        return {}
+    if method in ("tools/list", "resources/list"):
+        return session["listings"][method]
+    if method == "resources/templates/list":
+        return {"resourceTemplates": []}
+    if method == "prompts/list":
+        return {"prompts": []}
+    if method == "tools/call":
+        return _call_tool(params.get("name"), params.get("arguments") or {})
+    if method == "resources/read":
+        return _read_resource(params.get("uri"))
+    raise JsonRpcError(METHOD_NOT_FOUND, f"Method '{method}' not found.")
+
+
+def _initialize(params):
+    requested = params.get("protocolVersion")
+    version = requested if requested in SUPPORTED_PROTOCOL_VERSIONS else SUPPORTED_PROTOCOL_VERSIONS[0]
+    session_id = uuid.uuid4().hex
+    session = {
+        "protocolVersion": version,
+        "clientInfo": params.get("clientInfo") or {},
+        "created": int(time.time()),
+        "listings": _listings(),
+        "outbox": [],
+        "next_event_id": 0,
+    }
+    _save_session(session_id, session)
+    result = {
+        "protocolVersion": version,
+        "capabilities": {
+            "tools": {"listChanged": False},
+            "resources": {"listChanged": False},
+            "prompts": {"listChanged": False},
+        },
+        "serverInfo": {"name": "pennyworth", "version": PENNYWORTH_API_SEMANTIC_VERSION},
+    }
+    return session_id, result
+
+
+def _error(msg_id, code, message):
+    return {"jsonrpc": "2.0", "id": msg_id, "error": {"code": code, "message": message}}
+
+
+def _handle_message(message, session):
+    """Process one JSON-RPC message; returns the response, or None for notifications."""
+    if not isinstance(message, dict) or message.get("jsonrpc") != "2.0":
+        return _error(None, INVALID_REQUEST, "Invalid JSON-RPC message.")
+    if "method" not in message:
+        return None  # A response to a server-initiated request; nothing to do.
+    if "id" not in message:
+        logger.debug({"msg": "MCP notification", "method": message["method"]})
+        return None
+    try:
+        params = message.get("params") or {}
+        result = _dispatch(message["method"], params, session)
+        return {"jsonrpc": "2.0", "id": message["id"], "result": result}
+    except JsonRpcError as e:
+        return _error(message["id"], e.code, e.message)
+    except Exception as e:
+        logger.exception({"msg": "MCP method failed", "method": message["method"]})
+        return _error(message["id"], INTERNAL_ERROR, str(e))
+
+
+def _session_id(event):
+    session_id = event.headers.get(SESSION_HEADER)
+    if not session_id:
+        raise BadRequestException(f"Missing {SESSION_HEADER} header; call initialize first.")
+    return session_id
+
+
+def _require_session(event, load=_load_session):
+    session_id = _session_id(event)
+    session = load(session_id)
+    if session is None:
+        raise NotFoundException(f"MCP session '{session_id}' not found or expired.")
+    return session_id, session
+
+
+def _sse(events):
+    lines = [f"retry: {SSE_RETRY_MS}\n\n"]
+    for event in events:
+        prefix = f"id: {event['id']}\n" if "id" in event else ""
+        lines.append(f"{prefix}event: message\ndata: {json.dumps(event['message'])}\n\n")
+    return "".join(lines)
+
+
+def _post(event):
+    try:
+        payload = json.loads(event.body or "")
+    except (TypeError, ValueError):
+        return _error(None, PARSE_ERROR, "Parse error."), 400
+    batch = isinstance(payload, list)
+    messages = payload if batch else [payload]
+    if not messages:
+        return _error(None, INVALID_REQUEST, "Empty batch."), 400
+
+    headers = {"Content-Type": "application/json"}
+    initialize = [m for m in messages if isinstance(m, dict) and m.get("method") == "initialize"]
+    if initialize:
+        if len(messages) > 1:
+            return _error(None, INVALID_REQUEST, "initialize must not be batched."), 400
+        message = initialize[0]
+        session_id, result = _initialize(message.get("params") or {})
+        headers[SESSION_HEADER] = session_id
+        responses = [{"jsonrpc": "2.0", "id": message.get("id"), "result": result}]
+    else:
+        session_id, session = _require_session(event)
+        responses = [r for r in (_handle_message(m, session) for m in messages) if r]
+
+    if not responses:
+        return "", 202, headers
+    accept = event.headers.get("Accept") or ""
+    if "text/event-stream" in accept and "application/json" not in accept:
+        headers.update({"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        return _sse({"message": r} for r in responses), 200, headers
+    return (responses if batch else responses[0]), 200, headers
+
+
+def _last_event_id(value):
+    """The numeric Last-Event-ID a client resumes from; missing or malformed values mean none."""
+    try:
+        return int(value or 0)
+    except ValueError:
+        logger.warning({"msg": "ignoring malformed Last-Event-ID", "value": value})
+        return 0
+
+
+def _get(event):
+    if "text/event-stream" not in (event.headers.get("Accept") or ""):
+        return {"error": "GET requires Accept: text/event-stream"}, 406
+    # Read through to the store: messages may have been queued by another container.
+    session_id, session = _require_session(
+        event, load=lambda sid: state.get_store().get(_session_key(sid))
+    )
+    last_event_id = _last_event_id(event.headers.get("Last-Event-ID"))
+    pending = [e for e in session.get("outbox", []) if e["id"] > last_event_id]
+    if session.get("outbox"):
+        session["outbox"] = []
+        _save_session(session_id, session)
+    headers = {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+    return _sse(pending), 200, headers
+
+
+def _delete(event):
+    session_id, _ = _require_session(event)
+    _end_session(session_id)
+    return "", 204
+
+
+@tracing.capture("handler")
+def mcp_handler(event, server):
+    if server not in MCP_SERVERS:
+        raise NotFoundException(f"MCP server '{server}' not found.")
+    method = event.http_method.upper()
+    if method == "POST":
+        return _post(event)
+    if method == "GET":
+        return _get(event)
+    if method == "DELETE":
+        return _delete(event)
+    return {"error": f"Method {method} not allowed"}, 405, {"Allow": "GET, POST, DELETE"}
@@ -1,76 +1,284 @@
-from model_router import get_model_config
+import json
+import time
+
+from model_router import MODEL_MAP, get_model_config, projected_cost, resolve_model, routing_features
+from context_window import check_prompt, count_message_tokens, count_text_tokens, fit_messages
+import prompt_cache
 import litellm
-from utils import logger, tracer
+from utils import logger
+import tracing
 from errors import APIException, BadRequestException
+import budgets
+import deadline
+import embedding_batcher
+import regions
+import timing
+import metrics
+
+SSE_HEADERS = {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+TRUNCATED_HEADER = "X-Pennyworth-Truncated"
+
+
+def _to_dict(response):
+    """
+    Convert a LiteLLM response object into a plain dict so it can be JSON encoded.
+    """
+    if hasattr(response, "model_dump"):
+        return response.model_dump(warnings=False)
+    return response
+
+
+def _record_model(model_name, model_config, usage=None):
+    """
+    Attach the model and its token usage/cost to the current request's metrics,
+    and charge the cost to the caller's budgets.
+    """
+    tracker = budgets.current()
+    if tracker is not None:
+        cost = metrics.usage_cost(usage, model_config)
+        if cost:
+            tracker.charge(cost)
+    invocation = metrics.current()
+    if invocation is None:
+        return
+    invocation.set_model(model_name)
+    invocation.record_usage(usage, model_config)
+
+
+def _route(model_name, **features):
+    """
+    Resolve the model (routing `auto` within the caller's remaining budget) and
+    check the request's projected cost against the caller's budgets.
+    """
+    if budgets.current() is not None:
+        features["budget_remaining"] = budgets.remaining_usd()
+    model_name, model_config = resolve_model(model_name, **features)
+    _check_budget(model_config, **features)
+    return model_name, model_config
+
+
+def _check_budget(model_config, **features):
+    """Raise 429 if the request's projected cost exceeds the caller's remaining budget."""
+    tracker = budgets.current()
+    if tracker is not None:
+        tracker.check(projected_cost(model_config, routing_features(**features)))
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def list_models_handler():
     try:
-        model_list = [
-            {"id": k, **v} for k, v in get_model_config.__globals__["model_map"].items()
-        ]
+        model_list = [{"id": k, **v} for k, v in MODEL_MAP.items()]
         return {"data": model_list}, 200
     except Exception as e:
         logger.error(f"Error in models: {e}")
         raise APIException(str(e))
 
 
-@tracer.capture_method
+def _truncation_event(last):
+    """Final chunk marking a stream cut short by the request deadline."""
+    return {
+        "id": last.get("id"),
+        "object": "chat.completion.chunk",
+        "created": last.get("created"),
+        "model": last.get("model"),
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "length"}],
+        "pennyworth_truncated": "deadline",
+    }
+
+
+def _estimated_usage(model_config, messages, completion_text):
+    """Usage counted locally, for a stream that ended without reporting any."""
+    prompt_tokens = sum(count_message_tokens(model_config, m) for m in messages or [])
+    completion_tokens = count_text_tokens(model_config, completion_text)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _encode_sse(chunks, started, model_name, model_config, messages=None, client_usage=False):
+    """
+    Drain a LiteLLM completion stream into a Server-Sent Events body.
+    API Gateway (REST) buffers Lambda responses, so the stream is collected
+    here and returned in OpenAI's SSE wire format; the time from `started`
+    (the upstream call) to the first chunk is recorded as the "ttfb" phase.
+    If the request deadline is reached first, the stream ends early with a
+    `finish_reason: "length"` chunk. Usage (requested from the provider for
+    every stream, see chat_completions_handler) is recorded and charged, and
+    only passed on if the client asked for it with stream_options; a stream
+    that reports none is charged an estimate. Returns (body, truncated).
+    """
+    timer = timing.current()
+    request_deadline = deadline.current()
+    events = []
+    usage = None
+    last = {}
+    text = []
+    truncated = False
+    try:
+        for chunk in chunks:
+            if not events and timer is not None:
+                timer.mark("ttfb", started)
+            last = _to_dict(chunk)
+            for choice in last.get("choices") or []:
+                text.append((choice.get("delta") or {}).get("content") or "")
+            if last.get("usage"):
+                usage = prompt_cache.report_cached_tokens(last["usage"])
+            event = last if client_usage or "usage" not in last else {k: v for k, v in last.items() if k != "usage"}
+            events.append(f"data: {json.dumps(event)}\n\n")
+            if request_deadline is not None and request_deadline.remaining() < deadline.MIN_CALL_SECONDS:
+                truncated = True
+                break
+    except litellm.Timeout:
+        if not events:
+            raise
+        truncated = True
+    finally:
+        # Ends the upstream call (and frees its slot, see regions.HeldStream) however we stopped.
+        if hasattr(chunks, "close"):
+            chunks.close()
+    if truncated:
+        logger.warning({"msg": "stream truncated at deadline", "events": len(events)})
+        events.append(f"data: {json.dumps(_truncation_event(last))}\n\n")
+        invocation = metrics.current()
+        if invocation is not None:
+            invocation.add("DeadlineTruncations", 1)
+    events.append("data: [DONE]\n\n")
+    if usage is None:
+        logger.warning({"msg": "stream reported no usage; charging an estimate", "model": model_name})
+        usage = _estimated_usage(model_config, messages, "".join(text))
+    _record_model(model_name, model_config, usage)
+    return "".join(events), truncated
+
+
+@tracing.capture("handler")
 def chat_completions_handler(body):
     model_name = body.get("model")
     messages = body.get("messages")
     if not model_name or not messages:
         raise BadRequestException("Missing 'model' or 'messages' in request body.")
+    stream = bool(body.get("stream"))
+    max_tokens = body.get("max_tokens")
     try:
-        model_config = get_model_config(model_name)
-        response = litellm.completion(
-            model=model_config["model_id"],
-            messages=messages,
-            provider=model_config["provider"],
-            aws_region=None,
-        )
-        return response, 200
+        with timing.phase("route"):
+            model_name, model_config = _route(
+                model_name, messages=messages, tools=body.get("tools"), max_tokens=max_tokens
+            )
+        with timing.phase("context"):
+            messages = fit_messages(
+                model_name, model_config, messages, max_tokens, body.get("truncation")
+            )
+            messages, tools = prompt_cache.prepare(model_config, messages, body.get("tools"))
+        options = {"stream": stream, "max_tokens": max_tokens, "tools": tools}
+        options["tool_choice"] = body.get("tool_choice")
+        client_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        if stream:
+            # LiteLLM only reports usage for a stream when asked; it is needed for budgets and metrics.
+            options["stream_options"] = {**(body.get("stream_options") or {}), "include_usage": True}
+        with timing.phase("upstream"):
+            upstream_started = time.perf_counter()
+            response = regions.invoke(
+                model_name,
+                model_config,
+                lambda region: litellm.completion(
+                    model=model_config["model_id"],
+                    messages=messages,
+                    provider=model_config["provider"],
+                    aws_region_name=region,
+                    timeout=deadline.timeout("upstream"),
+                    **{k: v for k, v in options.items() if v},
+                ),
+                stream=stream,
+            )
+            if stream:
+                body, truncated = _encode_sse(
+                    response, upstream_started, model_name, model_config, messages, client_usage
+                )
+                if truncated:
+                    return body, 200, {**SSE_HEADERS, TRUNCATED_HEADER: "deadline"}
+                return body, 200, SSE_HEADERS
+        result = _to_dict(response)
+        prompt_cache.report_cached_tokens(result.get("usage"))
+        _record_model(model_name, model_config, result.get("usage"))
+        return result, 200
+    except APIException:
+        raise
     except Exception as e:
         logger.error(f"Error in chat/completions: {e}")
         raise APIException(str(e))
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def completions_handler(body):
     model_name = body.get("model")
     prompt = body.get("prompt")
     if not model_name or not prompt:
         raise BadRequestException("Missing 'model' or 'prompt' in request body.")
     try:
-        model_config = get_model_config(model_name)
-        response = litellm.completion(
-            model=model_config["model_id"],
-            prompt=prompt,
-            provider=model_config["provider"],
-            aws_region=None,
-        )
-        return response, 200
+        with timing.phase("route"):
+            model_name, model_config = _route(
+                model_name, prompt=prompt, max_tokens=body.get("max_tokens")
+            )
+        with timing.phase("context"):
+            check_prompt(model_name, model_config, prompt, body.get("max_tokens"))
+        with timing.phase("upstream"):
+            response = regions.invoke(
+                model_name,
+                model_config,
+                lambda region: litellm.completion(
+                    model=model_config["model_id"],
+                    prompt=prompt,
+                    provider=model_config["provider"],
+                    aws_region_name=region,
+                    timeout=deadline.timeout("upstream"),
+                ),
+            )
+        result = _to_dict(response)
+        _record_model(model_name, model_config, result.get("usage"))
+        return result, 200
+    except APIException:
+        raise
     except Exception as e:
         logger.error(f"Error in completions: {e}")
         raise APIException(str(e))
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def embeddings_handler(body):
     model_name = body.get("model")
     input_data = body.get("input")
     if not model_name or input_data is None:
         raise BadRequestException("Missing 'model' or 'input' in request body.")
     try:
-        model_config = get_model_config(model_name)
-        response = litellm.embeddings(
-            model=model_config["model_id"],
-            input=input_data,
-            provider=model_config["provider"],
-            aws_region=None,
-        )
-        return response, 200
+        with timing.phase("route"):
+            model_config = get_model_config(model_name)
+            _check_budget(model_config, prompt=input_data)
+
+        def call(inputs):
+            response = regions.invoke(
+                model_name,
+                model_config,
+                lambda region: litellm.embedding(
+                    model=model_config["model_id"],
+                    input=inputs,
+                    provider=model_config["provider"],
+                    aws_region_name=region,
+                    timeout=deadline.timeout("upstream"),
+                ),
+            )
+            return _to_dict(response)
+
+        with timing.phase("upstream"):
+            batcher = embedding_batcher.get_batcher()
+            if batcher is not None and model_config.get("supports_batch_embedding"):
+                result = batcher.embed(model_name, input_data, call)
+            else:
+                result = call(input_data)
+        _record_model(model_name, model_config, result.get("usage"))
+        return result, 200
+    except APIException:
+        raise
     except Exception as e:
         logger.error(f"Error in embeddings: {e}")
         raise APIException(str(e))
@@ -0,0 +1,10 @@
+# handlers/payloads.py
+# Presigned uploads for request bodies too large to send to the API directly.
+
+import offload
+import tracing
+
+
+@tracing.capture("handler")
+def create_payload_handler():
+    return offload.create_upload(), 200
@@ -5,11 +5,24 @@ from auth import get_user_boto3_session
 from errors import ForbiddenException, BadRequestException
 import os
 from aws_lambda_powertools import Tracer
-from utils import logger, tracer
+from utils import logger
+import tracing
 from src.shared.constants import *
+from src.shared.pagination import encode_cursor, decode_cursor
 
+# Cognito ListUsers returns at most 60 users per call.
+MAX_PAGE_SIZE = 60
 
-@tracer.capture_method
+# Friendly status names accepted by list_users, mapped to Cognito filter expressions.
+USER_STATUS_FILTERS = {
+    "active": 'status = "Enabled"',
+    "enabled": 'status = "Enabled"',
+    "disabled": 'status = "Disabled"',
+    "revoked": 'status = "Disabled"',
+}
+
+
+@tracing.capture("handler")
 def create_user_handler(event):
     """
     Creates a new Cognito user using the permissions of the calling user (via Cognito Identity Pool).
@@ -61,37 +74,119 @@ def create_user_handler(event):
         raise ForbiddenException(str(e))
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def get_user_handler(event, user_id):
     raise NotImplementedException(f"Not implemented: get_user {user_id}")
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def update_user_handler(event, user_id):
     body = event.json_body or {}
     raise NotImplementedException(f"Not implemented: update_user {user_id}")
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def delete_user_handler(event, user_id):
     raise NotImplementedException(f"Not implemented: delete_user {user_id}")
 
 
-@tracer.capture_method
+def _user_status_filter(status):
+    """
+    Translate a status query value into a Cognito ListUsers filter expression.
+    Unknown values are treated as Cognito user statuses (e.g. CONFIRMED).
+    """
+    key = status.strip().lower()
+    if key in USER_STATUS_FILTERS:
+        return USER_STATUS_FILTERS[key]
+    return f'cognito:user_status = "{status.strip().upper()}"'
+
+
+def _user_matches_status(user, status):
+    """
+    Client-side equivalent of _user_status_filter, used when the Cognito filter
+    slot is already taken by the owner filter (ListUsers accepts only one filter).
+    """
+    key = status.strip().lower()
+    if key in USER_STATUS_FILTERS:
+        return user["enabled"] == (USER_STATUS_FILTERS[key] == 'status = "Enabled"')
+    return user["user_status"] == status.strip().upper()
+
+
+def _format_user(user):
+    """
+    Convert a Cognito ListUsers entry into the API's user representation.
+    """
+    created = user.get("UserCreateDate")
+    return {
+        "username": user["Username"],
+        "enabled": user.get("Enabled", True),
+        "user_status": user.get("UserStatus"),
+        "created_at": created.isoformat() if hasattr(created, "isoformat") else created,
+        "attributes": {a["Name"]: a["Value"] for a in user.get("Attributes", [])},
+    }
+
+
+@tracing.capture("handler")
 def list_users_handler(event):
-    raise NotImplementedException("Not implemented: list_users")
+    """
+    Lists Cognito users one page at a time using the caller's permissions.
+    Query parameters:
+      - limit: page size (1-60, default 60)
+      - cursor: opaque cursor returned as next_cursor by the previous page
+      - owner: username prefix filter (applied by Cognito)
+      - status: active/enabled, disabled/revoked, or a Cognito user status
+    Each call issues a single ListUsers request, so the latency of a full listing
+    is paid by the client across pages rather than inside one Lambda invocation.
+    """
+    params = event.query_string_parameters or {}
+    try:
+        limit = int(params.get("limit") or MAX_PAGE_SIZE)
+    except ValueError:
+        raise BadRequestException("Query parameter 'limit' must be an integer.")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise BadRequestException(f"Query parameter 'limit' must be 1-{MAX_PAGE_SIZE}.")
+    try:
+        pagination_token = decode_cursor(params.get("cursor"))
+    except ValueError as e:
+        raise BadRequestException(str(e))
+    owner = params.get("owner")
+    status = params.get("status")
+
+    request = {"UserPoolId": PENNYWORTH_USER_POOL_ID, "Limit": limit}
+    if pagination_token:
+        request["PaginationToken"] = pagination_token
+    if owner:
+        if '"' in owner:
+            raise BadRequestException("Query parameter 'owner' must not contain quotes.")
+        request["Filter"] = f'username ^= "{owner}"'
+    elif status:
+        request["Filter"] = _user_status_filter(status)
+
+    session = get_user_boto3_session(event.raw_event)
+    cognito = session.client("cognito-idp")
+    try:
+        resp = cognito.list_users(**request)
+    except Exception as e:
+        raise ForbiddenException(str(e))
+
+    users = [_format_user(u) for u in resp.get("Users", [])]
+    if owner and status:
+        users = [u for u in users if _user_matches_status(u, status)]
+    next_cursor = encode_cursor(resp.get("PaginationToken"))
+    logger.info({"msg": "list_users page", "count": len(users), "more": bool(next_cursor)})
+    return {"data": users, "next_cursor": next_cursor, "has_more": bool(next_cursor)}, 200
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def create_or_rotate_apikey_handler(event, user_id):
     raise NotImplementedException(f"Not implemented: create_or_rotate_apikey {user_id}")
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def revoke_apikey_handler(event, user_id):
     raise NotImplementedException(f"Not implemented: revoke_apikey {user_id}")
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def get_apikey_status_handler(event, user_id):
     raise NotImplementedException(f"Not implemented: get_apikey_status {user_id}")
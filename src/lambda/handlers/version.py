@@ -1,9 +1,9 @@
 import os
 from version import API_SEMANTIC_VERSION
-from utils import tracer
+import tracing
 from src.shared.constants import *
 
-@tracer.capture_method
+@tracing.capture("handler")
 def version_handler():
     return {
         "Version": PENNYWORTH_API_VERSION,
@@ -1,7 +1,7 @@
-from utils import tracer
+import tracing
 
 
-@tracer.capture_method
+@tracing.capture("handler")
 def well_known_handler():
     import os
 
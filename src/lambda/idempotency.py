@@ -0,0 +1,175 @@
+# Idempotency-Key support for POST routes. The first request with a given key
+# (per caller and route) runs normally and its response is stored in the shared
+# state store; retries replay that response instead of re-executing (and
+# re-billing) the request. Follows the semantics of Powertools' idempotency
+# utility (in-progress marker bounded by the Lambda deadline, payload
+# validation, no caching of failures) on top of state.py.
+
+import base64
+import hashlib
+import json
+import time
+
+from aws_lambda_powertools.event_handler import Response
+
+from auth import caller_identity
+from errors import APIException, BadRequestException, UnprocessableEntityException
+from storage import get_object_store
+from utils import logger
+import metrics
+import state
+from src.shared.constants import *
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# Client errors that a retry may not repeat (budget/rate limits), so not stored.
+RETRYABLE_STATUSES = (429,)
+
+# Bodies larger than this go to the object store; DynamoDB items are capped at 400 KB.
+INLINE_BODY_BYTES = 300_000
+
+# In-progress markers outlive the request by at most this much when there is
+# no Lambda context to bound them.
+DEFAULT_IN_PROGRESS_SECONDS = 60
+
+
+def _record_key(caller, event, idempotency_key):
+    digest = hashlib.sha256(
+        f"{caller}\n{event.http_method} {event.path}\n{idempotency_key}".encode()
+    ).hexdigest()
+    return f"idem#{digest}"
+
+
+def _request_hash(event):
+    ref = event.headers.get("X-Pennyworth-Body-Ref") or ""
+    return hashlib.sha256(f"{ref}\n{event.body or ''}".encode()).hexdigest()
+
+
+def _in_progress_seconds(context):
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        return context.get_remaining_time_in_millis() / 1000.0
+    return DEFAULT_IN_PROGRESS_SECONDS
+
+
+def _save_response(record_key, request_hash, response):
+    body = response.body
+    encoding = "text"
+    if isinstance(body, bytes):
+        body, encoding = base64.b64encode(body).decode(), "base64"
+    record = {
+        "status": "completed",
+        "request_hash": request_hash,
+        "status_code": response.status_code,
+        "headers": {k: v for k, v in (response.headers or {}).items()},
+        "encoding": encoding,
+    }
+    if body is not None and len(body) > INLINE_BODY_BYTES:
+        body_key = f"idempotency/{record_key.split('#', 1)[1]}"
+        get_object_store().put(body_key, body)
+        record["body_key"] = body_key
+    else:
+        record["body"] = body
+    state.get_store().put(record_key, record, ttl_seconds=PENNYWORTH_IDEMPOTENCY_TTL)
+
+
+def _error_response(exception):
+    """The response the API's exception handler gives for an APIException."""
+    return Response(
+        status_code=exception.status_code,
+        body=json.dumps({"error": str(exception)}),
+        headers=getattr(exception, "headers", None),
+    )
+
+
+def _replay(record):
+    body = record.get("body")
+    if "body_key" in record:
+        body = (get_object_store().get(record["body_key"]) or b"").decode()
+    if record.get("encoding") == "base64" and body is not None:
+        body = base64.b64decode(body)
+    headers = dict(record.get("headers") or {})
+    headers[REPLAYED_HEADER] = "true"
+    logger.info({"msg": "idempotent replay", "status": record["status_code"]})
+    invocation = metrics.current()
+    if invocation is not None:
+        invocation.add("IdempotentReplays", 1)
+    return Response(status_code=record["status_code"], body=body, headers=headers)
+
+
+def _check_existing(record, request_hash):
+    """
+    Response for a request whose key is already recorded: the stored response,
+    409 while the first request is in flight, or None if its marker is stale.
+    Raises if the key was used for a different request.
+    """
+    if record["request_hash"] != request_hash:
+        raise UnprocessableEntityException(
+            f"{IDEMPOTENCY_HEADER} was already used with a different request body."
+        )
+    if record["status"] == "completed":
+        return _replay(record)
+    remaining = record.get("expires", 0) - time.time()
+    if remaining > 0:
+        message = f"A request with this {IDEMPOTENCY_HEADER} is still in progress; retry later."
+        logger.warning({"status": 409, "error": message})
+        return Response(
+            status_code=409,
+            body=json.dumps({"error": message}),
+            headers={"Retry-After": str(max(1, min(int(remaining), 30)))},
+        )
+    return None
+
+
+def idempotency_middleware(app, next_middleware):
+    """
+    Applies Idempotency-Key semantics to POST requests that send the header.
+    Responses with status < 500 (other than 429), including client errors
+    raised as APIExceptions, are stored and replayed for
+    PENNYWORTH_IDEMPOTENCY_TTL seconds; server errors and 429s clear the marker
+    so the request can be retried.
+    """
+    event = app.current_event
+    idempotency_key = event.headers.get(IDEMPOTENCY_HEADER)
+    if event.http_method != "POST" or not idempotency_key:
+        return next_middleware(app)
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise BadRequestException(f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters.")
+
+    store = state.get_store()
+    record_key = _record_key(caller_identity(event.raw_event), event, idempotency_key)
+    request_hash = _request_hash(event)
+    marker = {
+        "status": "in_progress",
+        "request_hash": request_hash,
+        "expires": time.time() + _in_progress_seconds(app.lambda_context),
+    }
+    while not store.put(record_key, marker, PENNYWORTH_IDEMPOTENCY_TTL, if_absent=True):
+        existing = store.get(record_key)
+        if existing is None:
+            continue  # Expired or deleted between the put and the get.
+        response = _check_existing(existing, request_hash)
+        if response is not None:
+            return response
+        # A stale in-progress marker from a request that never finished.
+        store.delete(record_key)
+
+    try:
+        response = next_middleware(app)
+    except APIException as e:
+        _finish(record_key, request_hash, _error_response(e))
+        raise
+    except Exception:
+        store.delete(record_key)
+        raise
+    _finish(record_key, request_hash, response)
+    return response
+
+
+def _finish(record_key, request_hash, response):
+    """Store the response for replay, or clear the marker if a retry may succeed."""
+    if response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES:
+        state.get_store().delete(record_key)
+    else:
+        _save_response(record_key, request_hash, response)
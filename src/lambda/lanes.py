@@ -0,0 +1,102 @@
+# Priority lanes. Every request runs in one of LANES, highest priority first:
+# "interactive" (the default) or "batch". A request takes the lowest-priority
+# lane any rule gives it, so rules can only demote:
+#   permission  "priority:batch" in the caller's permissions, in the
+#               comma-separated format `pennyworth create --permissions` stores
+#               for keys (for Cognito users, the custom:permissions claim)
+#   header      X-Pennyworth-Priority: batch
+#   route       requests run by the batch worker, and paths matching
+#               PENNYWORTH_BATCH_LANE_ROUTES (e.g. "/v1/embeddings")
+# Lanes matter once upstream capacity is constrained (limiter.py): batch calls
+# may only hold PENNYWORTH_BATCH_LANE_SHARE of a limit's slots, wait longer for
+# one, and give way to interactive calls waiting in the same container.
+
+from contextvars import ContextVar
+from fnmatch import fnmatchcase
+
+from auth import caller_principal
+import metrics
+from src.shared.constants import *
+
+LANES = ("interactive", "batch")
+
+PRIORITY_HEADER = "X-Pennyworth-Priority"
+
+PERMISSION_PREFIX = "priority:"
+
+_batch_routes = [p.strip() for p in PENNYWORTH_BATCH_LANE_ROUTES.split(",") if p.strip()]
+
+_current = ContextVar("pennyworth_lane", default=None)
+
+
+def lowest(*lanes):
+    """The lowest-priority lane of those given (None entries ignored); interactive if none."""
+    named = [lane for lane in lanes if lane in LANES]
+    return max(named, key=LANES.index) if named else LANES[0]
+
+
+def permission_lane(permissions):
+    """The lane a comma-separated permissions string asks for, or None."""
+    lanes = [
+        p.strip()[len(PERMISSION_PREFIX) :]
+        for p in (permissions or "").split(",")
+        if p.strip().startswith(PERMISSION_PREFIX)
+    ]
+    return lowest(*lanes) if any(lane in LANES for lane in lanes) else None
+
+
+def classify(event):
+    """The lane for a request event. Caller permissions are only looked up when they could matter."""
+    headers = event.get("headers") or {}
+    header = (headers.get(PRIORITY_HEADER) or headers.get(PRIORITY_HEADER.lower()) or "").strip().lower()
+    path = event.get("path") or ""
+    route = "batch" if any(fnmatchcase(path, p) for p in _batch_routes) else None
+    lane = lowest(header, route)
+    if lane == LANES[-1]:
+        return lane
+    _, claims = caller_principal(event)
+    return lowest(lane, permission_lane((claims or {}).get("custom:permissions")))
+
+
+class LaneSelector:
+    """Classifies its request on first use, so requests that never call upstream skip it."""
+
+    def __init__(self, event):
+        self.event = event
+        self._lane = None
+
+    def lane(self):
+        if self._lane is None:
+            self._lane = classify(self.event)
+            invocation = metrics.current()
+            if invocation is not None:
+                invocation.set_lane(self._lane)
+        return self._lane
+
+
+def start(event):
+    """Begin lane selection for a new request."""
+    _current.set(LaneSelector(event))
+
+
+def enter(lane):
+    """Run the rest of the current context (e.g. a batch worker thread) in `lane`."""
+    _current.set(lane)
+
+
+def current():
+    """The lane of the request being handled."""
+    value = _current.get()
+    if value is None:
+        return LANES[0]
+    return value if isinstance(value, str) else value.lane()
+
+
+def share(lane):
+    """Fraction of a concurrency limit's slots calls in `lane` may hold."""
+    return PENNYWORTH_BATCH_LANE_SHARE if lane == "batch" else 1.0
+
+
+def wait_ms(lane):
+    """Longest a call in `lane` waits for a slot before it is shed."""
+    return PENNYWORTH_BATCH_LANE_WAIT_MS if lane == "batch" else PENNYWORTH_CONCURRENCY_LIMIT_WAIT_MS
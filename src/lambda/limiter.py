@@ -0,0 +1,211 @@
+# Adaptive concurrency limits for upstream calls, one per (provider, region,
+# model), shared by every container through the state store (state.py).
+#
+# The limit follows AIMD: it starts at PENNYWORTH_CONCURRENCY_LIMIT_MAX, is
+# multiplied by PENNYWORTH_CONCURRENCY_LIMIT_BACKOFF when the provider throttles
+# (at most once per PENNYWORTH_CONCURRENCY_LIMIT_COOLDOWN_SECONDS, fleet-wide),
+# and grows by one after a full limit's worth of successful calls. It is kept
+# as an atomic counter (offset from the maximum) and read through a short cache.
+#
+# A call holds one of `limit` slots for its duration. Slots are state-store
+# items written only if absent, with a TTL of the request's deadline, so a
+# container that dies mid-call frees its slots on its own. When a shrinking
+# limit leaves calls holding slots above it, those finish normally and the
+# slots are not handed out again. Priority lanes (lanes.py) decide how many of
+# the slots a call may take and how long it queues for one.
+
+import random
+import threading
+import time
+
+from aws_lambda_powertools.metrics import MetricUnit
+
+from errors import TooManyRequestsException
+from utils import logger
+import deadline
+import lanes
+import metrics
+import state
+from src.shared.constants import *
+
+# Seconds the shared limit is cached per container.
+LIMIT_CACHE_SECONDS = 1.0
+
+# Idle limits are forgotten (and start again at the maximum) after this long.
+LIMIT_TTL_SECONDS = 3600
+
+# Lease on a slot when the request has no deadline.
+DEFAULT_LEASE_SECONDS = 900
+
+# Random slots tried per attempt, and the pause between attempts while waiting.
+PROBES = 3
+POLL_SECONDS = 0.02
+
+_limiters = {}
+_lock = threading.Lock()
+
+# Calls of this container waiting for a slot, by lane.
+_waiting = {lane: 0 for lane in lanes.LANES}
+
+
+def enabled():
+    return PENNYWORTH_CONCURRENCY_LIMIT_MAX > 0
+
+
+class Lease:
+    """One held slot; report the call's outcome, then release it."""
+
+    def __init__(self, limiter, slot):
+        self.limiter = limiter
+        self.slot = slot
+
+    def release(self, throttled=False):
+        self.limiter.store.delete(self.slot)
+        if throttled:
+            self.limiter.throttled()
+        else:
+            self.limiter.succeeded()
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one provider/region/model."""
+
+    def __init__(self, name, store):
+        self.name = name
+        self.store = store
+        self.key = f"limit#{name}"
+        self._cached = None
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def limit(self):
+        """Current limit (float), from a cache refreshed every LIMIT_CACHE_SECONDS."""
+        now = time.monotonic()
+        with self._lock:
+            if self._cached is not None and now - self._cached[1] < LIMIT_CACHE_SECONDS:
+                return self._cached[0]
+        offset = self.store.get_counter(self.key, "offset")
+        return self._remember(offset, now)
+
+    def _remember(self, offset, now=None):
+        value = PENNYWORTH_CONCURRENCY_LIMIT_MAX + offset
+        value = min(max(value, PENNYWORTH_CONCURRENCY_LIMIT_MIN), PENNYWORTH_CONCURRENCY_LIMIT_MAX)
+        with self._lock:
+            self._cached = (value, time.monotonic() if now is None else now)
+        return value
+
+    def _adjust(self, delta):
+        offset = self.store.increment(self.key, "offset", delta, ttl_seconds=LIMIT_TTL_SECONDS)
+        return self._remember(offset)
+
+    def try_acquire(self, lease_seconds, share=1.0):
+        """
+        A Lease on a free slot among the first `share` of the limit, or None
+        if the probed slots are all taken.
+        """
+        slots = max(int(self.limit() * share), 1)
+        for index in random.sample(range(slots), min(PROBES, slots)):
+            slot = f"{self.key}#slot#{index}"
+            if self.store.put(slot, 1, ttl_seconds=lease_seconds, if_absent=True):
+                return Lease(self, slot)
+        return None
+
+    def succeeded(self):
+        """Additive increase: +1 once a full limit's worth of calls has succeeded."""
+        limit = self.limit()
+        with self._lock:
+            self._successes += 1
+            if self._successes < limit or limit >= PENNYWORTH_CONCURRENCY_LIMIT_MAX:
+                return
+            self._successes = 0
+        self._adjust(1)
+
+    def throttled(self):
+        """Multiplicative decrease, applied by the first container to see a throttle per cooldown."""
+        won = self.store.put(
+            f"{self.key}#cooldown",
+            1,
+            ttl_seconds=PENNYWORTH_CONCURRENCY_LIMIT_COOLDOWN_SECONDS,
+            if_absent=True,
+        )
+        if not won:
+            return
+        current = self._adjust(0)
+        target = max(current * PENNYWORTH_CONCURRENCY_LIMIT_BACKOFF, PENNYWORTH_CONCURRENCY_LIMIT_MIN)
+        with self._lock:
+            self._successes = 0
+        value = self._adjust(target - current)
+        logger.warning({"msg": "concurrency limit decreased", "limiter": self.name, "limit": round(value, 2)})
+
+
+def get(provider, region, model_name):
+    """The limiter for a provider/region/model, created on first use."""
+    name = f"{provider}#{region}#{model_name}"
+    with _lock:
+        if name not in _limiters:
+            _limiters[name] = AdaptiveLimiter(name, state.get_store())
+        return _limiters[name]
+
+
+def _ahead(lane):
+    """True while calls of a higher-priority lane wait for a slot in this container."""
+    with _lock:
+        return any(_waiting[other] for other in lanes.LANES[: lanes.LANES.index(lane)])
+
+
+def acquire(model_name, model_config, region, wait=False):
+    """
+    Take a slot for a call to `model_name` in `region`, within the share of the
+    limit the request's lane (lanes.py) may use. Returns None at once if none
+    is free, unless `wait`, in which case the call queues in its lane for up to
+    the lane's wait (and no longer than the request deadline allows), behind
+    higher-priority lanes, and is then shed with a 429.
+    """
+    limiter = get(model_config.get("provider", "bedrock"), region, model_name)
+    lane = lanes.current()
+    share = lanes.share(lane)
+    request_deadline = deadline.current()
+    lease_seconds = DEFAULT_LEASE_SECONDS
+    if request_deadline is not None:
+        lease_seconds = max(int(request_deadline.remaining()) + 1, 1)
+    invocation = metrics.current()
+    lease = None if _ahead(lane) else limiter.try_acquire(lease_seconds, share)
+    if lease is not None or not wait:
+        return lease
+    started = time.monotonic()
+    give_up = started + lanes.wait_ms(lane) / 1000.0
+    if request_deadline is not None:
+        left = request_deadline.remaining() - deadline.MIN_CALL_SECONDS
+        give_up = min(give_up, time.monotonic() + left)
+    with _lock:
+        _waiting[lane] += 1
+        depth = _waiting[lane]
+    if invocation is not None:
+        invocation.add("QueueDepth", depth)
+    try:
+        while time.monotonic() < give_up:
+            time.sleep(POLL_SECONDS)
+            if _ahead(lane):
+                continue
+            lease = limiter.try_acquire(lease_seconds, share)
+            if lease is not None:
+                if invocation is not None:
+                    waited_ms = (time.monotonic() - started) * 1000
+                    invocation.add("QueueWait", waited_ms, MetricUnit.Milliseconds)
+                return lease
+    finally:
+        with _lock:
+            _waiting[lane] -= 1
+    raise shed(model_name, limiter.name)
+
+
+def shed(model_name, name=None):
+    """The 429 for a request turned away because every region is at its limit."""
+    invocation = metrics.current()
+    if invocation is not None:
+        invocation.add("ConcurrencyLimitShed", 1)
+    logger.warning({"msg": "request shed at concurrency limit", "model": model_name, "limiter": name})
+    return TooManyRequestsException(
+        f"Upstream capacity for {model_name} is exhausted; retry shortly.",
+        headers={"Retry-After": "1"},
+    )
@@ -0,0 +1,64 @@
+# Per-owner listings of files and batches (handlers/files.py, batches.py). For
+# every object a caller creates, an empty marker is written to the object store
+# under index/<kind>/<owner digest>/<inverted created_at>.<id>[.<tag>], so a
+# listing is a LIST of the caller's own prefix, already newest first, and only
+# the objects on the requested page are read. The state store is not used: it
+# has no range reads, and the markers live and die with the objects they index
+# (batch markers expire with batches/, see the bucket's lifecycle rules).
+
+import hashlib
+
+from errors import BadRequestException
+from storage import get_object_store
+
+INDEX_PREFIX = "index/"
+
+# created_at values are stored as MAX_TIMESTAMP - created_at, zero-padded, so
+# that the store's lexicographic key order is newest first.
+MAX_TIMESTAMP = 10**10
+
+
+def _prefix(kind, owner):
+    digest = hashlib.sha256(owner.encode()).hexdigest()[:32]
+    return f"{INDEX_PREFIX}{kind}/{digest}/"
+
+
+def _key(kind, owner, created_at, object_id, tag):
+    name = f"{MAX_TIMESTAMP - created_at:010d}.{object_id}"
+    return _prefix(kind, owner) + (f"{name}.{tag}" if tag else name)
+
+
+def add(kind, owner, created_at, object_id, tag=None):
+    """Index a new object of `owner`; `tag` (no dots) can be filtered on when listing."""
+    get_object_store().put(_key(kind, owner, created_at, object_id, tag), b"")
+
+
+def remove(kind, owner, created_at, object_id, tag=None):
+    get_object_store().delete(_key(kind, owner, created_at, object_id, tag))
+
+
+def ids(kind, owner, tag=None):
+    """Ids of `owner`'s objects of `kind`, newest first, optionally only those tagged `tag`."""
+    prefix = _prefix(kind, owner)
+    result = []
+    for key in get_object_store().list(prefix):
+        _, object_id, *rest = key[len(prefix) :].split(".", 2)
+        if tag is None or rest == [tag]:
+            result.append(object_id)
+    return result
+
+
+def page_params(params, default_limit, max_limit):
+    """(limit, after) from a list request's query parameters."""
+    try:
+        limit = min(max(int(params.get("limit", default_limit)), 1), max_limit)
+    except ValueError:
+        raise BadRequestException("'limit' must be an integer.")
+    return limit, params.get("after")
+
+
+def page(object_ids, limit, after=None):
+    """(up to `limit` ids following `after`, whether more follow)."""
+    if after:
+        object_ids = object_ids[object_ids.index(after) + 1 :] if after in object_ids else []
+    return object_ids[:limit], len(object_ids) > limit
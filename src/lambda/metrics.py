@@ -0,0 +1,153 @@
+# Per-invocation CloudWatch metrics, emitted as one Embedded Metric Format log line.
+
+import json
+import time
+from contextvars import ContextVar
+
+from aws_lambda_powertools.metrics import MetricUnit
+from aws_lambda_powertools.metrics.provider.cloudwatch_emf.cloudwatch import (
+    AmazonCloudWatchEMFProvider,
+)
+
+from utils import logger
+from src.shared.constants import *
+
+_current = ContextVar("pennyworth_metrics", default=None)
+
+
+def usage_cost(usage, model_config):
+    """
+    Estimated USD cost of an OpenAI-style usage dict at the model's prices, with
+    cache reads and writes billed at their own rates. None if the model has no pricing.
+    As in LiteLLM, prompt_tokens includes cache reads but not cache writes
+    (cache_creation_input_tokens), which are billed on top.
+    """
+    if not usage or not model_config or "input_cost_per_1k" not in model_config:
+        return None
+    prompt = usage.get("prompt_tokens") or 0
+    completion = usage.get("completion_tokens") or 0
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    written = usage.get("cache_creation_input_tokens") or 0
+    input_cost = model_config["input_cost_per_1k"]
+    return (
+        (prompt - cached) * input_cost
+        + cached * model_config.get("cache_read_cost_per_1k", input_cost)
+        + written * model_config.get("cache_write_cost_per_1k", input_cost)
+        + completion * model_config.get("output_cost_per_1k", 0.0)
+    ) / 1000.0
+
+
+class InvocationMetrics:
+    """
+    Collects the metrics for a single request. Values added under the same name
+    are summed, so handlers can record usage incrementally. Nothing is sent
+    synchronously; flush() prints a single EMF document that CloudWatch Logs
+    turns into metrics.
+    """
+
+    def __init__(self, cold=False):
+        self.started = time.perf_counter()
+        self.route = "unknown"
+        self.model = None
+        self.region = None
+        self.lane = None
+        self.values = {}
+        self.metadata = {}
+        if cold:
+            self.add("ColdStart", 1, MetricUnit.Count)
+
+    def add(self, name, value, unit=MetricUnit.Count):
+        current, _ = self.values.get(name, (0, unit))
+        self.values[name] = (current + value, unit)
+
+    def set_route(self, route):
+        self.route = route
+
+    def set_model(self, model):
+        self.model = model
+
+    def set_region(self, region):
+        self.region = region
+
+    def set_lane(self, lane):
+        self.lane = lane
+
+    def record_usage(self, usage, model_config=None):
+        """
+        Record token counts (and estimated USD cost, when the model has pricing)
+        from an OpenAI-style usage dict.
+        """
+        if not usage:
+            return
+        prompt = usage.get("prompt_tokens") or 0
+        completion = usage.get("completion_tokens") or 0
+        self.add("PromptTokens", prompt)
+        self.add("CompletionTokens", completion)
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        written = usage.get("cache_creation_input_tokens") or 0
+        self.add("CachedPromptTokens", cached)
+        self.add("CacheWriteTokens", written)
+        self.add("CacheHit", 1 if cached else 0)
+        cost = usage_cost(usage, model_config)
+        if cost is not None:
+            self.add("EstimatedCost", cost, MetricUnit.NoUnit)
+
+    def finish(self, status_code, timer=None):
+        """Record request-level metrics once the response status is known."""
+        self.status = str(status_code)
+        self.add("Requests", 1)
+        self.add("Errors", 1 if status_code >= 500 else 0)
+        self.add("Latency", (time.perf_counter() - self.started) * 1000, MetricUnit.Milliseconds)
+        if timer is not None:
+            if "upstream" in timer.phases:
+                self.add("UpstreamLatency", timer.phases["upstream"], MetricUnit.Milliseconds)
+            if "ttfb" in timer.phases:
+                self.add("TimeToFirstToken", timer.phases["ttfb"], MetricUnit.Milliseconds)
+
+    def to_emf(self):
+        """
+        Serialize as an EMF document with four dimension sets, so the same
+        values can be graphed per route/status, per model, per model/region
+        and per priority lane.
+        """
+        provider = AmazonCloudWatchEMFProvider(
+            namespace=PENNYWORTH_METRICS_NAMESPACE, service="pennyworth"
+        )
+        provider.add_dimension("route", self.route)
+        provider.add_dimension("status", getattr(self, "status", "unknown"))
+        provider.add_dimension("model", self.model or "none")
+        provider.add_dimension("region", self.region or "none")
+        provider.add_dimension("lane", self.lane or "none")
+        for name, (value, unit) in self.values.items():
+            provider.add_metric(name=name, unit=unit, value=value)
+        for key, value in self.metadata.items():
+            provider.add_metadata(key=key, value=value)
+        emf = provider.serialize_metric_set()
+        emf["_aws"]["CloudWatchMetrics"][0]["Dimensions"] = [
+            ["service", "route", "status"],
+            ["service", "model"],
+            ["service", "model", "region"],
+            ["service", "lane"],
+        ]
+        return emf
+
+    def flush(self):
+        try:
+            print(json.dumps(self.to_emf(), separators=(",", ":")))
+        except Exception as e:
+            logger.warning({"msg": "metrics flush failed", "error": str(e)})
+
+
+def start(cold=False):
+    """Begin collecting metrics for a new request (None when metrics are disabled)."""
+    if not PENNYWORTH_METRICS_ENABLED:
+        _current.set(None)
+        return None
+    invocation = InvocationMetrics(cold=cold)
+    _current.set(invocation)
+    return invocation
+
+
+def current():
+    """Return the metrics collector for the request being handled, or None."""
+    return _current.get()
@@ -1,25 +1,219 @@
 # Model router for mapping friendly model names to Bedrock model IDs
 
+from errors import BadRequestException
+from utils import logger
+
+# Friendly model name -> provider config. Extend as new models/providers are added.
+# Prices are USD per 1,000 tokens (Bedrock on-demand) and drive cost estimates.
+# context_window / max_output_tokens (tokens) drive the pre-dispatch size check.
+# supports_prompt_caching enables cache points on stable prompt prefixes; cache
+# reads and writes are billed at cache_read/cache_write_cost_per_1k.
+# regions lists the Bedrock regions a model may be invoked in (see regions.py);
+# without it, only PENNYWORTH_AWS_REGION is used.
+# auto_tier (capability, higher is stronger) makes a chat model eligible for the
+# `auto` virtual model; supports_tools marks models that accept tool definitions.
+# supports_batch_embedding marks embedding models whose provider API takes many
+# inputs in one call (Cohere, up to 96), so concurrent requests are batched
+# (embedding_batcher.py); litellm sends Titan one call per input, so batching
+# Titan requests would only serialize them.
+MODEL_MAP = {
+    "claude-instant": {
+        "provider": "bedrock",
+        "model_id": "anthropic.claude-instant-v1",
+        "input_cost_per_1k": 0.0008,
+        "output_cost_per_1k": 0.0024,
+        "context_window": 100000,
+        "max_output_tokens": 4096,
+        "auto_tier": 1,
+        "regions": ["us-east-1", "us-west-2"],
+    },
+    "claude-v2": {
+        "provider": "bedrock",
+        "model_id": "anthropic.claude-v2",
+        "input_cost_per_1k": 0.008,
+        "output_cost_per_1k": 0.024,
+        "context_window": 100000,
+        "max_output_tokens": 4096,
+        "auto_tier": 2,
+        "regions": ["us-east-1", "us-west-2"],
+    },
+    "claude-3-7-sonnet": {
+        "provider": "bedrock",
+        "model_id": "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+        "input_cost_per_1k": 0.003,
+        "output_cost_per_1k": 0.015,
+        "cache_write_cost_per_1k": 0.00375,
+        "cache_read_cost_per_1k": 0.0003,
+        "context_window": 200000,
+        "max_output_tokens": 8192,
+        "supports_prompt_caching": True,
+        "auto_tier": 3,
+        "supports_tools": True,
+        "regions": ["us-east-1", "us-east-2", "us-west-2"],
+    },
+    "claude-3-5-haiku": {
+        "provider": "bedrock",
+        "model_id": "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+        "input_cost_per_1k": 0.0008,
+        "output_cost_per_1k": 0.004,
+        "cache_write_cost_per_1k": 0.001,
+        "cache_read_cost_per_1k": 0.00008,
+        "context_window": 200000,
+        "max_output_tokens": 8192,
+        "supports_prompt_caching": True,
+        "auto_tier": 2,
+        "supports_tools": True,
+        "regions": ["us-east-1", "us-east-2", "us-west-2"],
+    },
+    "titan-text": {
+        "provider": "bedrock",
+        "model_id": "amazon.titan-text-lite-v1",
+        "input_cost_per_1k": 0.00015,
+        "output_cost_per_1k": 0.0002,
+        "context_window": 4096,
+        "max_output_tokens": 4096,
+        "auto_tier": 0,
+        "regions": ["us-east-1", "us-west-2"],
+    },
+    "titan-embed-text": {
+        "provider": "bedrock",
+        "model_id": "amazon.titan-embed-text-v2:0",
+        "input_cost_per_1k": 0.00002,
+        "context_window": 8192,
+        "regions": ["us-east-1", "us-west-2"],
+    },
+    "cohere-embed-english": {
+        "provider": "bedrock",
+        "model_id": "cohere.embed-english-v3",
+        "input_cost_per_1k": 0.0001,
+        "context_window": 512,
+        "supports_batch_embedding": True,
+        "regions": ["us-east-1", "us-west-2"],
+    },
+    # Add more models here as needed
+}
+
+
 def get_model_config(model_name):
     """
     Map a friendly model name to Bedrock model/provider config.
-    Extend this mapping as new models/providers are added.
-    """
-    model_map = {
-        "claude-instant": {
-            "provider": "bedrock",
-            "model_id": "anthropic.claude-instant-v1"
-        },
-        "claude-v2": {
-            "provider": "bedrock",
-            "model_id": "anthropic.claude-v2"
-        },
-        "titan-text": {
-            "provider": "bedrock",
-            "model_id": "amazon.titan-text-lite-v1"
-        },
-        # Add more models here as needed
-    }
-    if model_name not in model_map:
+    Extend MODEL_MAP as new models/providers are added.
+    """
+    if model_name not in MODEL_MAP:
         raise ValueError(f"Model '{model_name}' is not supported.")
-    return model_map[model_name] 
\ No newline at end of file
+    return MODEL_MAP[model_name]
+
+
+# --- `auto` routing ---
+# Requests for the virtual model "auto" go to the cheapest eligible model that
+# meets the request's requirements. Routing is a pure function of cheap request
+# features, so the same request always routes to the same model.
+
+AUTO_MODEL = "auto"
+
+# Model whose projected cost the savings of an `auto` decision are measured against.
+AUTO_BASELINE_MODEL = "claude-3-7-sonnet"
+
+# Completion tokens assumed for cost projections when max_tokens is unset.
+AUTO_DEFAULT_OUTPUT_TOKENS = 1024
+
+# Remaining budget (USD) below which the tier rules are waived and the cheapest
+# model that can serve the request at all is used.
+AUTO_LOW_BUDGET_USD = 1.0
+
+# (rule, predicate over features, minimum auto_tier), checked in order; the
+# highest minimum of all matching rules applies.
+AUTO_RULES = (
+    ("long_prompt", lambda f: f["prompt_tokens"] > 16000, 2),
+    ("long_output", lambda f: (f["max_tokens"] or 0) > 2048, 2),
+    ("tools", lambda f: f["tools"], 2),
+    ("medium_prompt", lambda f: f["prompt_tokens"] > 2000, 1),
+)
+
+
+def routing_features(messages=None, prompt=None, tools=None, max_tokens=None, budget_remaining=None):
+    """
+    Cheap request features for `auto` routing. Prompt sizes come from UTF-8
+    byte counts: `prompt_tokens` estimates the token count (about four bytes per
+    token) and `prompt_tokens_max` bounds it (at least one byte per token).
+    """
+    if messages is not None:
+        size = sum(len(str(m.get("content") or "").encode()) + 32 for m in messages)
+    else:
+        size = len(str(prompt or "").encode())
+    return {
+        "prompt_tokens": size // 4,
+        "prompt_tokens_max": size,
+        "tools": bool(tools),
+        "max_tokens": max_tokens,
+        "budget_remaining": budget_remaining,
+    }
+
+
+def projected_cost(config, features):
+    """Estimated USD cost of a request with routing_features() `features` on `config`."""
+    output_tokens = features["max_tokens"] or AUTO_DEFAULT_OUTPUT_TOKENS
+    return (
+        features["prompt_tokens"] * config.get("input_cost_per_1k", 0)
+        + output_tokens * config.get("output_cost_per_1k", 0)
+    ) / 1000
+
+
+def _can_serve(config, features):
+    """Hard requirements: the prompt and completion fit, and tools are supported."""
+    max_output = config.get("max_output_tokens", 0)
+    reserve = min(features["max_tokens"] or AUTO_DEFAULT_OUTPUT_TOKENS, max_output)
+    if features["max_tokens"] and features["max_tokens"] > max_output:
+        return False
+    if features["tools"] and not config.get("supports_tools"):
+        return False
+    return features["prompt_tokens_max"] + reserve <= config.get("context_window", 0)
+
+
+def select_auto_model(features):
+    """
+    Pick the model for an `auto` request: the cheapest (by projected cost, then
+    name) eligible model that can serve it and whose auto_tier meets every
+    matching rule. Returns (model_name, decision), where decision explains the
+    choice and its projected savings against AUTO_BASELINE_MODEL.
+    """
+    matched = [(name, tier) for name, predicate, tier in AUTO_RULES if predicate(features)]
+    min_tier = max((tier for _, tier in matched), default=0)
+    low_budget = (
+        features["budget_remaining"] is not None
+        and features["budget_remaining"] < AUTO_LOW_BUDGET_USD
+    )
+    if low_budget:
+        min_tier = 0
+    candidates = [
+        (projected_cost(config, features), name)
+        for name, config in MODEL_MAP.items()
+        if "auto_tier" in config and _can_serve(config, features)
+    ]
+    if not candidates:
+        raise BadRequestException("No model can serve this request; choose a model explicitly.")
+    preferred = [c for c in candidates if MODEL_MAP[c[1]]["auto_tier"] >= min_tier]
+    cost, model_name = min(preferred or candidates)
+    baseline = projected_cost(MODEL_MAP[AUTO_BASELINE_MODEL], features)
+    decision = {
+        "model": model_name,
+        "rules": [name for name, _ in matched] + (["low_budget"] if low_budget else []),
+        "min_tier": min_tier,
+        "projected_cost": round(cost, 6),
+        "baseline_model": AUTO_BASELINE_MODEL,
+        "projected_savings": round(max(baseline - cost, 0.0), 6),
+    }
+    return model_name, decision
+
+
+def resolve_model(model_name, **features):
+    """
+    Resolve a requested model name to (model_name, config). The virtual model
+    `auto` is routed by select_auto_model() from routing_features(**features);
+    any other name is looked up with get_model_config().
+    """
+    if model_name != AUTO_MODEL:
+        return model_name, get_model_config(model_name)
+    model_name, decision = select_auto_model(routing_features(**features))
+    logger.info({"msg": "auto model routing", **decision})
+    return model_name, MODEL_MAP[model_name]
@@ -0,0 +1,134 @@
+# Large-payload offload. Synchronous Lambda payloads are capped at 6 MB, so:
+# - responses whose body exceeds PENNYWORTH_OFFLOAD_THRESHOLD_BYTES are streamed
+#   to the files bucket and replaced by a 303 redirect to a presigned GET URL;
+# - requests may instead carry an `X-Pennyworth-Body-Ref: s3://bucket/payloads/...`
+#   header naming a JSON body uploaded through a presigned PUT (POST /v1/payloads).
+
+import base64
+import io
+import json
+import time
+import uuid
+
+from errors import BadRequestException, NotFoundException
+from storage import get_object_store, parse_uri
+from utils import logger
+import tracing
+from src.shared.constants import *
+
+BODY_REF_HEADER = "X-Pennyworth-Body-Ref"
+PAYLOAD_PREFIX = "payloads/"
+RESPONSE_PREFIX = "offload/"
+URL_EXPIRES_SECONDS = 3600
+
+# Characters of response body encoded per read; a multiple of 4 so base64
+# bodies decode chunk by chunk.
+CHUNK_CHARS = 1024 * 1024
+
+
+class _BodyReader(io.RawIOBase):
+    """
+    File-like view of a response body string that encodes (or base64-decodes)
+    it one chunk at a time, so uploading never holds a second full copy.
+    """
+
+    def __init__(self, body, is_base64=False):
+        self.body = body
+        self.decode = base64.b64decode if is_base64 else str.encode
+        self.offset = 0
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending and self.offset < len(self.body):
+            chunk = self.body[self.offset : self.offset + CHUNK_CHARS]
+            self.offset += CHUNK_CHARS
+            self.pending = self.decode(chunk)
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+
+def create_upload():
+    """Reserve a payload key and return a presigned PUT URL plus its s3:// reference."""
+    store = get_object_store()
+    payload_id = f"payload-{uuid.uuid4().hex}"
+    key = f"{PAYLOAD_PREFIX}{payload_id}.json"
+    return {
+        "id": payload_id,
+        "object": "payload",
+        "method": "PUT",
+        "url": store.presigned_url(key, "put", URL_EXPIRES_SECONDS),
+        "ref": store.uri(key),
+        "expires_at": int(time.time()) + URL_EXPIRES_SECONDS,
+    }
+
+
+@tracing.capture("storage")
+def load_json_reference(ref):
+    """
+    Parse the JSON request body stored at an s3:// reference. Only payloads
+    uploaded via create_upload() (the files bucket, payloads/ prefix) are allowed.
+    """
+    store = get_object_store()
+    try:
+        bucket, key = parse_uri(ref)
+    except ValueError as e:
+        raise BadRequestException(str(e))
+    if bucket != store.bucket or not key.startswith(PAYLOAD_PREFIX):
+        raise BadRequestException(f"{BODY_REF_HEADER} must reference a payload from /payloads.")
+    body = store.open(key)
+    if body is None:
+        raise NotFoundException(f"No payload at '{ref}'.")
+    try:
+        return json.load(body)
+    except ValueError:
+        raise BadRequestException(f"Payload at '{ref}' is not valid JSON.")
+
+
+def _content_type(response):
+    headers = response.get("multiValueHeaders") or {}
+    for name, values in headers.items():
+        if name.lower() == "content-type" and values:
+            return values[-1]
+    for name, value in (response.get("headers") or {}).items():
+        if name.lower() == "content-type":
+            return value
+    return "application/json"
+
+
+@tracing.capture("storage")
+def offload_response(response, set_header):
+    """
+    If the resolved proxy response is too large to return from Lambda, upload
+    its body and rewrite it in place as a 303 redirect to a presigned URL.
+    `set_header(response, name, value)` writes a header in the response's shape.
+    Returns True if the response was offloaded.
+    """
+    body = response.get("body") or ""
+    if not PENNYWORTH_OFFLOAD_THRESHOLD_BYTES or len(body) <= PENNYWORTH_OFFLOAD_THRESHOLD_BYTES:
+        return False
+    store = get_object_store()
+    content_type = _content_type(response)
+    key = f"{RESPONSE_PREFIX}{uuid.uuid4().hex}"
+    reader = _BodyReader(body, response.get("isBase64Encoded", False))
+    store.upload(key, io.BufferedReader(reader, CHUNK_CHARS), content_type)
+    url = store.presigned_url(key, "get", URL_EXPIRES_SECONDS)
+    logger.info({"msg": "response offloaded", "key": key, "status": response["statusCode"]})
+    response["body"] = json.dumps(
+        {
+            "object": "offload",
+            "status_code": response["statusCode"],
+            "url": url,
+            "content_type": content_type,
+            "expires_at": int(time.time()) + URL_EXPIRES_SECONDS,
+        }
+    )
+    response["isBase64Encoded"] = False
+    response["statusCode"] = 303
+    set_header(response, "Location", url)
+    set_header(response, "Content-Type", "application/json")
+    return True
@@ -0,0 +1,219 @@
+# On-demand profiling of single requests. An admin (Cognito "admin" group)
+# sends X-Pennyworth-Profile with one or more modes:
+#
+#   sample    wall-clock stack sampling every PENNYWORTH_PROFILE_SAMPLE_INTERVAL_MS,
+#             reported as collapsed stacks ("outer;inner count"), the input
+#             format of flamegraph.pl and speedscope
+#   cprofile  deterministic cProfile, reported as the top functions by
+#             cumulative time
+#   alloc     tracemalloc, reported as the top allocation sites
+#
+# e.g. "X-Pennyworth-Profile: sample,alloc". The report goes to the log or to
+# the object store under profiles/ (PENNYWORTH_PROFILE_DESTINATION), and the
+# response names it in the same header. Requests without the header pay one
+# dictionary lookup; non-admin requests are served normally, unprofiled.
+
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from auth import require_cognito_jwt
+from errors import ForbiddenException
+from utils import logger
+import storage
+from src.shared.constants import *
+
+PROFILE_HEADER = "X-Pennyworth-Profile"
+
+MODES = ("sample", "cprofile", "alloc")
+
+ADMIN_GROUP = "admin"
+
+PROFILE_PREFIX = "profiles/"
+
+# Entries kept in the cprofile and alloc reports, and stack depth kept per sample.
+TOP_N = 40
+MAX_STACK_DEPTH = 64
+
+# tracemalloc is process-wide: concurrent alloc sessions (server.py) share it,
+# and the last one to finish stops it, unless it was already tracing before.
+_alloc_lock = threading.Lock()
+_alloc_sessions = 0
+_alloc_owned = False
+
+
+def requested_modes(event):
+    """Profiling modes named in the request's header, or None if it has none."""
+    headers = event.get("headers") or {}
+    value = headers.get(PROFILE_HEADER) or headers.get(PROFILE_HEADER.lower())
+    if not value:
+        return None
+    modes = {m.strip().lower() for m in value.split(",")}
+    if modes & {"1", "true", "on"}:
+        modes |= {"sample", "alloc"}
+    return [m for m in MODES if m in modes]
+
+
+def _is_admin(event):
+    try:
+        claims = require_cognito_jwt(event)
+    except ForbiddenException:
+        return False
+    return ADMIN_GROUP in (claims.get("cognito:groups") or [])
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pennyworth-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and len(names) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def _cprofile_report(profiler):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append(
+            {
+                "function": f"{name} ({filename.rsplit('/', 1)[-1]}:{line})",
+                "calls": calls,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3),
+            }
+        )
+    rows.sort(key=lambda r: r["cumtime_ms"], reverse=True)
+    return rows[:TOP_N]
+
+
+def _start_alloc():
+    global _alloc_sessions, _alloc_owned
+    with _alloc_lock:
+        if _alloc_sessions == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _alloc_owned = True
+        _alloc_sessions += 1
+
+
+def _stop_alloc():
+    global _alloc_sessions, _alloc_owned
+    with _alloc_lock:
+        _alloc_sessions -= 1
+        if _alloc_sessions == 0 and _alloc_owned:
+            tracemalloc.stop()
+            _alloc_owned = False
+
+
+def _alloc_report(snapshot):
+    return [
+        {"site": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:TOP_N]
+    ]
+
+
+class ProfileSession:
+    """Runs one request under the requested profilers and writes the report."""
+
+    def __init__(self, modes, event, context):
+        self.modes = modes
+        self.request_id = getattr(context, "aws_request_id", None) or uuid.uuid4().hex
+        self.path = event.get("path")
+        self.location = None
+
+    def run(self, func, *args):
+        sampler = profiler = None
+        if "alloc" in self.modes:
+            _start_alloc()
+        if "cprofile" in self.modes:
+            profiler = cProfile.Profile()
+        if "sample" in self.modes:
+            interval = PENNYWORTH_PROFILE_SAMPLE_INTERVAL_MS / 1000.0
+            sampler = StackSampler(threading.get_ident(), interval)
+            sampler.start()
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                return profiler.runcall(func, *args)
+            return func(*args)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            report = {
+                "request_id": self.request_id,
+                "path": self.path,
+                "modes": self.modes,
+                "duration_ms": round(duration_ms, 1),
+            }
+            if sampler is not None:
+                sampler.stop()
+                report["samples"] = sum(sampler.stacks.values())
+                report["collapsed"] = sampler.collapsed()
+            if profiler is not None:
+                report["cprofile"] = _cprofile_report(profiler)
+            if "alloc" in self.modes:
+                if tracemalloc.is_tracing():
+                    snapshot = tracemalloc.take_snapshot()
+                    report["peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+                    report["allocations"] = _alloc_report(snapshot)
+                _stop_alloc()
+            self._write(report)
+
+    def _write(self, report):
+        """Store or log the report. Never raises: profiling must not change the response."""
+        try:
+            self._store(report)
+        except Exception as e:
+            self.location = "unavailable"
+            logger.warning({"msg": "request profile not written", "error": str(e)})
+
+    def _store(self, report):
+        if PENNYWORTH_PROFILE_DESTINATION == "storage":
+            key = f"{PROFILE_PREFIX}{time.strftime('%Y/%m/%d', time.gmtime())}/{self.request_id}.json"
+            store = storage.get_object_store()
+            store.put(key, json.dumps(report), "application/json")
+            self.location = store.uri(key)
+            logger.info({"msg": "request profile stored", "location": self.location})
+        else:
+            self.location = "log"
+            logger.info({"msg": "request profile", "profile": report})
+
+
+def start(event, context):
+    """A ProfileSession if an admin asked for this request to be profiled, else None."""
+    modes = requested_modes(event)
+    if modes is None:
+        return None
+    if not modes or not _is_admin(event):
+        logger.warning({"msg": "profiling request ignored", "header": PROFILE_HEADER})
+        return None
+    return ProfileSession(modes, event, context)
@@ -0,0 +1,131 @@
+# Provider prompt caching for chat requests: pass through client cache_control
+# hints and, for models flagged `supports_prompt_caching` in the registry, add
+# cache points on the stable prefix (tool definitions and system prompt) so
+# repeated long prompts are read from the provider's cache.
+
+from src.shared.constants import *
+
+EPHEMERAL = {"type": "ephemeral"}
+
+# Anthropic (and Bedrock's cachePoint) allow at most four breakpoints per request.
+MAX_CACHE_POINTS = 4
+
+SYSTEM_ROLES = ("system", "developer")
+
+
+def _parts(message):
+    """Content as a list of parts (a copy), converting plain strings to one text part."""
+    content = message.get("content")
+    if isinstance(content, list):
+        return [dict(p) if isinstance(p, dict) else p for p in content]
+    if content is None:
+        return []
+    return [{"type": "text", "text": str(content)}]
+
+
+def _hinted_parts(message):
+    content = message.get("content")
+    if not isinstance(content, list):
+        return 0
+    return sum(1 for p in content if isinstance(p, dict) and "cache_control" in p)
+
+
+def _normalize(message):
+    """Move a message-level cache_control hint onto its last content part."""
+    if "cache_control" not in message:
+        return message
+    message = dict(message)
+    hint = message.pop("cache_control")
+    parts = _parts(message)
+    if parts:
+        parts[-1]["cache_control"] = hint
+        message["content"] = parts
+    return message
+
+
+def _strip(message):
+    if not _hinted_parts(message):
+        return message
+    message = dict(message)
+    message["content"] = [
+        {k: v for k, v in p.items() if k != "cache_control"} if isinstance(p, dict) else p
+        for p in message["content"]
+    ]
+    return message
+
+
+def _mark(message):
+    message = dict(message)
+    parts = _parts(message)
+    if parts:
+        parts[-1]["cache_control"] = EPHEMERAL
+        message["content"] = parts
+    return message
+
+
+def _limit(messages, tools, allowed):
+    """Drop the earliest hints so that at most `allowed` cache points remain."""
+    excess = sum(1 for t in tools if "cache_control" in t) + sum(map(_hinted_parts, messages))
+    excess -= allowed
+    if excess <= 0:
+        return messages, tools
+    trimmed_tools = []
+    for tool in tools:
+        if excess > 0 and "cache_control" in tool:
+            tool = {k: v for k, v in tool.items() if k != "cache_control"}
+            excess -= 1
+        trimmed_tools.append(tool)
+    trimmed = []
+    for message in messages:
+        if excess > 0 and _hinted_parts(message):
+            parts = []
+            for p in message["content"]:
+                if excess > 0 and isinstance(p, dict) and "cache_control" in p:
+                    p = {k: v for k, v in p.items() if k != "cache_control"}
+                    excess -= 1
+                parts.append(p)
+            message = {**message, "content": parts}
+        trimmed.append(message)
+    return trimmed, trimmed_tools
+
+
+def prepare(model_config, messages, tools=None):
+    """
+    Return (messages, tools) ready for LiteLLM. The inputs are not modified.
+
+    - Models without prompt caching get all cache_control hints removed, since
+      providers reject them.
+    - Client hints (on content parts, messages or tools) are passed through.
+    - Without client hints, and unless PENNYWORTH_PROMPT_CACHING is 'off',
+      cache points are added after the last tool definition and the last
+      system message.
+    """
+    tools = list(tools or [])
+    messages = [_normalize(m) for m in messages]
+    if not model_config.get("supports_prompt_caching"):
+        tools = [{k: v for k, v in t.items() if k != "cache_control"} for t in tools]
+        return [_strip(m) for m in messages], tools or None
+
+    hinted = any("cache_control" in t for t in tools) or any(map(_hinted_parts, messages))
+    if not hinted and PENNYWORTH_PROMPT_CACHING != "off":
+        if tools:
+            tools[-1] = {**tools[-1], "cache_control": EPHEMERAL}
+        system = [i for i, m in enumerate(messages) if m.get("role") in SYSTEM_ROLES]
+        if system:
+            messages[system[-1]] = _mark(messages[system[-1]])
+    messages, tools = _limit(messages, tools, MAX_CACHE_POINTS)
+    return messages, tools or None
+
+
+def report_cached_tokens(usage):
+    """
+    Ensure OpenAI's `usage.prompt_tokens_details.cached_tokens` is present,
+    filling it from Anthropic-style `cache_read_input_tokens` when needed.
+    """
+    if not usage:
+        return usage
+    details = usage.get("prompt_tokens_details") or {}
+    if not details.get("cached_tokens"):
+        details["cached_tokens"] = usage.get("cache_read_input_tokens") or 0
+    usage["prompt_tokens_details"] = details
+    return usage
@@ -0,0 +1,255 @@
+# Multi-region dispatch. Models may list several Bedrock regions in
+# model_router.MODEL_MAP ("regions"); each request goes to the region with the
+# best expected latency, judged from exponentially weighted moving averages
+# (EWMA) of observed latency and throttling, kept per model and region in
+# container memory. A throttled call spills over to the next region at once,
+# as does a call to a region at its adaptive concurrency limit (limiter.py).
+
+import threading
+import time
+
+import litellm
+
+from errors import GatewayTimeoutException
+from utils import logger
+import deadline
+import limiter
+import metrics
+from src.shared.constants import *
+
+# Latency assumed for a region with no observations (ms) when no region of the
+# model has been observed either.
+PRIOR_LATENCY_MS = 1000.0
+
+# Unobserved regions are assumed this much slower than the best observed one,
+# so traffic stays put until throttling makes exploring worthwhile.
+UNOBSERVED_PENALTY = 1.2
+
+# Throttle rate is capped below 1 so a throttled region's score stays finite.
+MAX_THROTTLE_RATE = 0.9
+
+THROTTLE_STATUSES = (429, 503)
+
+
+class RegionStats:
+    """EWMA latency and throttle rate for one model in one region."""
+
+    def __init__(self):
+        self.latency_ms = None
+        self.throttle_rate = 0.0
+        self.updated = 0.0
+        self.inflight = 0
+        self.requests = 0
+        self.throttles = 0
+
+    def decayed_throttle_rate(self, now):
+        """Throttle rate, halved every PENNYWORTH_REGION_THROTTLE_HALF_LIFE seconds without news."""
+        elapsed = max(now - self.updated, 0.0)
+        return self.throttle_rate * 0.5 ** (elapsed / PENNYWORTH_REGION_THROTTLE_HALF_LIFE)
+
+    def observe(self, now, latency_ms=None, throttled=False):
+        alpha = PENNYWORTH_REGION_EWMA_ALPHA
+        self.throttle_rate = self.decayed_throttle_rate(now) * (1 - alpha) + (alpha if throttled else 0.0)
+        if latency_ms is not None:
+            if self.latency_ms is None:
+                self.latency_ms = latency_ms
+            else:
+                self.latency_ms = self.latency_ms * (1 - alpha) + latency_ms * alpha
+        self.updated = now
+        self.requests += 1
+        self.throttles += 1 if throttled else 0
+
+    def as_dict(self, now):
+        return {
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "throttle_rate": round(self.decayed_throttle_rate(now), 3),
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "throttles": self.throttles,
+        }
+
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def model_regions(model_config):
+    """Configured regions for a model, home region (PENNYWORTH_AWS_REGION) first."""
+    regions = list(model_config.get("regions") or [PENNYWORTH_AWS_REGION])
+    if PENNYWORTH_AWS_REGION in regions:
+        regions.remove(PENNYWORTH_AWS_REGION)
+        regions.insert(0, PENNYWORTH_AWS_REGION)
+    return regions
+
+
+def _get(model_name, region):
+    key = (model_name, region)
+    if key not in _stats:
+        _stats[key] = RegionStats()
+    return _stats[key]
+
+
+def rank(model_name, model_config):
+    """
+    Regions ordered by expected latency: EWMA latency scaled by 1/(1 - throttle
+    rate) and by the calls already in flight from this container. Ties keep the
+    configured order, so the home region wins until observations say otherwise.
+    """
+    regions = model_regions(model_config)
+    now = time.time()
+    with _lock:
+        stats = [_get(model_name, r) for r in regions]
+        observed = [s.latency_ms for s in stats if s.latency_ms is not None]
+        unobserved = min(observed) * UNOBSERVED_PENALTY if observed else PRIOR_LATENCY_MS
+        scores = []
+        for position, (region, s) in enumerate(zip(regions, stats)):
+            latency = s.latency_ms if s.latency_ms is not None else unobserved
+            throttle = min(s.decayed_throttle_rate(now), MAX_THROTTLE_RATE)
+            scores.append((latency * (1 + s.inflight) / (1 - throttle), position, region))
+    return [region for _, _, region in sorted(scores)]
+
+
+def snapshot(model_name, model_config):
+    """Per-region stats of a model, for logs and metrics metadata."""
+    now = time.time()
+    with _lock:
+        return {r: _get(model_name, r).as_dict(now) for r in model_regions(model_config)}
+
+
+def is_throttle(error):
+    """True for provider errors that mean "no capacity here right now"."""
+    if isinstance(error, (litellm.RateLimitError, litellm.ServiceUnavailableError)):
+        return True
+    if getattr(error, "status_code", None) in THROTTLE_STATUSES:
+        return True
+    return "Throttling" in type(error).__name__ or "ThrottlingException" in str(error)
+
+
+class _Call:
+    """One upstream call, counted in flight (and holding its slot, if any) until finished."""
+
+    def __init__(self, stats, lease):
+        self.stats = stats
+        self.lease = lease
+        self.started = time.perf_counter()
+        with _lock:
+            stats.inflight += 1
+
+    def finish(self, error=None):
+        """Feed the outcome to the region's EWMAs and limit; returns whether it was a throttle."""
+        throttled = error is not None and is_throttle(error)
+        latency_ms = None
+        if error is None or isinstance(error, litellm.Timeout):
+            latency_ms = (time.perf_counter() - self.started) * 1000
+        with _lock:
+            self.stats.inflight -= 1
+            self.stats.observe(time.time(), latency_ms=latency_ms, throttled=throttled)
+        if self.lease is not None:
+            self.lease.release(throttled=throttled)
+        return throttled
+
+
+class HeldStream:
+    """
+    A streamed response whose call stays in flight, holding its concurrency
+    slot, until the stream is drained, fails or is closed. Its latency then
+    covers the whole stream, and a throttle that ends the stream counts
+    against the region like one before it.
+    """
+
+    def __init__(self, stream, call, model_name, region):
+        self._stream = stream
+        self._chunks = iter(stream)
+        self._call = call
+        self._model_name = model_name
+        self._region = region
+        self._open = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self._finish()
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+
+    def close(self):
+        if self._open and hasattr(self._stream, "close"):
+            self._stream.close()
+        self._finish()
+
+    def _finish(self, error=None):
+        if not self._open:
+            return
+        self._open = False
+        if self._call.finish(error):
+            logger.warning({"msg": "region throttled mid-stream", "model": self._model_name, "region": self._region})
+            invocation = metrics.current()
+            if invocation is not None:
+                invocation.add("RegionThrottles", 1)
+
+
+def invoke(model_name, model_config, call, stream=False):
+    """
+    Run `call(region)` in the best-ranked region, spilling over to the next
+    region when throttled, unless the request deadline leaves less time than
+    that region usually takes. Regions at their concurrency limit are passed
+    over, except the last, where the call waits briefly for a slot or is shed
+    with a 429. Latency and throttling feed the region's EWMAs and limits;
+    the chosen region, spillovers and per-region stats go to the request's
+    metrics. Raises the last throttling error if no region could serve the
+    call, and a 504 if the call timed out. With `stream`, the result is
+    returned as a HeldStream, and the call is finished when it is.
+    """
+    invocation = metrics.current()
+    request_deadline = deadline.current()
+    ranked = rank(model_name, model_config)
+    error = None
+    for attempt, region in enumerate(ranked):
+        with _lock:
+            stats = _get(model_name, region)
+            expected_ms = stats.latency_ms or 0.0
+        if attempt and request_deadline is not None:
+            if request_deadline.remaining() * 1000 < expected_ms:
+                logger.warning({"msg": "spillover skipped at deadline", "region": region})
+                break
+        lease = None
+        if limiter.enabled():
+            last = attempt == len(ranked) - 1
+            lease = limiter.acquire(model_name, model_config, region, wait=last)
+            if lease is None:
+                logger.info({"msg": "region at concurrency limit", "model": model_name, "region": region})
+                continue
+        upstream = _Call(stats, lease)
+        try:
+            result = call(region)
+        except Exception as e:
+            throttled = upstream.finish(e)
+            if isinstance(e, litellm.Timeout):
+                raise GatewayTimeoutException(f"Upstream call to {model_name} timed out: {e}")
+            if not throttled:
+                raise
+            logger.warning({"msg": "region throttled", "model": model_name, "region": region})
+            if invocation is not None:
+                invocation.add("RegionThrottles", 1)
+            error = e
+            continue
+        if stream:
+            result = HeldStream(result, upstream, model_name, region)
+        else:
+            upstream.finish()
+        if invocation is not None:
+            invocation.set_region(region)
+            invocation.add("RegionSpillovers", attempt)
+            invocation.metadata["region_stats"] = snapshot(model_name, model_config)
+        if attempt:
+            logger.info({"msg": "region spillover", "model": model_name, "region": region, "attempt": attempt})
+        return result
+    if error is None:
+        raise limiter.shed(model_name)
+    raise error
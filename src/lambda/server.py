@@ -0,0 +1,180 @@
+# Long-running ASGI server for the same API surface as the Lambda. Each HTTP
+# request is turned into an API Gateway proxy event and handled by
+# api.lambda_handler on a worker thread, so routes, auth, middleware and
+# handlers are shared with the Lambda; in-process caches (JWKS, tokenizers,
+# budget counters, region stats, MCP sessions) are shared across requests.
+#
+# Run with any ASGI server, e.g. from src/lambda:
+#   uvicorn server:app --host 0.0.0.0 --port 8080 --workers 4
+# or `python server.py`, which starts uvicorn with the PENNYWORTH_SERVER_* settings.
+
+import asyncio
+import base64
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qsl
+
+import api
+import embedding_batcher
+from utils import logger
+from src.shared.constants import *
+
+_executor = None
+
+
+class ServerContext:
+    """The parts of the Lambda context the handlers use, for one server request."""
+
+    function_name = "pennyworth-server"
+    function_version = "$LATEST"
+    invoked_function_arn = None
+    memory_limit_in_mb = None
+    log_group_name = None
+    log_stream_name = None
+
+    def __init__(self, timeout_ms):
+        self.aws_request_id = str(uuid.uuid4())
+        self._deadline = time.monotonic() + timeout_ms / 1000.0
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+def _executor_for_process():
+    # Created lazily so each worker process (uvicorn forks them) gets its own pool.
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=PENNYWORTH_SERVER_THREADS, thread_name_prefix="pennyworth"
+        )
+        api.app.build_middleware_stacks()
+        if PENNYWORTH_EMBEDDING_BATCH_MAX_WAIT_MS > 0:
+            embedding_batcher.set_batcher(
+                embedding_batcher.EmbeddingBatcher(
+                    PENNYWORTH_EMBEDDING_BATCH_MAX_WAIT_MS, PENNYWORTH_EMBEDDING_BATCH_MAX_ITEMS
+                )
+            )
+    return _executor
+
+
+def build_event(scope, body):
+    """API Gateway REST (v1 proxy) event for an ASGI HTTP request."""
+    headers, multi_headers = {}, {}
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin-1"), value.decode("latin-1")
+        headers[name] = value
+        multi_headers.setdefault(name, []).append(value)
+    query = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+    multi_query = {}
+    for name, value in query:
+        multi_query.setdefault(name, []).append(value)
+    content_type = headers.get("content-type", "")
+    is_binary = bool(body) and not (
+        content_type.startswith("text/") or "json" in content_type or not content_type
+    )
+    client = scope.get("client") or ("127.0.0.1", 0)
+    method = scope["method"]
+    path = scope.get("root_path", "") + scope["path"]
+    return {
+        "resource": "/{proxy+}",
+        "path": path,
+        "httpMethod": method,
+        "headers": headers,
+        "multiValueHeaders": multi_headers,
+        "queryStringParameters": dict(query) or None,
+        "multiValueQueryStringParameters": multi_query or None,
+        "pathParameters": {"proxy": path.lstrip("/")},
+        "stageVariables": None,
+        "requestContext": {
+            "resourcePath": "/{proxy+}",
+            "httpMethod": method,
+            "path": path,
+            "stage": "server",
+            "requestId": str(uuid.uuid4()),
+            "requestTimeEpoch": int(time.time() * 1000),
+            "identity": {"sourceIp": client[0], "userAgent": headers.get("user-agent")},
+        },
+        "body": (base64.b64encode(body).decode() if is_binary else body.decode()) if body else None,
+        "isBase64Encoded": is_binary,
+    }
+
+
+def _response_headers(response):
+    headers = []
+    for name, values in (response.get("multiValueHeaders") or {}).items():
+        headers.extend((name.encode("latin-1"), str(v).encode("latin-1")) for v in values)
+    for name, value in (response.get("headers") or {}).items():
+        headers.append((name.encode("latin-1"), str(value).encode("latin-1")))
+    return headers
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            _executor_for_process()
+            logger.info({"msg": "server started", "threads": PENNYWORTH_SERVER_THREADS})
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _executor is not None:
+                _executor.shutdown(wait=True)
+            batcher = embedding_batcher.get_batcher()
+            if batcher is not None:
+                logger.info({"msg": "embedding batching", **batcher.stats()})
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application serving the routes of api.py."""
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    body = await _read_body(receive)
+    if body is None:
+        return
+    event = build_event(scope, body)
+    context = ServerContext(PENNYWORTH_SERVER_REQUEST_TIMEOUT_MS)
+    loop = asyncio.get_running_loop()
+    response = await loop.run_in_executor(
+        _executor_for_process(), partial(api.lambda_handler, event, context)
+    )
+    payload = response.get("body") or ""
+    payload = base64.b64decode(payload) if response.get("isBase64Encoded") else payload.encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response["statusCode"],
+            "headers": _response_headers(response),
+        }
+    )
+    await send({"type": "http.response.body", "body": payload})
+
+
+def main():
+    import uvicorn
+
+    uvicorn.run(
+        "server:app",
+        host=PENNYWORTH_SERVER_HOST,
+        port=PENNYWORTH_SERVER_PORT,
+        workers=PENNYWORTH_SERVER_WORKERS,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# Shared key/value state for data that must survive across warm containers
+# (MCP sessions and similar). Backed by the DynamoDB table named in
+# PENNYWORTH_STATE_TABLE, or by process memory when no table is configured
+# (local runs and tests).
+
+import json
+import threading
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+
+from utils import logger
+import tracing
+from src.shared.constants import *
+
+
+class MemoryStateStore:
+    """In-process store with the same interface and TTL semantics as DynamoStateStore."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires = item.get("ttl")
+        if expires is not None and expires <= now:
+            del self._items[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.time())
+            return json.loads(item["data"]) if item and "data" in item else None
+
+    def put(self, key, value, ttl_seconds=None, if_absent=False):
+        now = time.time()
+        with self._lock:
+            if if_absent and self._live(key, now) is not None:
+                return False
+            self._items[key] = {
+                "data": json.dumps(value),
+                "ttl": now + ttl_seconds if ttl_seconds else None,
+            }
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def increment(self, key, field, amount, ttl_seconds=None):
+        now = time.time()
+        with self._lock:
+            item = self._live(key, now) or {"ttl": now + ttl_seconds if ttl_seconds else None}
+            item[field] = item.get(field, 0) + amount
+            self._items[key] = item
+            return item[field]
+
+    def get_counter(self, key, field):
+        with self._lock:
+            item = self._live(key, time.time())
+            return item.get(field, 0) if item else 0
+
+
+class DynamoStateStore:
+    """
+    DynamoDB-backed store. Items are {pk, data (JSON string), ttl (epoch seconds)}
+    plus numeric counter attributes; the table's TTL attribute is `ttl`.
+    Expired items are treated as absent even before DynamoDB deletes them.
+    """
+
+    def __init__(self, table_name, client=None):
+        self.table_name = table_name
+        self.client = client or boto3.client("dynamodb", region_name=PENNYWORTH_AWS_REGION)
+
+    @staticmethod
+    def _expired(item, now):
+        return "ttl" in item and float(item["ttl"]["N"]) <= now
+
+    @tracing.capture("storage")
+    def get(self, key):
+        resp = self.client.get_item(
+            TableName=self.table_name, Key={"pk": {"S": key}}, ConsistentRead=True
+        )
+        item = resp.get("Item")
+        if not item or "data" not in item or self._expired(item, time.time()):
+            return None
+        return json.loads(item["data"]["S"])
+
+    @tracing.capture("storage")
+    def put(self, key, value, ttl_seconds=None, if_absent=False):
+        now = time.time()
+        item = {"pk": {"S": key}, "data": {"S": json.dumps(value)}}
+        if ttl_seconds:
+            item["ttl"] = {"N": str(int(now + ttl_seconds))}
+        kwargs = {}
+        if if_absent:
+            kwargs = {
+                "ConditionExpression": "attribute_not_exists(pk) OR #ttl <= :now",
+                "ExpressionAttributeNames": {"#ttl": "ttl"},
+                "ExpressionAttributeValues": {":now": {"N": str(int(now))}},
+            }
+        try:
+            self.client.put_item(TableName=self.table_name, Item=item, **kwargs)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    @tracing.capture("storage")
+    def delete(self, key):
+        self.client.delete_item(TableName=self.table_name, Key={"pk": {"S": key}})
+
+    @tracing.capture("storage")
+    def increment(self, key, field, amount, ttl_seconds=None):
+        expression = "ADD #field :amount"
+        names = {"#field": field}
+        values = {":amount": {"N": str(amount)}}
+        if ttl_seconds:
+            expression += " SET #ttl = :ttl"
+            names["#ttl"] = "ttl"
+            values[":ttl"] = {"N": str(int(time.time() + ttl_seconds))}
+        resp = self.client.update_item(
+            TableName=self.table_name,
+            Key={"pk": {"S": key}},
+            UpdateExpression=expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="UPDATED_NEW",
+        )
+        return float(resp["Attributes"][field]["N"])
+
+    @tracing.capture("storage")
+    def get_counter(self, key, field):
+        resp = self.client.get_item(TableName=self.table_name, Key={"pk": {"S": key}})
+        item = resp.get("Item")
+        if not item or field not in item or self._expired(item, time.time()):
+            return 0
+        return float(item[field]["N"])
+
+
+_store = None
+
+
+def get_store():
+    """Return the process-wide state store, creating it on first use."""
+    global _store
+    if _store is None:
+        if PENNYWORTH_STATE_TABLE:
+            _store = DynamoStateStore(PENNYWORTH_STATE_TABLE)
+        else:
+            logger.info("PENNYWORTH_STATE_TABLE not set; using in-memory state store")
+            _store = MemoryStateStore()
+    return _store
+
+
+def set_store(store):
+    """Replace the process-wide state store (used by tests and local servers)."""
+    global _store
+    _store = store
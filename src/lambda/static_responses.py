@@ -0,0 +1,88 @@
+# Pre-encoded responses for metadata routes (version, well-known parameters,
+# model list). Their content only changes on deploy, so each body is encoded
+# once per container, during init, together with a strong ETag; requests are
+# answered with the stored bytes, or with 304 Not Modified when the client's
+# If-None-Match already names the current ETag.
+
+import hashlib
+import json
+
+from aws_lambda_powertools.event_handler import Response
+
+from utils import logger
+import metrics
+
+CONTENT_TYPE = "application/json"
+
+
+class StaticResponse:
+    """An encoded 200 response body with its ETag and Cache-Control value."""
+
+    def __init__(self, body, cache_control):
+        self.body = json.dumps(body)
+        self.etag = '"' + hashlib.sha256(self.body.encode()).hexdigest()[:32] + '"'
+        self.cache_control = cache_control
+
+    def headers(self):
+        return {"ETag": self.etag, "Cache-Control": self.cache_control}
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match value names this response (weak comparison, per RFC 9110)."""
+        if not if_none_match:
+            return False
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return any(t == "*" or t.removeprefix("W/") == self.etag for t in tags)
+
+
+# Registered routes by name: (handler, Cache-Control).
+_routes = {}
+
+# Encoded responses by name, filled by warm() or on first use.
+_responses = {}
+
+
+def register(name, handler, cache_control):
+    """Serve `handler`'s (body, 200) result as a static response under `name`."""
+    _routes[name] = (handler, cache_control)
+    _responses.pop(name, None)
+
+
+def _build(name):
+    handler, cache_control = _routes[name]
+    body, status, *_ = handler()
+    if status != 200:
+        raise ValueError(f"Static response '{name}' returned status {status}")
+    response = _responses[name] = StaticResponse(body, cache_control)
+    return response
+
+
+def warm():
+    """
+    Encode every registered response. Called during init; a response whose
+    handler fails here (e.g. missing configuration) is retried on first use,
+    so the error surfaces on the route rather than at import.
+    """
+    for name in _routes:
+        try:
+            _build(name)
+        except Exception as e:
+            logger.warning({"msg": "static response not pre-encoded", "route": name, "error": str(e)})
+
+
+def get(name):
+    """The encoded response for `name`, built now if warm() could not build it."""
+    response = _responses.get(name)
+    return response if response is not None else _build(name)
+
+
+def respond(name, event):
+    """Response for a request to the static route `name`: the stored body, or 304."""
+    invocation = metrics.current()
+    if invocation is not None:
+        invocation.set_route(name)
+    static = get(name)
+    if static.matches(event.headers.get("If-None-Match")):
+        return Response(status_code=304, body="", headers=static.headers())
+    return Response(
+        status_code=200, content_type=CONTENT_TYPE, body=static.body, headers=static.headers()
+    )
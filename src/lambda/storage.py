@@ -0,0 +1,158 @@
+# Object storage for uploaded files and batch results. Backed by the S3 bucket
+# named in PENNYWORTH_FILES_BUCKET, or by process memory when no bucket is
+# configured (local runs and tests).
+
+import io
+import threading
+
+import boto3
+from botocore.exceptions import ClientError
+
+from utils import logger
+import tracing
+from src.shared.constants import *
+
+
+class MemoryObjectStore:
+    """
+    In-process object store with the same interface as S3ObjectStore.
+    Its presigned URLs (memory://...) are placeholders that only identify the key.
+    """
+
+    bucket = "memory"
+
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def uri(self, key):
+        return f"s3://{self.bucket}/{key}"
+
+    def put(self, key, data, content_type="application/octet-stream"):
+        if isinstance(data, str):
+            data = data.encode()
+        with self._lock:
+            self._objects[key] = (bytes(data), content_type)
+
+    def get(self, key):
+        with self._lock:
+            obj = self._objects.get(key)
+        return obj[0] if obj else None
+
+    def delete(self, key):
+        with self._lock:
+            self._objects.pop(key, None)
+
+    def list(self, prefix=""):
+        with self._lock:
+            return sorted(k for k in self._objects if k.startswith(prefix))
+
+    def upload(self, key, fileobj, content_type="application/octet-stream"):
+        self.put(key, b"".join(iter(lambda: fileobj.read(UPLOAD_CHUNK_BYTES), b"")), content_type)
+
+    def open(self, key):
+        data = self.get(key)
+        return io.BytesIO(data) if data is not None else None
+
+    def presigned_url(self, key, method="get", expires_in=3600):
+        return f"memory://{self.bucket}/{key}?method={method}&expires_in={expires_in}"
+
+
+class S3ObjectStore:
+    """S3-backed object store; keys are used as-is within the bucket."""
+
+    def __init__(self, bucket, client=None):
+        self.bucket = bucket
+        self.client = client or boto3.client("s3", region_name=PENNYWORTH_AWS_REGION)
+
+    def uri(self, key):
+        return f"s3://{self.bucket}/{key}"
+
+    @tracing.capture("storage")
+    def put(self, key, data, content_type="application/octet-stream"):
+        if isinstance(data, str):
+            data = data.encode()
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+
+    @tracing.capture("storage")
+    def get(self, key):
+        try:
+            resp = self.client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return resp["Body"].read()
+
+    @tracing.capture("storage")
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    @tracing.capture("storage")
+    def list(self, prefix=""):
+        keys = []
+        kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+        while True:
+            resp = self.client.list_objects_v2(**kwargs)
+            keys.extend(obj["Key"] for obj in resp.get("Contents", []))
+            if not resp.get("IsTruncated"):
+                return keys
+            kwargs["ContinuationToken"] = resp["NextContinuationToken"]
+
+    @tracing.capture("storage")
+    def upload(self, key, fileobj, content_type="application/octet-stream"):
+        """Stream `fileobj` to S3 (multipart for large bodies) without buffering it whole."""
+        self.client.upload_fileobj(
+            fileobj, self.bucket, key, ExtraArgs={"ContentType": content_type}
+        )
+
+    @tracing.capture("storage")
+    def open(self, key):
+        """Return a streaming, file-like body for `key`, or None if it does not exist."""
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def presigned_url(self, key, method="get", expires_in=3600):
+        """Presigned URL for a GET (download) or PUT (upload) of `key`."""
+        return self.client.generate_presigned_url(
+            f"{method}_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expires_in,
+        )
+
+
+_store = None
+
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def parse_uri(uri):
+    """Split 's3://bucket/key' into (bucket, key); raises ValueError otherwise."""
+    if not uri or not uri.startswith("s3://") or "/" not in uri[5:]:
+        raise ValueError(f"Not an s3:// URI: {uri!r}")
+    bucket, key = uri[5:].split("/", 1)
+    if not bucket or not key:
+        raise ValueError(f"Not an s3:// URI: {uri!r}")
+    return bucket, key
+
+
+def get_object_store():
+    """Return the process-wide object store, creating it on first use."""
+    global _store
+    if _store is None:
+        if PENNYWORTH_FILES_BUCKET:
+            _store = S3ObjectStore(PENNYWORTH_FILES_BUCKET)
+        else:
+            logger.info("PENNYWORTH_FILES_BUCKET not set; using in-memory object store")
+            _store = MemoryObjectStore()
+    return _store
+
+
+def set_object_store(store):
+    """Replace the process-wide object store (used by tests and local servers)."""
+    global _store
+    _store = store
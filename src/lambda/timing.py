@@ -0,0 +1,111 @@
+# Per-invocation phase timings, reported in the Server-Timing header and logs.
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from src.shared.constants import *
+
+# Module import time approximates the start of the Lambda init phase; api.py
+# imports this module before its heavy dependencies.
+_INIT_STARTED = time.perf_counter()
+_init_ms = None
+_cold = True
+
+_current = ContextVar("pennyworth_timer", default=None)
+
+# Order in which phases appear in the Server-Timing header.
+PHASES = ("init", "auth", "cred", "route", "context", "ttfb", "upstream", "encode")
+
+
+class PhaseTimer:
+    """
+    Accumulates wall-clock milliseconds per named phase for one request.
+    Phases entered more than once (e.g. auth checked by middleware and handler)
+    are summed.
+    """
+
+    def __init__(self, cold=False, init_ms=None):
+        self.started = time.perf_counter()
+        self.cold = cold
+        self.phases = {}
+        if cold and init_ms is not None:
+            self.phases["init"] = init_ms
+
+    def add(self, name, ms):
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    def mark(self, name, since):
+        """Record the time elapsed from perf_counter() value `since` as a phase."""
+        self.add(name, (time.perf_counter() - since) * 1000)
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def header(self):
+        """Render the phases as a Server-Timing header value."""
+        names = [p for p in PHASES if p in self.phases]
+        names += sorted(p for p in self.phases if p not in PHASES)
+        parts = []
+        for name in names:
+            entry = f"{name};dur={self.phases[name]:.1f}"
+            if name == "init":
+                entry += ';desc="cold start"'
+            parts.append(entry)
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+    def as_log(self):
+        """Compact dict for the structured invocation log line."""
+        return {
+            "cold": self.cold,
+            "total": round(self.total_ms(), 1),
+            **{name: round(ms, 1) for name, ms in self.phases.items()},
+        }
+
+
+def init_complete():
+    """Called once at the end of api.py import to record the init duration."""
+    global _init_ms
+    if _init_ms is None:
+        _init_ms = (time.perf_counter() - _INIT_STARTED) * 1000
+    return _init_ms
+
+
+def consume_cold_start():
+    """Return True for the first request handled by this container, False afterwards."""
+    global _cold
+    cold, _cold = _cold, False
+    return cold
+
+
+def start(cold=False):
+    """
+    Begin timing a new request and make it the current timer.
+    Returns None (and timing stays off) when PENNYWORTH_SERVER_TIMING is disabled.
+    """
+    if not PENNYWORTH_SERVER_TIMING:
+        _current.set(None)
+        return None
+    timer = PhaseTimer(cold=cold, init_ms=_init_ms)
+    _current.set(timer)
+    return timer
+
+
+def current():
+    """Return the timer for the request being handled, or None."""
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as `name` on the current timer (no-op when off)."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.mark(name, started)
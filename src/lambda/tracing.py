@@ -0,0 +1,114 @@
+# X-Ray tracing policy. Functions are decorated with capture(layer) instead of
+# tracer.capture_method, and three settings decide what that costs:
+#
+# - PENNYWORTH_TRACE_LAYERS picks the layers that get subsegments at all
+#   ("route", "handler", "auth", "storage"; or "all"/"none"). Functions in
+#   other layers are left undecorated, so they pay nothing.
+# - PENNYWORTH_TRACE_RESPONSE_MAX_BYTES caps the return values attached as
+#   subsegment metadata. The default, 0, attaches none, so full LLM responses
+#   no longer end up in traces.
+# - PENNYWORTH_TRACE_SAMPLING holds per-route rules ("pattern=rate", first
+#   match wins). A request that is not sampled runs the undecorated functions.
+#   Lambda still samples the invocation segment itself; these rules only decide
+#   whether the request's subsegments are recorded.
+
+import fnmatch
+import functools
+import inspect
+import json
+import random
+from contextvars import ContextVar
+
+from utils import logger, tracer
+from src.shared.constants import *
+
+LAYERS = ("route", "handler", "auth", "storage")
+
+# Requests outside lambda_handler (batch worker, scripts) are always traced.
+_sampled = ContextVar("pennyworth_trace_sampled", default=True)
+
+
+def enabled_layers(setting=None):
+    """Layers named by a PENNYWORTH_TRACE_LAYERS value."""
+    setting = (PENNYWORTH_TRACE_LAYERS if setting is None else setting).strip().lower()
+    if setting == "all":
+        return set(LAYERS)
+    if setting in ("", "none"):
+        return set()
+    return {layer.strip() for layer in setting.split(",") if layer.strip()}
+
+
+def parse_sampling(setting):
+    """[(pattern, rate)] from "pattern=rate,..." ; invalid entries are logged and skipped."""
+    rules = []
+    for entry in setting.split(","):
+        pattern, _, rate = entry.strip().rpartition("=")
+        try:
+            rules.append((pattern.strip(), min(max(float(rate), 0.0), 1.0)))
+        except ValueError:
+            if entry.strip():
+                logger.warning({"msg": "ignoring invalid trace sampling rule", "rule": entry})
+    return rules
+
+
+_layers = enabled_layers()
+_rules = parse_sampling(PENNYWORTH_TRACE_SAMPLING)
+
+
+def sample_rate(method, path):
+    """Rate of the first rule matching "METHOD /path" or "/path" (1.0 if none matches)."""
+    for pattern, rate in _rules:
+        if fnmatch.fnmatchcase(path, pattern) or fnmatch.fnmatchcase(f"{method} {path}", pattern):
+            return rate
+    return 1.0
+
+
+def start(event):
+    """Decide whether the request's subsegments are recorded; returns the decision."""
+    rate = sample_rate(event.get("httpMethod", ""), event.get("path", ""))
+    sampled = rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+    _sampled.set(sampled)
+    return sampled
+
+
+def _put_response(name, result):
+    if isinstance(result, tuple):
+        result = result[0]
+    try:
+        body = result if isinstance(result, str) else json.dumps(result, default=str)
+    except (TypeError, ValueError):
+        return
+    if len(body) <= PENNYWORTH_TRACE_RESPONSE_MAX_BYTES:
+        tracer.put_metadata(key=f"{name} response", value=body)
+
+
+def capture(layer):
+    """
+    Decorator tracing a function as part of `layer`. Returns the function
+    unchanged when the layer is off; otherwise the traced version runs for
+    sampled requests and the plain function for the rest.
+    """
+
+    def decorate(func):
+        if layer not in _layers:
+            return func
+        inner = func
+        if PENNYWORTH_TRACE_RESPONSE_MAX_BYTES > 0 and not inspect.isgeneratorfunction(func):
+
+            @functools.wraps(func)
+            def inner(*args, **kwargs):
+                result = func(*args, **kwargs)
+                _put_response(func.__name__, result)
+                return result
+
+        traced = tracer.capture_method(inner, capture_response=False)
+
+        @functools.wraps(func)
+        def dispatch(*args, **kwargs):
+            if _sampled.get():
+                return traced(*args, **kwargs)
+            return func(*args, **kwargs)
+
+        return dispatch
+
+    return decorate
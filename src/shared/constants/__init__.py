@@ -107,9 +107,392 @@ Set by: Environment variable 'PENNYWORTH_API_TIMEOUT'.
 Used for: HTTP request timeouts in CLI and session code.
 """
 
+PENNYWORTH_PROXY_PORT = int(os.environ.get("PENNYWORTH_PROXY_PORT", "8787"))
+"""
+Localhost port of the `pennyworth proxy` command.
+Set by: Environment variable 'PENNYWORTH_PROXY_PORT' (default: 8787).
+Used for: CLI local proxy (src/cli/proxy.py).
+"""
+
+PENNYWORTH_PROXY_REFRESH_MARGIN_SECONDS = int(
+    os.environ.get("PENNYWORTH_PROXY_REFRESH_MARGIN_SECONDS", "300")
+)
+"""
+How long before the session expires the local proxy renews it in the background.
+Set by: Environment variable 'PENNYWORTH_PROXY_REFRESH_MARGIN_SECONDS' (default: 300).
+Used for: CLI local proxy (src/cli/proxy.py).
+"""
+
 PENNYWORTH_START_TIME = time.time()
 """
 Timestamp when the process started (for debug/logging).
 Set at runtime.
 Used for: Debug logging, timing.
 """
+
+PENNYWORTH_SERVER_TIMING = os.environ.get(
+    "PENNYWORTH_SERVER_TIMING", "true"
+).lower() in ("1", "true", "yes", "on")
+"""
+Whether to collect per-phase request timings (auth, credential exchange, model
+routing, upstream, encoding) and return them in a Server-Timing header.
+Set by: Environment variable 'PENNYWORTH_SERVER_TIMING' (default: true).
+Used for: Client-visible latency breakdown and the invocation log line.
+"""
+
+PENNYWORTH_METRICS_ENABLED = os.environ.get(
+    "PENNYWORTH_METRICS_ENABLED", "true"
+).lower() in ("1", "true", "yes", "on")
+"""
+Whether to emit per-invocation CloudWatch metrics as an Embedded Metric Format log line.
+Set by: Environment variable 'PENNYWORTH_METRICS_ENABLED' (default: true).
+Used for: Latency, token, cost and error dashboards and alarms.
+"""
+
+PENNYWORTH_METRICS_NAMESPACE = os.environ.get("PENNYWORTH_METRICS_NAMESPACE", "Pennyworth")
+"""
+CloudWatch namespace for metrics emitted by the Lambda.
+Set by: Environment variable 'PENNYWORTH_METRICS_NAMESPACE' (default: 'Pennyworth').
+Used for: Embedded Metric Format output.
+"""
+
+PENNYWORTH_STATE_TABLE = os.environ.get("PENNYWORTH_STATE_TABLE", "")
+"""
+DynamoDB table holding shared request state (partition key 'pk', TTL attribute 'ttl').
+Set by: SAM template (PennyworthStateTable); empty means an in-memory store.
+Used for: MCP sessions and other state that any warm container must see.
+"""
+
+PENNYWORTH_MCP_SESSION_TTL = int(os.environ.get("PENNYWORTH_MCP_SESSION_TTL", "86400"))
+"""
+Lifetime (in seconds) of an idle MCP session before clients must re-initialize.
+Set by: Environment variable 'PENNYWORTH_MCP_SESSION_TTL' (default: 86400).
+Used for: MCP streamable HTTP session records.
+"""
+
+PENNYWORTH_TRUNCATION_STRATEGY = os.environ.get("PENNYWORTH_TRUNCATION_STRATEGY", "disabled")
+"""
+Default handling of chat requests that exceed the model's context window:
+'disabled' (reject with 400), 'keep_system' (drop oldest turns, keep system
+prompts) or 'drop_oldest'. Requests may override it with a `truncation` field.
+Set by: Environment variable 'PENNYWORTH_TRUNCATION_STRATEGY' (default: 'disabled').
+Used for: Pre-dispatch context-window checks in context_window.py.
+"""
+
+PENNYWORTH_PROMPT_CACHING = os.environ.get("PENNYWORTH_PROMPT_CACHING", "auto").lower()
+"""
+Prompt caching for models flagged `supports_prompt_caching`: 'auto' adds cache
+points after the tool definitions and system prompt when the client sent no
+cache_control hints; 'off' only passes client hints through.
+Set by: Environment variable 'PENNYWORTH_PROMPT_CACHING' (default: 'auto').
+Used for: Chat completions (prompt_cache.py).
+"""
+
+PENNYWORTH_FILES_BUCKET = os.environ.get("PENNYWORTH_FILES_BUCKET", "")
+"""
+S3 bucket holding uploaded files, batch checkpoints and batch results.
+Set by: SAM template (PennyworthFilesBucket); empty means an in-memory store.
+Used for: /v1/files and /v1/batches.
+"""
+
+PENNYWORTH_BATCH_FUNCTION = os.environ.get("PENNYWORTH_BATCH_FUNCTION", "")
+"""
+Name of the Lambda function that processes batches asynchronously.
+Set by: SAM template (PennyworthBatchWorker); empty runs batches in a
+background thread of the current process (local runs).
+Used for: Dispatching /v1/batches jobs.
+"""
+
+PENNYWORTH_BATCH_CONCURRENCY = int(os.environ.get("PENNYWORTH_BATCH_CONCURRENCY", "8"))
+"""
+Maximum number of batch requests sent to the provider at once by one worker.
+Set by: Environment variable 'PENNYWORTH_BATCH_CONCURRENCY' (default: 8).
+Used for: Bounding batch parallelism (and provider throttling).
+"""
+
+PENNYWORTH_BATCH_DEADLINE_MARGIN_MS = int(
+    os.environ.get("PENNYWORTH_BATCH_DEADLINE_MARGIN_MS", "60000")
+)
+"""
+Remaining Lambda time (in milliseconds) at which a batch worker checkpoints and
+hands the rest of the batch to a fresh invocation.
+Set by: Environment variable 'PENNYWORTH_BATCH_DEADLINE_MARGIN_MS' (default: 60000).
+Used for: Batch worker continuation.
+"""
+
+PENNYWORTH_BATCH_REQUEST_TIMEOUT_SECONDS = float(
+    os.environ.get("PENNYWORTH_BATCH_REQUEST_TIMEOUT_SECONDS", "120")
+)
+"""
+Deadline (in seconds) of each request of a batch, further limited by the batch
+worker's remaining time; a request still running then fails with 504.
+Set by: Environment variable 'PENNYWORTH_BATCH_REQUEST_TIMEOUT_SECONDS' (default: 120).
+Used for: Batch worker deadlines (batches.py).
+"""
+
+PENNYWORTH_OFFLOAD_THRESHOLD_BYTES = int(
+    os.environ.get("PENNYWORTH_OFFLOAD_THRESHOLD_BYTES", "5000000")
+)
+"""
+Response bodies larger than this are stored in the files bucket and returned as
+a 303 redirect to a presigned URL (Lambda's synchronous payload limit is 6 MB).
+Set by: Environment variable 'PENNYWORTH_OFFLOAD_THRESHOLD_BYTES' (default: 5000000; 0 disables).
+Used for: Large-payload offload (offload.py).
+"""
+
+PENNYWORTH_IDEMPOTENCY_TTL = int(os.environ.get("PENNYWORTH_IDEMPOTENCY_TTL", "86400"))
+"""
+How long (in seconds) a response stored under an Idempotency-Key is replayed.
+Set by: Environment variable 'PENNYWORTH_IDEMPOTENCY_TTL' (default: 86400).
+Used for: Idempotent POST requests (idempotency.py).
+"""
+
+PENNYWORTH_KEY_DAILY_BUDGET_USD = float(os.environ.get("PENNYWORTH_KEY_DAILY_BUDGET_USD", "0"))
+"""
+Daily (UTC) spend limit in USD for each caller (API key, Cognito user or source IP).
+Set by: Environment variable 'PENNYWORTH_KEY_DAILY_BUDGET_USD' (default: 0, unlimited).
+Used for: Spend budgets (budgets.py).
+"""
+
+PENNYWORTH_KEY_MONTHLY_BUDGET_USD = float(os.environ.get("PENNYWORTH_KEY_MONTHLY_BUDGET_USD", "0"))
+"""
+Monthly (UTC) spend limit in USD for each caller.
+Set by: Environment variable 'PENNYWORTH_KEY_MONTHLY_BUDGET_USD' (default: 0, unlimited).
+Used for: Spend budgets (budgets.py).
+"""
+
+PENNYWORTH_OWNER_DAILY_BUDGET_USD = float(os.environ.get("PENNYWORTH_OWNER_DAILY_BUDGET_USD", "0"))
+"""
+Daily (UTC) spend limit in USD for each owner (a Cognito user's custom:owner
+attribute, or the user), across all of the owner's callers.
+Set by: Environment variable 'PENNYWORTH_OWNER_DAILY_BUDGET_USD' (default: 0, unlimited).
+Used for: Spend budgets (budgets.py).
+"""
+
+PENNYWORTH_OWNER_MONTHLY_BUDGET_USD = float(
+    os.environ.get("PENNYWORTH_OWNER_MONTHLY_BUDGET_USD", "0")
+)
+"""
+Monthly (UTC) spend limit in USD for each owner.
+Set by: Environment variable 'PENNYWORTH_OWNER_MONTHLY_BUDGET_USD' (default: 0, unlimited).
+Used for: Spend budgets (budgets.py).
+"""
+
+PENNYWORTH_BUDGET_CACHE_SECONDS = float(os.environ.get("PENNYWORTH_BUDGET_CACHE_SECONDS", "5"))
+"""
+How long a container trusts its cached copy of a spend counter before re-reading
+it. Other containers' spend becomes visible after at most this long.
+Set by: Environment variable 'PENNYWORTH_BUDGET_CACHE_SECONDS' (default: 5).
+Used for: Spend budgets (budgets.py).
+"""
+
+PENNYWORTH_REGION_EWMA_ALPHA = float(os.environ.get("PENNYWORTH_REGION_EWMA_ALPHA", "0.2"))
+"""
+Weight of the newest observation in the per-region latency and throttle-rate
+moving averages.
+Set by: Environment variable 'PENNYWORTH_REGION_EWMA_ALPHA' (default: 0.2).
+Used for: Multi-region dispatch (regions.py).
+"""
+
+PENNYWORTH_REGION_THROTTLE_HALF_LIFE = float(
+    os.environ.get("PENNYWORTH_REGION_THROTTLE_HALF_LIFE", "30")
+)
+"""
+Seconds after which a region's throttle rate halves if no new calls go there,
+so throttled regions are retried once they have had time to recover.
+Set by: Environment variable 'PENNYWORTH_REGION_THROTTLE_HALF_LIFE' (default: 30).
+Used for: Multi-region dispatch (regions.py).
+"""
+
+PENNYWORTH_DEADLINE_MARGIN_MS = int(os.environ.get("PENNYWORTH_DEADLINE_MARGIN_MS", "1500"))
+"""
+Time (in milliseconds) reserved at the end of each invocation for finishing the
+response; upstream calls must complete before the Lambda timeout less this margin.
+Set by: Environment variable 'PENNYWORTH_DEADLINE_MARGIN_MS' (default: 1500).
+Used for: Request deadlines (deadline.py).
+"""
+
+PENNYWORTH_SERVER_HOST = os.environ.get("PENNYWORTH_SERVER_HOST", "127.0.0.1")
+"""
+Interface the ASGI server binds to.
+Set by: Environment variable 'PENNYWORTH_SERVER_HOST' (default: 127.0.0.1; use 0.0.0.0 in containers).
+Used for: Server mode (server.py).
+"""
+
+PENNYWORTH_SERVER_PORT = int(os.environ.get("PENNYWORTH_SERVER_PORT", "8080"))
+"""
+Port the ASGI server listens on.
+Set by: Environment variable 'PENNYWORTH_SERVER_PORT' (default: 8080).
+Used for: Server mode (server.py).
+"""
+
+PENNYWORTH_SERVER_WORKERS = int(os.environ.get("PENNYWORTH_SERVER_WORKERS", "1"))
+"""
+Number of server worker processes.
+Set by: Environment variable 'PENNYWORTH_SERVER_WORKERS' (default: 1).
+Used for: Server mode (server.py).
+"""
+
+PENNYWORTH_SERVER_THREADS = int(os.environ.get("PENNYWORTH_SERVER_THREADS", "32"))
+"""
+Requests handled concurrently by each server worker process (handler threads).
+Set by: Environment variable 'PENNYWORTH_SERVER_THREADS' (default: 32).
+Used for: Server mode (server.py).
+"""
+
+PENNYWORTH_SERVER_REQUEST_TIMEOUT_MS = int(
+    os.environ.get("PENNYWORTH_SERVER_REQUEST_TIMEOUT_MS", "300000")
+)
+"""
+Time budget of a request in server mode, standing in for the Lambda timeout
+when computing request deadlines.
+Set by: Environment variable 'PENNYWORTH_SERVER_REQUEST_TIMEOUT_MS' (default: 300000).
+Used for: Server mode (server.py), request deadlines (deadline.py).
+"""
+
+PENNYWORTH_EMBEDDING_BATCH_MAX_WAIT_MS = float(
+    os.environ.get("PENNYWORTH_EMBEDDING_BATCH_MAX_WAIT_MS", "5")
+)
+"""
+How long the first embedding request of a batch waits for others to join it
+in server mode. 0 turns cross-request batching off.
+Set by: Environment variable 'PENNYWORTH_EMBEDDING_BATCH_MAX_WAIT_MS' (default: 5).
+Used for: Embedding micro-batching (embedding_batcher.py, server.py).
+"""
+
+PENNYWORTH_EMBEDDING_BATCH_MAX_ITEMS = int(
+    os.environ.get("PENNYWORTH_EMBEDDING_BATCH_MAX_ITEMS", "64")
+)
+"""
+Most inputs sent to the provider in one batched embedding call; a full batch
+is sent without waiting further.
+Set by: Environment variable 'PENNYWORTH_EMBEDDING_BATCH_MAX_ITEMS' (default: 64).
+Used for: Embedding micro-batching (embedding_batcher.py, server.py).
+"""
+
+PENNYWORTH_TRACE_LAYERS = os.environ.get("PENNYWORTH_TRACE_LAYERS", "route,handler,storage")
+"""
+Comma-separated layers whose functions get X-Ray subsegments: route, handler,
+auth, storage, or "all"/"none". Functions in other layers are not decorated.
+Set by: Environment variable 'PENNYWORTH_TRACE_LAYERS' (default: route,handler,storage).
+Used for: Tracing policy (tracing.py).
+"""
+
+PENNYWORTH_TRACE_RESPONSE_MAX_BYTES = int(
+    os.environ.get("PENNYWORTH_TRACE_RESPONSE_MAX_BYTES", "0")
+)
+"""
+Largest JSON-encoded return value attached to a subsegment as metadata; larger
+ones are left out. 0 attaches no return values.
+Set by: Environment variable 'PENNYWORTH_TRACE_RESPONSE_MAX_BYTES' (default: 0).
+Used for: Tracing policy (tracing.py).
+"""
+
+PENNYWORTH_TRACE_SAMPLING = os.environ.get("PENNYWORTH_TRACE_SAMPLING", "*=1")
+"""
+Per-route trace sampling rules, "pattern=rate" separated by commas; patterns
+are globs matched against "/path" or "METHOD /path" and the first match wins,
+e.g. "/v1/models=0,/v1/version=0,POST /v1/chat/*=0.2,*=1".
+Set by: Environment variable 'PENNYWORTH_TRACE_SAMPLING' (default: *=1).
+Used for: Tracing policy (tracing.py).
+"""
+
+PENNYWORTH_PROFILE_DESTINATION = os.environ.get("PENNYWORTH_PROFILE_DESTINATION", "log")
+"""
+Where on-demand request profiles go: "log" (one structured log line) or
+"storage" (profiles/YYYY/MM/DD/<request id>.json in the files bucket).
+Set by: Environment variable 'PENNYWORTH_PROFILE_DESTINATION' (default: log).
+Used for: Request profiling (profiling.py).
+"""
+
+PENNYWORTH_PROFILE_SAMPLE_INTERVAL_MS = float(
+    os.environ.get("PENNYWORTH_PROFILE_SAMPLE_INTERVAL_MS", "1")
+)
+"""
+Interval between stack samples when a request is profiled in "sample" mode.
+Set by: Environment variable 'PENNYWORTH_PROFILE_SAMPLE_INTERVAL_MS' (default: 1).
+Used for: Request profiling (profiling.py).
+"""
+
+PENNYWORTH_CAPTURE_RATE = float(os.environ.get("PENNYWORTH_CAPTURE_RATE", "0"))
+"""
+Fraction of requests (0 to 1) recorded as redacted request shapes for
+`pennyworth replay`. 0 turns capture off.
+Set by: Environment variable 'PENNYWORTH_CAPTURE_RATE' (default: 0).
+Used for: Traffic capture (capture.py).
+"""
+
+PENNYWORTH_CAPTURE_SINK = os.environ.get("PENNYWORTH_CAPTURE_SINK", "log")
+"""
+Where captured request shapes go: "log" (a structured log line per request) or
+the path of a JSONL file to append to.
+Set by: Environment variable 'PENNYWORTH_CAPTURE_SINK' (default: log).
+Used for: Traffic capture (capture.py).
+"""
+
+PENNYWORTH_CONCURRENCY_LIMIT_MAX = float(os.environ.get("PENNYWORTH_CONCURRENCY_LIMIT_MAX", "0"))
+"""
+Upper bound, and starting value, of the adaptive fleet-wide concurrency limit
+on upstream calls per provider/region/model. 0 turns the limiter off.
+Set by: Environment variable 'PENNYWORTH_CONCURRENCY_LIMIT_MAX' (default: 0).
+Used for: Adaptive concurrency limits (limiter.py).
+"""
+
+PENNYWORTH_CONCURRENCY_LIMIT_MIN = float(os.environ.get("PENNYWORTH_CONCURRENCY_LIMIT_MIN", "1"))
+"""
+Lower bound of the adaptive concurrency limit.
+Set by: Environment variable 'PENNYWORTH_CONCURRENCY_LIMIT_MIN' (default: 1).
+Used for: Adaptive concurrency limits (limiter.py).
+"""
+
+PENNYWORTH_CONCURRENCY_LIMIT_BACKOFF = float(
+    os.environ.get("PENNYWORTH_CONCURRENCY_LIMIT_BACKOFF", "0.7")
+)
+"""
+Factor the concurrency limit is multiplied by when the provider throttles.
+Set by: Environment variable 'PENNYWORTH_CONCURRENCY_LIMIT_BACKOFF' (default: 0.7).
+Used for: Adaptive concurrency limits (limiter.py).
+"""
+
+PENNYWORTH_CONCURRENCY_LIMIT_COOLDOWN_SECONDS = int(
+    os.environ.get("PENNYWORTH_CONCURRENCY_LIMIT_COOLDOWN_SECONDS", "2")
+)
+"""
+Minimum seconds between two decreases of the same limit, so one burst of
+throttles shrinks it once rather than once per container or call.
+Set by: Environment variable 'PENNYWORTH_CONCURRENCY_LIMIT_COOLDOWN_SECONDS' (default: 2).
+Used for: Adaptive concurrency limits (limiter.py).
+"""
+
+PENNYWORTH_CONCURRENCY_LIMIT_WAIT_MS = float(
+    os.environ.get("PENNYWORTH_CONCURRENCY_LIMIT_WAIT_MS", "250")
+)
+"""
+Longest a request waits for a slot when every region of its model is at its
+limit, before it is shed with a 429.
+Set by: Environment variable 'PENNYWORTH_CONCURRENCY_LIMIT_WAIT_MS' (default: 250).
+Used for: Adaptive concurrency limits (limiter.py).
+"""
+
+PENNYWORTH_BATCH_LANE_SHARE = float(os.environ.get("PENNYWORTH_BATCH_LANE_SHARE", "0.5"))
+"""
+Fraction of each adaptive concurrency limit that batch-lane calls may hold;
+the rest is kept for interactive calls.
+Set by: Environment variable 'PENNYWORTH_BATCH_LANE_SHARE' (default: 0.5).
+Used for: Priority lanes (lanes.py, limiter.py).
+"""
+
+PENNYWORTH_BATCH_LANE_WAIT_MS = float(os.environ.get("PENNYWORTH_BATCH_LANE_WAIT_MS", "5000"))
+"""
+Longest a batch-lane call queues for a slot before it is shed with a 429.
+Set by: Environment variable 'PENNYWORTH_BATCH_LANE_WAIT_MS' (default: 5000).
+Used for: Priority lanes (lanes.py, limiter.py).
+"""
+
+PENNYWORTH_BATCH_LANE_ROUTES = os.environ.get("PENNYWORTH_BATCH_LANE_ROUTES", "")
+"""
+Comma-separated path patterns whose requests always run in the batch lane,
+e.g. "/v1/embeddings". Batch jobs (/v1/batches) always do.
+Set by: Environment variable 'PENNYWORTH_BATCH_LANE_ROUTES' (default: none).
+Used for: Priority lanes (lanes.py).
+"""
@@ -0,0 +1,31 @@
+# Opaque cursor helpers shared by the Lambda handlers and the CLI.
+
+import base64
+import json
+from typing import Any, Optional
+
+
+def encode_cursor(token: Any) -> Optional[str]:
+    """
+    Encode a provider pagination token as an opaque, URL-safe cursor string.
+    Accepts a Cognito PaginationToken (str) or a DynamoDB LastEvaluatedKey (dict).
+    Returns None when there is no further page.
+    """
+    if not token:
+        return None
+    raw = json.dumps(token, separators=(",", ":"), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Any:
+    """
+    Decode a cursor produced by encode_cursor back into the provider token.
+    Returns None for an empty cursor and raises ValueError for a malformed one.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception as e:
+        raise ValueError(f"Invalid pagination cursor: {e}")
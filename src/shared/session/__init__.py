@@ -77,7 +77,8 @@ def get_session(params: Optional[dict] = None) -> Optional[Dict[str, Any]]:
         # Authenticate with Cognito
         t4 = time.time()
         log_debug("Authenticating with Cognito...", verbose)
-        id_token = _authenticate_with_cognito(config, username, password, new_password)
+        tokens = _authenticate_with_cognito(config, username, password, new_password)
+        id_token = tokens["IdToken"]
         t5 = time.time()
         log_debug(f"Authenticated with Cognito in {t5-t4:.2f}s", verbose)
 
@@ -89,7 +90,11 @@ def get_session(params: Optional[dict] = None) -> Optional[Dict[str, Any]]:
         log_debug(f"Got AWS credentials in {t7-t6:.2f}s", verbose)
 
         # Create session
-        session = {"jwt_token": id_token, "aws_credentials": aws_creds}
+        session = {
+            "jwt_token": id_token,
+            "aws_credentials": aws_creds,
+            "refresh_token": tokens.get("RefreshToken"),
+        }
 
         # Save session
         t8 = time.time()
@@ -105,6 +110,35 @@ def get_session(params: Optional[dict] = None) -> Optional[Dict[str, Any]]:
         return None
 
 
+def refresh_session(session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Renew a session without prompting, using its Cognito refresh token.
+    Args:
+        session: A session returned by get_session (expired or not)
+    Returns:
+        The new session (also saved to disk), or None if it has no refresh token or renewal failed
+    """
+    refresh_token = session.get("refresh_token")
+    if not refresh_token:
+        return None
+    try:
+        config = _get_cognito_config()
+        client = boto3.client("cognito-idp", region_name=config.get("Region", "us-west-2"))
+        resp = client.initiate_auth(
+            AuthFlow="REFRESH_TOKEN_AUTH",
+            AuthParameters={"REFRESH_TOKEN": refresh_token},
+            ClientId=config["UserPoolClientId"],
+        )
+        id_token = resp["AuthenticationResult"]["IdToken"]
+        aws_creds = _get_aws_credentials(config, id_token)
+    except (ClientError, RuntimeError, KeyError) as e:
+        print(f"Session refresh failed: {e}")
+        return None
+    renewed = {"jwt_token": id_token, "aws_credentials": aws_creds, "refresh_token": refresh_token}
+    _save_session(renewed)
+    return renewed
+
+
 def _load_session() -> Optional[Dict[str, Any]]:
     """Load session from ~/.pennyworth/session.json"""
     session_file = os.path.join(SESSION_DIR, SESSION_FILE)
@@ -132,7 +166,11 @@ def _save_session(session: Dict[str, Any]) -> None:
             if hasattr(exp, "isoformat"):
                 session_copy["aws_credentials"] = session_copy["aws_credentials"].copy()
                 session_copy["aws_credentials"]["Expiration"] = exp.isoformat()
-        with open(session_file, "w") as f:
+        # The session holds tokens and AWS credentials: owner-only, and
+        # tightened if an older, more permissive file is already there.
+        fd = os.open(session_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod(session_file, 0o600)
+        with os.fdopen(fd, "w") as f:
             json.dump(session_copy, f, indent=2, default=str)
     except Exception as e:
         print(f"Error saving session: {e}")
@@ -172,8 +210,8 @@ def _authenticate_with_cognito(
     username: str,
     password: str,
     new_password: Optional[str] = None,
-) -> str:
-    """Authenticate with Cognito and handle challenges (MFA, password change)"""
+) -> Dict[str, str]:
+    """Authenticate with Cognito and handle challenges (MFA, password change); returns the AuthenticationResult"""
     client = boto3.client("cognito-idp", region_name=config.get("Region", "us-west-2"))
 
     try:
@@ -247,7 +285,7 @@ def _authenticate_with_cognito(
                 )
 
         if "AuthenticationResult" in resp:
-            return resp["AuthenticationResult"]["IdToken"]
+            return resp["AuthenticationResult"]
         else:
             raise RuntimeError("Unexpected Cognito response")
 
@@ -1 +1 @@
-x"""Test package for Pennyworth.""" 
\ No newline at end of file
+"""Test package for Pennyworth.""" 
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""Route-level micro-benchmarks with baselines stored in the repo.
+
+Benchmarks only run with --benchmark. Each measurement is normalized by a fixed
+pure-Python calibration workload, so baselines recorded on one machine remain
+comparable on another. The workload exercises the same kinds of code as a
+request (JSON, uuids, URL encoding, regexes, hashing, base64), so a machine
+slowing down affects both alike. Each round of the benchmark is timed between
+two rounds of the workload, with the garbage collector paused, and an attempt's
+ratio is the mean of the middle half of its per-round ratios. A benchmark over
+the threshold is measured again, twice at most, and gated on the lowest ratio
+of its attempts: a slow spell on the machine passes, a regression does not.
+"""
+
+import base64
+import gc
+import hashlib
+import json
+import os
+import re
+import statistics
+import time
+import urllib.parse
+import uuid
+
+import pytest
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# Attempts per benchmark: all of them when recording baselines, otherwise as
+# many as needed to get under the threshold.
+ATTEMPTS = 3
+
+# Baselines are the median of the last SESSIONS recorded sessions, so one fast
+# or slow session does not set them.
+SESSIONS = 3
+
+_results = {}
+_calibration = {}
+
+
+def _calibration_workload():
+    total = 0
+    for i in range(150):
+        doc = {"id": str(uuid.UUID(int=i)), "messages": [{"role": "user", "content": f"message {i} " * 8}]}
+        text = json.dumps(doc)
+        parsed = json.loads(text)
+        total += len(urllib.parse.urlencode({"id": parsed["id"], "n": i}))
+        total += len(re.findall(r"\w+", parsed["messages"][0]["content"]))
+        total += len(hashlib.sha256(text.encode()).hexdigest())
+        total += len(base64.urlsafe_b64encode(text.encode()))
+    return total
+
+
+def _iterations(fn, min_round_time, warmup):
+    """Calls of `fn` needed for a round to last at least `min_round_time`."""
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    fn()
+    single = max(time.perf_counter() - start, 1e-7)
+    return max(1, int(min_round_time / single))
+
+
+def _round(fn, iterations):
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - start) / iterations
+    finally:
+        gc.enable()
+
+
+def _middle_mean(values):
+    """Mean of the middle half of `values`."""
+    values = sorted(values)
+    quarter = len(values) // 4
+    return statistics.mean(values[quarter : len(values) - quarter])
+
+
+def measure(fn, rounds=31, min_round_time=0.02, warmup=3):
+    """
+    Time `fn` in rounds, each repeating it enough times to last at least
+    `min_round_time` and each between two rounds of the calibration workload.
+    Returns the fastest and median per-call times (seconds) and the mean of
+    the middle half of the per-round ratios to the calibration workload.
+    """
+    iterations = _iterations(fn, min_round_time, warmup)
+    calibration = _iterations(_calibration_workload, min_round_time, warmup)
+    gc.collect()
+    per_call, ratios = [], []
+    before = _round(_calibration_workload, calibration)
+    for _ in range(rounds):
+        elapsed = _round(fn, iterations)
+        after = _round(_calibration_workload, calibration)
+        per_call.append(elapsed)
+        ratios.append(elapsed / ((before + after) / 2))
+        before = after
+    return {
+        "min": min(per_call),
+        "median": statistics.median(per_call),
+        "ratio": _middle_mean(ratios),
+        "iterations": iterations,
+    }
+
+
+def calibration_time():
+    """Per-call time of the calibration workload, for the summary."""
+    if "time" not in _calibration:
+        _calibration["time"] = measure(_calibration_workload, rounds=5)["min"]
+    return _calibration["time"]
+
+
+def _load():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE) as f:
+        return json.load(f)
+
+
+def load_baselines():
+    return _load().get("benchmarks", {})
+
+
+class RouteBenchmark:
+    """Callable fixture: route_benchmark(name, fn) measures, records and gates."""
+
+    def __init__(self, config):
+        self.update = config.getoption("--benchmark-update")
+        self.threshold = config.getoption("--benchmark-threshold")
+        self.baselines = load_baselines()
+
+    def __call__(self, name, fn, **kwargs):
+        baseline = self.baselines.get(name)
+        attempts = []
+        while len(attempts) < ATTEMPTS:
+            attempts.append(measure(fn, **kwargs))
+            ratio = min(a["ratio"] for a in attempts)
+            if not self.update and (not baseline or ratio <= baseline * (1 + self.threshold)):
+                break
+        stats = min(attempts, key=lambda a: a["ratio"])
+        result = {
+            "min_us": round(min(a["min"] for a in attempts) * 1e6, 2),
+            "median_us": round(stats["median"] * 1e6, 2),
+            "ratio": float(f"{ratio:.4g}"),
+            "baseline_ratio": baseline,
+            "attempts": len(attempts),
+        }
+        _results[name] = result
+        if baseline and not self.update and ratio > baseline * (1 + self.threshold):
+            pytest.fail(
+                f"{name} regressed: {ratio:.3f} vs baseline {baseline:.3f} "
+                f"(+{(ratio / baseline - 1) * 100:.0f}%, threshold {self.threshold * 100:.0f}%, "
+                f"best of {len(attempts)} attempts)"
+            )
+        return result
+
+
+@pytest.fixture
+def route_benchmark(request):
+    return RouteBenchmark(request.config)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results or not session.config.getoption("--benchmark-update"):
+        return
+    stored = _load()
+    samples = stored.get("sessions", {})
+    for name, r in _results.items():
+        samples[name] = (samples.get(name, []) + [r["ratio"]])[-SESSIONS:]
+    baselines = {**stored.get("benchmarks", {})}
+    baselines.update({name: float(f"{statistics.median(v):.4g}") for name, v in samples.items()})
+    with open(BASELINE_FILE, "w") as f:
+        json.dump(
+            {
+                "unit": "per-call time / calibration workload time",
+                "benchmarks": dict(sorted(baselines.items())),
+                "sessions": dict(sorted(samples.items())),
+            },
+            f,
+            indent=2,
+        )
+        f.write("\n")
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    calibration = calibration_time() * 1e6
+    terminalreporter.section("pennyworth benchmarks")
+    terminalreporter.write_line(f"calibration workload: {calibration:.1f} us")
+    terminalreporter.write_line(
+        f"{'benchmark':<32} {'min(us)':>10} {'median(us)':>11} {'ratio':>8} {'baseline':>9} {'delta':>7} {'tries':>5}"
+    )
+    for name, r in sorted(_results.items()):
+        base = r["baseline_ratio"]
+        delta = f"{(r['ratio'] / base - 1) * 100:+.0f}%" if base else "new"
+        terminalreporter.write_line(
+            f"{name:<32} {r['min_us']:>10.1f} {r['median_us']:>11.1f} {r['ratio']:>8.3f} "
+            f"{base if base else '-':>9} {delta:>7} {r['attempts']:>5}"
+        )
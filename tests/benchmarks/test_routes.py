@@ -0,0 +1,106 @@
+"""Per-route overhead of the pennyworth layer, with the LLM provider faked out."""
+
+import pytest
+
+from tests.utils.harness import FakeLambdaContext, make_event
+
+CHAT_BODY = {
+    "model": "claude-instant",
+    "messages": [
+        {"role": "system", "content": "You are a helpful coding assistant."},
+        {"role": "user", "content": "Rename this variable to something clearer."},
+    ],
+}
+
+
+def _route(harness, method, path, **kwargs):
+    event = make_event(method, f"{harness.prefix}{path}", **kwargs)
+    context = FakeLambdaContext()
+
+    def call():
+        response = harness.api.lambda_handler(event, context)
+        assert response["statusCode"] < 500
+
+    return call
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize(
+    "name,method,path,body",
+    [
+        ("route.version", "GET", "/version", None),
+        ("route.well_known", "GET", "/parameters/well-known", None),
+        ("route.models", "GET", "/models", None),
+        ("route.not_found", "GET", "/does-not-exist", None),
+        ("route.chat_completions", "POST", "/chat/completions", CHAT_BODY),
+        ("route.embeddings", "POST", "/embeddings", {"model": "titan-text", "input": "hello"}),
+    ],
+)
+def test_route_overhead(lambda_harness, route_benchmark, name, method, path, body):
+    route_benchmark(name, _route(lambda_harness, method, path, body=body))
+
+
+@pytest.mark.benchmark
+def test_static_route_revalidation(lambda_harness, route_benchmark):
+    etag = lambda_harness.get("/models").headers["etag"]
+    route_benchmark(
+        "route.models_not_modified",
+        _route(lambda_harness, "GET", "/models", headers={"If-None-Match": etag}),
+    )
+
+
+@pytest.mark.benchmark
+def test_authenticated_route_overhead(lambda_harness, route_benchmark):
+    headers = lambda_harness.auth_headers("bench-admin", groups=("admin",))
+    route_benchmark("route.users_list", _route(lambda_harness, "GET", "/users", headers=headers))
+
+
+@pytest.mark.benchmark
+def test_jwt_verification(lambda_harness, route_benchmark):
+    import auth
+
+    event = make_event("GET", "/v1/users", headers=lambda_harness.auth_headers("bench"))
+    route_benchmark("component.require_cognito_jwt", lambda: auth.require_cognito_jwt(event))
+
+
+@pytest.mark.benchmark
+def test_middleware_chain(lambda_harness, route_benchmark):
+    api = lambda_harness.api
+
+    class _App:
+        class current_event:
+            raw_event = make_event("GET", "/v1/users", headers=lambda_harness.auth_headers("bench"))
+
+    route_benchmark(
+        "component.jwt_middleware",
+        lambda: api.cognito_jwt_auth_middleware(_App, lambda app: None),
+    )
+
+
+@pytest.mark.benchmark
+def test_safe_response_serialization(lambda_harness, route_benchmark):
+    api = lambda_harness.api
+    body = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "choices": [
+            {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "x " * 500}}
+        ],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 500, "total_tokens": 600},
+    }
+    route_benchmark("component.safe_response", lambda: api.SafeResponse(status_code=200, body=body))
+
+
+@pytest.mark.benchmark
+def test_model_lookup(lambda_harness, route_benchmark):
+    import model_router
+
+    route_benchmark("component.model_lookup", lambda: model_router.get_model_config("claude-instant"))
+
+
+@pytest.mark.benchmark
+def test_routing_only(lambda_harness, route_benchmark):
+    api = lambda_harness.api
+    event = make_event("GET", f"{lambda_harness.prefix}/version")
+    context = FakeLambdaContext()
+    route_benchmark("component.resolver_routing", lambda: api.app.resolve(event, context))
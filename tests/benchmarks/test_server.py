@@ -0,0 +1,56 @@
+"""Throughput of Lambda mode versus server mode (server.py) with the provider faked out.
+
+Lambda handles one request per container at a time, so a batch of requests to
+one container runs back to back; the ASGI server overlaps them on its handler
+threads. The fake provider's latency stands in for the upstream round trip.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from tests.benchmarks.test_routes import CHAT_BODY, _route
+
+BATCH = 32
+PROVIDER_LATENCY = 0.005
+
+
+@pytest.fixture
+def slow_provider(lambda_harness):
+    lambda_harness.provider.latency = PROVIDER_LATENCY
+    return lambda_harness
+
+
+@pytest.mark.benchmark
+def test_lambda_mode_throughput(slow_provider, route_benchmark):
+    call = _route(slow_provider, "POST", "/chat/completions", body=CHAT_BODY)
+
+    def batch():
+        for _ in range(BATCH):
+            call()
+
+    route_benchmark("throughput.lambda_chat_x32", batch, rounds=5, warmup=1)
+
+
+@pytest.mark.benchmark
+def test_server_mode_throughput(slow_provider, route_benchmark):
+    import server
+
+    url = f"http://bench{slow_provider.prefix}/chat/completions"
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app))
+
+    async def requests():
+        responses = await asyncio.gather(*(client.post(url, json=CHAT_BODY) for _ in range(BATCH)))
+        assert all(r.status_code == 200 for r in responses)
+
+    try:
+        result = route_benchmark(
+            "throughput.server_chat_x32", lambda: loop.run_until_complete(requests()), rounds=5, warmup=1
+        )
+    finally:
+        loop.run_until_complete(client.aclose())
+        loop.close()
+    # Overlapping upstream waits is the point of server mode.
+    assert result["min_us"] / 1e6 < BATCH * PROVIDER_LATENCY
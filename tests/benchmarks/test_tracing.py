@@ -0,0 +1,69 @@
+"""Per-request cost of X-Ray tracing under the tracing policy (tracing.py).
+
+Tracing is switched on with a real X-Ray recorder whose emitter drops
+segments, so subsegment creation and metadata are measured without a daemon.
+Each request is run once with the sampling rules set to record its
+subsegments and once with them set to skip them.
+"""
+
+import pytest
+
+from tests.benchmarks.test_routes import CHAT_BODY, _route
+
+
+class _DropEmitter:
+    def send_entity(self, entity):
+        pass
+
+    def set_daemon_address(self, address):
+        pass
+
+
+@pytest.fixture
+def xray(monkeypatch):
+    from aws_xray_sdk import global_sdk_config
+    from aws_xray_sdk.core import xray_recorder
+
+    monkeypatch.setattr(xray_recorder, "_emitter", _DropEmitter())
+    monkeypatch.setattr(xray_recorder, "_sampling", False)
+    global_sdk_config.set_sdk_enabled(True)
+    yield xray_recorder
+    global_sdk_config.set_sdk_enabled(False)
+
+
+def _in_segment(recorder, call):
+    def traced_request():
+        recorder.begin_segment("pennyworth-bench")
+        try:
+            call()
+        finally:
+            recorder.end_segment()
+
+    return traced_request
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("sampled", [True, False], ids=["sampled", "unsampled"])
+def test_tracing_overhead(lambda_harness, route_benchmark, xray, monkeypatch, sampled):
+    import tracing
+
+    monkeypatch.setattr(tracing, "_rules", [("*", 1.0 if sampled else 0.0)])
+    call = _in_segment(xray, _route(lambda_harness, "POST", "/chat/completions", body=CHAT_BODY))
+    name = "tracing.chat_sampled" if sampled else "tracing.chat_unsampled"
+    route_benchmark(name, call)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("sampled", [True, False], ids=["sampled", "unsampled"])
+def test_traced_call_overhead(lambda_harness, route_benchmark, xray, sampled):
+    import tracing
+
+    traced = tracing.capture("route")(lambda: None)
+    token = tracing._sampled.set(sampled)
+    try:
+        xray.begin_segment("pennyworth-bench")
+        name = "component.traced_call_sampled" if sampled else "component.traced_call_unsampled"
+        route_benchmark(name, traced)
+    finally:
+        xray.end_segment()
+        tracing._sampled.reset(token)
@@ -1,14 +1,61 @@
 """Test configuration and fixtures for the Pennyworth test suite."""
 
 import os
+import sys
 import pytest
 import secrets
 import uuid
 
+# Lambda modules import each other by bare name (e.g. "from utils import logger"),
+# as they do in the deployed package, so put src/lambda on the import path.
+LAMBDA_SRC = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "lambda")
+if LAMBDA_SRC not in sys.path:
+    sys.path.insert(0, LAMBDA_SRC)
+os.environ.setdefault("POWERTOOLS_TRACE_DISABLED", "true")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+# Defaults for the in-process harness; a real deployment's environment wins.
+for _name, _value in {
+    "PENNYWORTH_API_VERSION": "v1",
+    "PENNYWORTH_AWS_REGION": "us-west-2",
+    "PENNYWORTH_USER_POOL_ID": "us-west-2_harness",
+    "PENNYWORTH_USER_POOL_CLIENT_ID": "harness-client",
+    "PENNYWORTH_IDENTITY_POOL_ID": "us-west-2:harness-identity-pool",
+}.items():
+    os.environ.setdefault(_name, _value)
+
 from src.shared.session import get_session
 from tests.utils.cognito import create_user, delete_user
+from tests.utils.fake_aws import FakeAWS, FakeCognitoJWKS
+from tests.utils.fake_provider import FakeProvider
+from tests.utils.harness import LambdaHarness
 from src.shared.constants import *
 
+def pytest_addoption(parser):
+    group = parser.getgroup("pennyworth benchmarks")
+    group.addoption("--benchmark", action="store_true", help="Run benchmarks in tests/benchmarks.")
+    group.addoption(
+        "--benchmark-update",
+        action="store_true",
+        help="Record benchmark results as the new baselines instead of gating on them.",
+    )
+    group.addoption(
+        "--benchmark-threshold",
+        type=float,
+        default=float(os.environ.get("PENNYWORTH_BENCHMARK_THRESHOLD", "0.15")),
+        help="Allowed slowdown versus baseline before a benchmark fails (0.15 = 15%%; see doc/testing.md).",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark") or config.getoption("--benchmark-update"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks run only with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture(scope='session')
 def test_users():
     """Create test users in Cognito for testing.
@@ -47,4 +94,56 @@ def jwt_tokens(test_users):
     return {
         'admin_jwt': admin_session['jwt_token'],
         'user_jwt': user_session['jwt_token']
-    } 
\ No newline at end of file
+    }
+
+
+@pytest.fixture(scope='session')
+def fake_jwks():
+    """Local RSA signing key and JWKS standing in for the Cognito user pool."""
+    return FakeCognitoJWKS(
+        PENNYWORTH_AWS_REGION, PENNYWORTH_USER_POOL_ID, PENNYWORTH_USER_POOL_CLIENT_ID
+    )
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    """Deterministic LLM provider patched over litellm.completion/embedding."""
+    return FakeProvider(seed=0).install(monkeypatch)
+
+
+@pytest.fixture
+def fake_aws(monkeypatch):
+    """In-memory Cognito and DynamoDB clients patched over boto3."""
+    import auth
+
+    return FakeAWS().install(monkeypatch, auth)
+
+
+@pytest.fixture
+def lambda_harness(monkeypatch, fake_jwks, fake_provider, fake_aws):
+    """Invokes api.lambda_handler in-process with all external services faked.
+
+    Tests can tune `lambda_harness.provider` (latency, errors, ...) and inspect
+    `lambda_harness.aws` after invoking routes.
+    """
+    import api
+    import auth
+    import budgets
+    import embedding_batcher
+    import limiter
+    import regions
+    import state
+    import storage
+
+    fake_jwks.install(monkeypatch, auth)
+    monkeypatch.setattr(budgets, "_cache", {})
+    monkeypatch.setattr(embedding_batcher, "_batcher", None)
+    monkeypatch.setattr(limiter, "_limiters", {})
+    monkeypatch.setattr(regions, "_stats", {})
+    monkeypatch.setattr(state, "_store", state.MemoryStateStore())
+    monkeypatch.setattr(storage, "_store", storage.MemoryObjectStore())
+    harness = LambdaHarness(api, jwks=fake_jwks, api_version=PENNYWORTH_API_VERSION)
+    harness.provider = fake_provider
+    harness.aws = fake_aws
+    return harness
+
@@ -0,0 +1,262 @@
+import json
+
+import pytest
+
+BOUNDARY = "pennyworth-boundary"
+
+
+def _multipart(data, purpose="batch", filename="requests.jsonl"):
+    body = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="purpose"\r\n\r\n'
+        f"{purpose}\r\n"
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/jsonl\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+def _requests(n, bad=()):
+    lines = []
+    for i in range(n):
+        model = "no-such-model" if i in bad else "claude-instant"
+        body = {"model": model, "messages": [{"role": "user", "content": f"question {i}"}]}
+        lines.append({"custom_id": f"req-{i}", "method": "POST", "url": "/v1/chat/completions", "body": body})
+    return "".join(json.dumps(l) + "\n" for l in lines).encode()
+
+
+def _upload(harness, data, purpose="batch"):
+    body, headers = _multipart(data, purpose)
+    resp = harness.post("/files", body=body, headers=headers)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+@pytest.fixture
+def inline_batches(monkeypatch):
+    """Run dispatched batches synchronously instead of in a worker Lambda."""
+    import batches
+
+    dispatched = []
+
+    def dispatch(batch_id, function_name=None):
+        dispatched.append((batch_id, function_name))
+        if function_name is None:
+            batches.run_batch(batch_id)
+
+    monkeypatch.setattr(batches, "dispatch", dispatch)
+    return dispatched
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_files_round_trip(lambda_harness):
+    meta = _upload(lambda_harness, b'{"hello": "world"}\n')
+    assert meta["purpose"] == "batch" and meta["bytes"] == 19
+    assert lambda_harness.get(f"/files/{meta['id']}").json() == meta
+    assert lambda_harness.get(f"/files/{meta['id']}/content").text == '{"hello": "world"}\n'
+    assert [f["id"] for f in lambda_harness.get("/files").json()["data"]] == [meta["id"]]
+    assert lambda_harness.delete(f"/files/{meta['id']}").json()["deleted"] is True
+    assert lambda_harness.get(f"/files/{meta['id']}").status_code == 404
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_batch_runs_to_completion(lambda_harness, inline_batches, monkeypatch):
+    import batches
+
+    monkeypatch.setattr(batches, "PENNYWORTH_BATCH_CONCURRENCY", 2)  # Several chunks.
+    meta = _upload(lambda_harness, _requests(20, bad={3}))
+    body = {"input_file_id": meta["id"], "endpoint": "/v1/chat/completions", "completion_window": "24h"}
+    batch = lambda_harness.post("/batches", body=body).json()
+    assert batch["status"] == "validating"
+
+    batch = lambda_harness.get(f"/batches/{batch['id']}").json()
+    assert batch["status"] == "completed"
+    assert batch["request_counts"] == {"total": 20, "completed": 19, "failed": 1}
+    assert "_progress" not in batch
+
+    output = lambda_harness.get(f"/files/{batch['output_file_id']}/content").text.splitlines()
+    results = [json.loads(line) for line in output]
+    assert sorted(r["custom_id"] for r in results) == sorted(f"req-{i}" for i in range(20) if i != 3)
+    assert results[0]["response"]["status_code"] == 200
+    errors = lambda_harness.get(f"/files/{batch['error_file_id']}/content").text.splitlines()
+    assert json.loads(errors[0])["custom_id"] == "req-3"
+    assert len(lambda_harness.provider.calls) == 19
+
+    listing = lambda_harness.get("/batches").json()
+    assert listing["data"][0]["id"] == batch["id"]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_invalid_input_fails_batch(lambda_harness, inline_batches):
+    meta = _upload(lambda_harness, b'not json\n{"custom_id": "a", "url": "/v1/embeddings", "body": {}}\n')
+    body = {"input_file_id": meta["id"], "endpoint": "/v1/chat/completions"}
+    batch_id = lambda_harness.post("/batches", body=body).json()["id"]
+    batch = lambda_harness.get(f"/batches/{batch_id}").json()
+    assert batch["status"] == "failed"
+    assert [e["line"] for e in batch["errors"]["data"]] == [1, 2]
+    assert lambda_harness.provider.calls == []
+
+
+@pytest.mark.unit
+def test_worker_checkpoints_and_continues_near_deadline(lambda_harness, monkeypatch):
+    import batches
+    from handlers.files import create_file
+    from tests.utils.harness import FakeLambdaContext
+
+    monkeypatch.setattr(batches, "PENNYWORTH_BATCH_CONCURRENCY", 2)
+    monkeypatch.setattr(batches, "dispatch", lambda *args, **kwargs: None)
+    meta = create_file(_requests(20), "in.jsonl", "batch")
+    batch = batches.create_batch(meta["id"], "/v1/chat/completions")
+
+    context = FakeLambdaContext()
+    # Time runs out once the first two chunks (16 requests) have been sent.
+    calls = lambda_harness.provider.calls
+    context.get_remaining_time_in_millis = lambda: 120000 if len(calls) < 16 else 1000
+    continued = []
+    monkeypatch.setattr(batches, "dispatch", lambda batch_id, function_name=None: continued.append(function_name))
+
+    batch = batches.run_batch(batch["id"], context)
+    assert batch["status"] == "in_progress"
+    assert batch["request_counts"]["completed"] == 16  # Two chunks of 8.
+    assert continued == [context.invoked_function_arn]
+
+    batch = batches.run_batch(batch["id"])  # The continuation resumes from the checkpoint.
+    assert batch["status"] == "completed"
+    assert batch["request_counts"]["completed"] == 20
+    assert len(lambda_harness.provider.calls) == 20
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_batch_requests_are_charged_to_the_creators_budget(lambda_harness, inline_batches, monkeypatch):
+    import batches
+    import budgets
+
+    monkeypatch.setattr(batches, "PENNYWORTH_BATCH_CONCURRENCY", 1)  # One request at a time.
+    # Room for two requests of 100 output tokens on claude-instant ($0.00024 each).
+    monkeypatch.setattr(budgets, "PENNYWORTH_KEY_DAILY_BUDGET_USD", 0.00024 * 2.5)
+    lambda_harness.provider.completion_tokens = 100
+    headers = lambda_harness.auth_headers("alice")
+    body = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 100}
+    line = {"method": "POST", "url": "/v1/chat/completions", "body": body}
+    data = "".join(json.dumps({**line, "custom_id": f"req-{i}"}) + "\n" for i in range(5)).encode()
+    upload, upload_headers = _multipart(data)
+    input_file = lambda_harness.post("/files", body=upload, headers={**headers, **upload_headers}).json()
+
+    create = {"input_file_id": input_file["id"], "endpoint": "/v1/chat/completions"}
+    batch_id = lambda_harness.post("/batches", body=create, headers=headers).json()["id"]
+    batch = lambda_harness.get(f"/batches/{batch_id}", headers=headers).json()
+    assert batch["status"] == "completed"
+    assert batch["request_counts"] == {"total": 5, "completed": 2, "failed": 3}
+    assert len(lambda_harness.provider.calls) == batch["request_counts"]["completed"]
+    errors = lambda_harness.get(f"/files/{batch['error_file_id']}/content", headers=headers).text
+    responses = [json.loads(e)["response"] for e in errors.splitlines()]
+    assert {r["status_code"] for r in responses} == {429}
+    assert "spend limit" in responses[0]["body"]["error"]["message"]
+
+    # The batch spent its creator's budget.
+    resp = lambda_harness.post("/chat/completions", body=body, headers=headers)
+    assert resp.status_code == 429
+
+
+@pytest.mark.unit
+def test_batch_requests_run_under_their_own_deadline(lambda_harness, monkeypatch):
+    import batches
+    from handlers.files import create_file
+    from tests.utils.harness import FakeLambdaContext
+
+    monkeypatch.setattr(batches, "dispatch", lambda *args, **kwargs: None)
+    monkeypatch.setattr(batches, "PENNYWORTH_BATCH_REQUEST_TIMEOUT_SECONDS", 5)
+    meta = create_file(_requests(3), "in.jsonl", "batch")
+    batch = batches.create_batch(meta["id"], "/v1/chat/completions")
+    batch = batches.run_batch(batch["id"], FakeLambdaContext(600000))
+    assert batch["request_counts"]["completed"] == 3
+    assert all(4 < kwargs["timeout"] <= 5 for _, kwargs in lambda_harness.provider.calls)
+
+    # Nor do they outlive the worker.
+    monkeypatch.setattr(batches, "PENNYWORTH_BATCH_DEADLINE_MARGIN_MS", 0)
+    batch = batches.create_batch(meta["id"], "/v1/chat/completions")
+    batches.run_batch(batch["id"], FakeLambdaContext(2000))
+    assert all(kwargs["timeout"] <= 0.5 for _, kwargs in lambda_harness.provider.calls[3:])
+
+
+@pytest.mark.unit
+def test_dispatch_invokes_worker_lambda(fake_aws, monkeypatch):
+    import batches
+
+    monkeypatch.setattr(batches, "PENNYWORTH_BATCH_FUNCTION", "pennyworth-batch-worker")
+    batches.dispatch("batch_123")
+    name, invocation_type, payload = fake_aws.lambda_.invocations[0]
+    assert (name, invocation_type) == ("pennyworth-batch-worker", "Event")
+    assert json.loads(payload) == {"pennyworth_batch": {"batch_id": "batch_123"}}
+
+
+@pytest.mark.unit
+def test_cancel_stops_processing(lambda_harness, monkeypatch):
+    import batches
+    from handlers.files import create_file
+
+    monkeypatch.setattr(batches, "dispatch", lambda *args, **kwargs: None)
+    owner = "ip:127.0.0.1"  # The harness's unauthenticated caller.
+    input_file = create_file(_requests(3), "in.jsonl", "batch", owner)
+    batch = batches.create_batch(input_file["id"], "/v1/chat/completions", owner=owner)
+    resp = lambda_harness.post(f"/batches/{batch['id']}/cancel")
+    assert resp.json()["status"] == "cancelling"
+    batch = batches.run_batch(batch["id"])
+    assert batch["status"] == "cancelled"
+    assert lambda_harness.provider.calls == []
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_files_and_batches_are_private_to_their_owner(lambda_harness, inline_batches):
+    alice = lambda_harness.auth_headers("alice")
+    bob = lambda_harness.auth_headers("bob")
+    body, headers = _multipart(_requests(2))
+    meta = lambda_harness.post("/files", body=body, headers={**headers, **alice}).json()
+    assert "_owner" not in meta
+
+    for path in (f"/files/{meta['id']}", f"/files/{meta['id']}/content"):
+        assert lambda_harness.get(path, headers=bob).status_code == 404
+    assert lambda_harness.get("/files", headers=bob).json()["data"] == []
+    assert lambda_harness.delete(f"/files/{meta['id']}", headers=bob).status_code == 404
+    request = {"input_file_id": meta["id"], "endpoint": "/v1/chat/completions"}
+    assert lambda_harness.post("/batches", body=request, headers=bob).status_code == 404
+
+    batch = lambda_harness.post("/batches", body=request, headers=alice).json()
+    assert lambda_harness.get(f"/batches/{batch['id']}", headers=bob).status_code == 404
+    assert lambda_harness.post(f"/batches/{batch['id']}/cancel", headers=bob).status_code == 404
+    assert lambda_harness.get("/batches", headers=bob).json()["data"] == []
+
+    batch = lambda_harness.get(f"/batches/{batch['id']}", headers=alice).json()
+    assert batch["status"] == "completed"
+    assert lambda_harness.get(f"/files/{batch['output_file_id']}", headers=alice).status_code == 200
+    assert lambda_harness.get(f"/files/{batch['output_file_id']}", headers=bob).status_code == 404
+    assert [b["id"] for b in lambda_harness.get("/batches", headers=alice).json()["data"]] == [batch["id"]]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_lists_are_paginated_and_read_only_the_page(lambda_harness, monkeypatch):
+    import storage
+
+    uploaded = [_upload(lambda_harness, b"{}\n", purpose)["id"] for purpose in ("batch", "user_data", "batch")]
+    store = storage.get_object_store()
+    reads = []
+    get = store.get
+    monkeypatch.setattr(store, "get", lambda key: reads.append(key) or get(key))
+
+    first = lambda_harness.get("/files", query={"limit": "2"}).json()
+    assert len(first["data"]) == 2 and first["has_more"] is True
+    assert len(reads) == 2  # Only the page's metadata is read.
+    rest = lambda_harness.get("/files", query={"limit": "2", "after": first["last_id"]}).json()
+    assert len(rest["data"]) == 1 and rest["has_more"] is False
+    assert sorted(f["id"] for f in first["data"] + rest["data"]) == sorted(uploaded)
+
+    batch_files = lambda_harness.get("/files", query={"purpose": "batch"}).json()["data"]
+    assert sorted(f["id"] for f in batch_files) == sorted(uploaded[::2])
+    assert lambda_harness.get("/files", query={"limit": "x"}).status_code == 400
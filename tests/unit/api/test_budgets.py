@@ -0,0 +1,148 @@
+import pytest
+
+CHAT = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 100}
+
+# Projected cost of CHAT on claude-instant: 100 output tokens at $0.0024/1k.
+PROJECTED = 0.00024
+
+
+@pytest.fixture
+def set_budget(monkeypatch):
+    import budgets
+
+    def set_budget(name, usd):
+        monkeypatch.setattr(budgets, f"PENNYWORTH_{name}_BUDGET_USD", usd)
+
+    return set_budget
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_key_budget_rejects_requests_over_limit(lambda_harness, set_budget):
+    set_budget("KEY_DAILY", PROJECTED * 1.05)
+    headers = lambda_harness.auth_headers("alice")
+    first = lambda_harness.post("/chat/completions", body=CHAT, headers=headers)
+    assert first.status_code == 200
+    remaining = float(first.headers["x-pennyworth-budget-remaining-day"])
+    assert 0 < remaining < PROJECTED * 1.05
+    assert "x-pennyworth-budget-remaining-month" not in first.headers
+
+    statuses = [
+        lambda_harness.post("/chat/completions", body=CHAT, headers=headers).status_code
+        for _ in range(5)
+    ]
+    assert 429 in statuses
+    calls = len(lambda_harness.provider.calls)
+    resp = lambda_harness.post("/chat/completions", body=CHAT, headers=headers)
+    assert resp.status_code == 429
+    assert "daily spend limit" in resp.json()["error"]
+    assert 0 < int(resp.headers["retry-after"]) <= 86401
+    assert float(resp.headers["x-pennyworth-budget-remaining-day"]) < PROJECTED
+    assert len(lambda_harness.provider.calls) == calls
+
+    # Budgets are per key.
+    other = lambda_harness.post("/chat/completions", body=CHAT, headers=lambda_harness.auth_headers("bob"))
+    assert other.status_code == 200
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_unverified_tokens_share_the_source_ip_budget(lambda_harness, set_budget):
+    set_budget("KEY_DAILY", PROJECTED * 1.05)
+    first = lambda_harness.post("/chat/completions", body=CHAT, headers={"Authorization": "Bearer key-a"})
+    assert first.status_code == 200
+    # Neither a new opaque token nor a forged JWT gets a fresh budget.
+    for token in ("key-b", "e30.e30.forged"):
+        resp = lambda_harness.post("/chat/completions", body=CHAT, headers={"Authorization": f"Bearer {token}"})
+        assert resp.status_code == 429
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_owner_budget_is_shared_by_its_users(lambda_harness, set_budget):
+    set_budget("OWNER_MONTHLY", PROJECTED * 1.05)
+    alice = lambda_harness.auth_headers("alice", **{"custom:owner": "acme"})
+    bob = lambda_harness.auth_headers("bob", **{"custom:owner": "acme"})
+    assert lambda_harness.post("/chat/completions", body=CHAT, headers=alice).status_code == 200
+    resp = lambda_harness.post("/chat/completions", body=CHAT, headers=bob)
+    assert resp.status_code == 429
+    assert "monthly" in resp.json()["error"]
+    # Callers without an owner are not subject to owner budgets.
+    assert lambda_harness.post("/chat/completions", body=CHAT).status_code == 200
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_spend_is_reconciled_from_actual_usage(lambda_harness, set_budget):
+    import budgets
+    import state
+
+    set_budget("KEY_MONTHLY", 1.0)
+    resp = lambda_harness.post("/chat/completions", body=CHAT, headers={"Authorization": "Bearer k"})
+    usage = resp.json()["usage"]
+    actual = (usage["prompt_tokens"] * 0.0008 + usage["completion_tokens"] * 0.0024) / 1000
+    (key,) = [k for k in budgets._cache if k.startswith("spend#key#")]
+    assert state.get_store().get_counter(key, "spent") == round(actual * budgets.MICRO)
+    assert float(resp.headers["x-pennyworth-budget-remaining-month"]) == pytest.approx(1.0 - actual)
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_other_containers_spend_is_seen_after_cache_expiry(lambda_harness, set_budget, monkeypatch):
+    import budgets
+    import state
+
+    set_budget("KEY_DAILY", 1.0)
+    headers = {"Authorization": "Bearer k"}
+    assert lambda_harness.post("/chat/completions", body=CHAT, headers=headers).status_code == 200
+    (key,) = list(budgets._cache)
+    state.get_store().increment(key, "spent", budgets.MICRO)  # Spend recorded elsewhere.
+    assert lambda_harness.post("/chat/completions", body=CHAT, headers=headers).status_code == 200
+    monkeypatch.setattr(budgets, "PENNYWORTH_BUDGET_CACHE_SECONDS", 0)
+    assert lambda_harness.post("/chat/completions", body=CHAT, headers=headers).status_code == 429
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_no_budget_headers_without_limits(lambda_harness):
+    resp = lambda_harness.post("/chat/completions", body=CHAT)
+    assert resp.status_code == 200
+    assert not [h for h in resp.headers if h.startswith("x-pennyworth-budget")]
+
+
+def _spent(budgets, state):
+    (key,) = [k for k in budgets._cache if k.startswith("spend#key#")]
+    return state.get_store().get_counter(key, "spent")
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_streamed_requests_are_charged(lambda_harness, set_budget):
+    import budgets
+    import state
+
+    set_budget("KEY_MONTHLY", 1.0)
+    resp = lambda_harness.post("/chat/completions", body={**CHAT, "stream": True})
+    assert resp.status_code == 200
+    assert "usage" not in resp.text  # Requested from the provider, not passed on unasked.
+    _, kwargs = lambda_harness.provider.calls[-1]
+    assert kwargs["stream_options"] == {"include_usage": True}
+    assert _spent(budgets, state) > 0
+    assert float(resp.headers["x-pennyworth-budget-remaining-month"]) < 1.0
+
+    asked = {**CHAT, "stream": True, "stream_options": {"include_usage": True}}
+    assert '"usage"' in lambda_harness.post("/chat/completions", body=asked).text
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_streams_without_usage_are_charged_an_estimate(lambda_harness, set_budget, monkeypatch):
+    import budgets
+    import state
+
+    provider = lambda_harness.provider
+    stream = provider._stream
+    monkeypatch.setattr(provider, "_stream", lambda model, tokens, usage: stream(model, tokens, None))
+    set_budget("KEY_MONTHLY", 1.0)
+    assert lambda_harness.post("/chat/completions", body={**CHAT, "stream": True}).status_code == 200
+    assert _spent(budgets, state) > 0
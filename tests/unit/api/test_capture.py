@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+
+@pytest.mark.unit
+def test_request_shape_keeps_sizes_only():
+    import capture
+
+    shape = capture.request_shape(
+        {
+            "model": "claude-instant",
+            "messages": [
+                {"role": "system", "content": "be brief"},
+                {"role": "user", "content": [{"type": "text", "text": "secret words"}]},
+            ],
+            "max_tokens": 32,
+            "stream": True,
+        }
+    )
+    assert shape == {
+        "model": "claude-instant",
+        "stream": True,
+        "max_tokens": 32,
+        "message_chars": [8, 12],
+        "tools": 0,
+    }
+    assert capture.request_shape({"model": "titan-embed-text", "input": ["ab", "cde"]})["input_chars"] == [2, 3]
+    assert capture.request_shape({"input": [1, 2, 3]})["input_chars"] == [3]
+    assert capture.request_shape({"input": [[1, 2], [3]]})["input_chars"] == [2, 1]
+
+
+@pytest.mark.unit
+def test_capture_errors_do_not_fail_the_request(monkeypatch):
+    import capture
+
+    def broken(shape):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(capture, "write", broken)
+    capture.Capture({"body": "{not json"}).finish(200)
+    capture.Capture({"body": '{"input": 5}'}).finish(200, invocation=object())
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_sampled_requests_are_written_to_the_sink(lambda_harness, monkeypatch, tmp_path):
+    import capture
+
+    sink = tmp_path / "capture.jsonl"
+    monkeypatch.setattr(capture, "PENNYWORTH_CAPTURE_RATE", 1.0)
+    monkeypatch.setattr(capture, "PENNYWORTH_CAPTURE_SINK", str(sink))
+    resp = lambda_harness.post(
+        "/chat/completions",
+        body={"model": "claude-instant", "messages": [{"role": "user", "content": "do not record me"}]},
+    )
+    assert resp.status_code == 200
+    lambda_harness.get("/models")
+
+    text = sink.read_text()
+    assert "do not record me" not in text
+    chat, models = [json.loads(line) for line in text.splitlines()]
+    assert chat["route"] == "chat_completions" and chat["method"] == "POST"
+    assert chat["message_chars"] == [16] and chat["stream"] is False
+    assert chat["status"] == 200 and chat["completion_tokens"] == lambda_harness.provider.completion_tokens
+    assert "latency_ms" in chat and "upstream_ms" in chat
+    assert models["route"] == "list_models" and models["ts"] >= chat["ts"]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_capture_off_by_default(lambda_harness, monkeypatch):
+    import capture
+
+    monkeypatch.setattr(capture, "Capture", None)
+    assert lambda_harness.get("/models").status_code == 200
@@ -0,0 +1,91 @@
+import pytest
+
+SMALL = {"model_id": "anthropic.claude-v2", "context_window": 120, "max_output_tokens": 20}
+
+
+def _conversation(turns):
+    messages = [{"role": "system", "content": "You are terse."}]
+    for n in range(turns):
+        messages.append({"role": "user", "content": f"question {n} " + "lorem ipsum " * 5})
+        messages.append({"role": "assistant", "content": f"answer {n} " + "dolor sit " * 5})
+    messages.append({"role": "user", "content": "final question"})
+    return messages
+
+
+@pytest.mark.unit
+def test_small_conversations_skip_tokenization(monkeypatch):
+    import context_window
+
+    monkeypatch.setattr(context_window, "count_message_tokens", None)  # Must not be called.
+    messages = [{"role": "user", "content": "hi"}]
+    assert context_window.fit_messages("small", SMALL, messages) is messages
+
+
+@pytest.mark.unit
+def test_keep_system_drops_oldest_turns():
+    import context_window
+
+    messages = _conversation(6)
+    fitted = context_window.fit_messages("small", SMALL, messages, strategy="keep_system")
+    assert fitted[0]["role"] == "system"
+    assert fitted[-1]["content"] == "final question"
+    assert len(fitted) < len(messages)
+    assert fitted[1:] == messages[len(messages) - len(fitted) + 1 :]
+    total = sum(context_window.count_message_tokens(SMALL, m) for m in fitted)
+    assert total <= SMALL["context_window"] - SMALL["max_output_tokens"]
+
+
+@pytest.mark.unit
+def test_drop_oldest_may_drop_system_prompt():
+    import context_window
+
+    fitted = context_window.fit_messages("small", SMALL, _conversation(6), strategy="drop_oldest")
+    assert fitted[0]["role"] != "system"
+
+
+@pytest.mark.unit
+def test_disabled_and_unfittable_are_rejected():
+    import context_window
+    from errors import BadRequestException
+
+    with pytest.raises(BadRequestException, match="context window of 120"):
+        context_window.fit_messages("small", SMALL, _conversation(6), strategy="disabled")
+    huge = [{"role": "user", "content": "word " * 500}]
+    with pytest.raises(BadRequestException):
+        context_window.fit_messages("small", SMALL, huge, strategy="auto")
+    with pytest.raises(BadRequestException, match="Unknown truncation"):
+        context_window.fit_messages("small", SMALL, huge, strategy="bogus")
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_oversized_chat_is_rejected_before_dispatch(lambda_harness, monkeypatch):
+    import model_router
+
+    monkeypatch.setitem(model_router.MODEL_MAP, "claude-instant", {
+        **model_router.MODEL_MAP["claude-instant"], **SMALL,
+    })
+    body = {"model": "claude-instant", "messages": _conversation(6)}
+    resp = lambda_harness.post("/chat/completions", body=body)
+    assert resp.status_code == 400
+    assert "context window" in resp.json()["error"]
+    assert lambda_harness.provider.calls == []
+
+    resp = lambda_harness.post("/chat/completions", body={**body, "truncation": "auto"})
+    assert resp.status_code == 200
+    sent = lambda_harness.provider.calls[0][1]["messages"]
+    assert sent[0]["role"] == "system" and len(sent) < len(body["messages"])
+
+
+@pytest.mark.unit
+def test_counts_fall_back_to_estimate_without_tokenizer(monkeypatch):
+    import context_window
+
+    def unavailable(**kwargs):
+        raise RuntimeError("no tokenizer")
+
+    monkeypatch.setattr(context_window.litellm, "token_counter", unavailable)
+    model = dict(SMALL, model_id="fallback-test-model")
+    assert context_window.count_text_tokens(model, "x" * 40) == 10
+    message = {"role": "user", "content": "x" * 40}
+    assert context_window.count_message_tokens(model, message) >= 10
@@ -0,0 +1,91 @@
+import json
+
+import litellm
+import pytest
+
+from tests.utils.harness import FakeLambdaContext
+
+CHAT = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}]}
+
+
+@pytest.mark.unit
+def test_deadline_is_lambda_time_less_margin_capped_by_client(monkeypatch):
+    import deadline
+
+    monkeypatch.setattr(deadline, "PENNYWORTH_DEADLINE_MARGIN_MS", 1000)
+    assert deadline.start(FakeLambdaContext(10000)).remaining() == pytest.approx(9, abs=0.1)
+    d = deadline.start(FakeLambdaContext(10000), {"X-Request-Timeout": "2.5"})
+    assert d.remaining() == pytest.approx(2.5, abs=0.1)
+    assert deadline.start(None, {"x-request-timeout": "soon"}) is None
+    assert deadline.start(None) is None
+    assert deadline.timeout("upstream", default=7) == 7
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_provider_timeout_comes_from_remaining_time(lambda_harness):
+    resp = lambda_harness.post("/chat/completions", body=CHAT, headers={"x-request-timeout": "4"})
+    assert resp.status_code == 200
+    _, call = lambda_harness.provider.calls[-1]
+    assert 3 < call["timeout"] <= 4
+
+    lambda_harness.post("/embeddings", body={"model": "titan-embed-text", "input": "a"})
+    _, call = lambda_harness.provider.calls[-1]
+    assert 20 < call["timeout"] <= 28.5
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_exhausted_deadline_is_504_without_upstream_call(lambda_harness):
+    resp = lambda_harness.post("/chat/completions", body=CHAT, headers={"x-request-timeout": "0.1"})
+    assert resp.status_code == 504
+    assert "deadline" in resp.json()["error"]
+    assert lambda_harness.provider.calls == []
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_upstream_timeout_is_504(lambda_harness):
+    lambda_harness.provider.errors.append(litellm.Timeout("read timed out", "m", "bedrock"))
+    resp = lambda_harness.post("/chat/completions", body=CHAT)
+    assert resp.status_code == 504
+    assert len(lambda_harness.provider.calls) == 1
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_stream_is_truncated_cleanly_at_deadline(lambda_harness):
+    lambda_harness.provider.tokens_per_second = 10  # 8 tokens take 0.7s.
+    body = {**CHAT, "stream": True}
+    resp = lambda_harness.post("/chat/completions", body=body, headers={"x-request-timeout": "0.5"})
+    assert resp.status_code == 200
+    assert resp.headers["x-pennyworth-truncated"] == "deadline"
+    events = [e[len("data: "):] for e in resp.text.split("\n\n") if e.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    final = json.loads(events[-2])
+    assert final["choices"][0]["finish_reason"] == "length"
+    assert final["pennyworth_truncated"] == "deadline"
+    assert 1 < len(events) - 2 < 8
+
+
+@pytest.mark.unit
+def test_spillover_is_skipped_when_it_cannot_finish(monkeypatch):
+    import deadline
+    import regions
+
+    monkeypatch.setattr(regions, "_stats", {})
+    monkeypatch.setattr(regions, "PENNYWORTH_AWS_REGION", "us-east-1")
+    config = {"regions": ["us-east-1", "us-west-2"]}
+    regions._get("m", "us-east-1").observe(0, latency_ms=100)
+    regions._get("m", "us-west-2").observe(0, latency_ms=5000)
+    calls = []
+
+    def call(region):
+        calls.append(region)
+        raise litellm.RateLimitError("ThrottlingException", "bedrock", "m")
+
+    deadline.start(None, {"x-request-timeout": "2"})
+    with pytest.raises(litellm.RateLimitError):
+        regions.invoke("m", config, call)
+    assert calls == ["us-east-1"]
+    deadline.start(None)
@@ -0,0 +1,225 @@
+import threading
+
+import pytest
+
+
+def _fake_call(calls):
+    def call(inputs):
+        calls.append(list(inputs))
+        data = [{"object": "embedding", "index": i, "embedding": [float(len(x))]} for i, x in enumerate(inputs)]
+        tokens = sum(len(x) for x in inputs)
+        return {"object": "list", "model": "m", "data": data, "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    return call
+
+
+def _concurrently(batcher, call, requests):
+    results = [None] * len(requests)
+
+    def run(n, input_data):
+        results[n] = batcher.embed("m", input_data, call)
+
+    threads = [threading.Thread(target=run, args=(n, r)) for n, r in enumerate(requests)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+@pytest.mark.unit
+def test_concurrent_requests_share_one_provider_call():
+    from embedding_batcher import EmbeddingBatcher
+
+    batcher = EmbeddingBatcher(max_wait_ms=200, max_items=6)
+    calls = []
+    requests = ["a", ["bb", "ccc"], "dddd", [[1, 2, 3]], ["eeeee"]]
+    results = _concurrently(batcher, _fake_call(calls), requests)
+
+    assert len(calls) == 1 and len(calls[0]) == 6
+    for request, result in zip(requests, results):
+        inputs = [request] if isinstance(request, str) else request
+        assert [d["index"] for d in result["data"]] == list(range(len(inputs)))
+        assert [d["embedding"] for d in result["data"]] == [[float(len(x))] for x in inputs]
+    # Usage is split by input size; the shares add up to the batch's usage.
+    assert results[2]["usage"]["prompt_tokens"] == 4
+    assert sum(r["usage"]["prompt_tokens"] for r in results) == sum(len(x) for x in calls[0])
+    stats = batcher.stats()
+    assert stats["batches"] == 1 and stats["requests"] == 5 and stats["full"] == 1
+    assert stats["mean_fill"] == 1.0
+
+
+@pytest.mark.unit
+def test_batches_are_capped_and_large_requests_bypass():
+    from embedding_batcher import EmbeddingBatcher
+
+    batcher = EmbeddingBatcher(max_wait_ms=50, max_items=3)
+    calls = []
+    _concurrently(batcher, _fake_call(calls), [["a", "b"], ["c", "d"]])
+    assert sorted(len(c) for c in calls) == [2, 2]
+
+    calls.clear()
+    result = batcher.embed("m", ["a", "b", "c", "d"], _fake_call(calls))
+    assert calls == [["a", "b", "c", "d"]] and len(result["data"]) == 4
+
+
+@pytest.mark.unit
+def test_provider_errors_reach_every_request_in_the_batch():
+    from embedding_batcher import EmbeddingBatcher
+
+    batcher = EmbeddingBatcher(max_wait_ms=100, max_items=2)
+
+    def failing(inputs):
+        raise RuntimeError("provider down")
+
+    errors = []
+
+    def run(text):
+        try:
+            batcher.embed("m", text, failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in ("a", "b")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == ["provider down", "provider down"]
+
+
+def _concurrent_embeddings(harness, model, texts):
+    import asyncio
+
+    import httpx
+
+    import server
+
+    async def go():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(client.post(f"{harness.prefix}/embeddings", json={"model": model, "input": t}) for t in texts)
+            )
+
+    return asyncio.run(go())
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_server_batches_concurrent_embedding_requests(lambda_harness, monkeypatch):
+    import embedding_batcher
+    import server
+
+    model = "cohere-embed-english"
+    texts = [f"text number {n}" for n in range(8)]
+    unbatched = {
+        t: lambda_harness.post("/embeddings", body={"model": model, "input": t}).json() for t in texts
+    }
+    lambda_harness.provider.calls.clear()
+    server._executor_for_process()
+    batcher = embedding_batcher.EmbeddingBatcher(max_wait_ms=200, max_items=64)
+    monkeypatch.setattr(embedding_batcher, "_batcher", batcher)
+
+    responses = _concurrent_embeddings(lambda_harness, model, texts)
+    assert all(r.status_code == 200 for r in responses)
+    embedding_calls = [c for c in lambda_harness.provider.calls if c[0] == "embedding"]
+    assert len(embedding_calls) < len(texts)
+    assert batcher.stats()["requests"] == len(texts)
+    for response, text in zip(responses, texts):
+        data = response.json()["data"]
+        assert len(data) == 1 and data[0]["index"] == 0
+        assert data[0]["embedding"] == unbatched[text]["data"][0]["embedding"]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_models_without_native_batching_bypass_the_batcher(lambda_harness, monkeypatch):
+    import embedding_batcher
+    import server
+
+    texts = [f"text number {n}" for n in range(4)]
+    server._executor_for_process()
+    batcher = embedding_batcher.EmbeddingBatcher(max_wait_ms=200, max_items=64)
+    monkeypatch.setattr(embedding_batcher, "_batcher", batcher)
+
+    responses = _concurrent_embeddings(lambda_harness, "titan-embed-text", texts)
+    assert all(r.status_code == 200 for r in responses)
+    assert batcher.stats()["requests"] == 0
+    calls = [kwargs["input"] for kind, kwargs in lambda_harness.provider.calls if kind == "embedding"]
+    assert sorted(calls) == sorted(texts)
+
+
+class _ClientError(Exception):
+    status_code = 400
+
+
+@pytest.mark.unit
+def test_client_errors_are_retried_per_request():
+    from embedding_batcher import EmbeddingBatcher
+
+    batcher = EmbeddingBatcher(max_wait_ms=100, max_items=2)
+    calls = []
+    ok = _fake_call(calls)
+
+    def call(inputs):
+        if "bad" in inputs:
+            calls.append(list(inputs))
+            raise _ClientError("input too long")
+        return ok(inputs)
+
+    outcomes = {}
+
+    def run(text):
+        try:
+            outcomes[text] = batcher.embed("m", text, call)["data"][0]["embedding"]
+        except _ClientError as e:
+            outcomes[text] = str(e)
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in ("good", "bad")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert outcomes == {"good": [4.0], "bad": "input too long"}
+    assert batcher.stats()["retried"] == 2
+
+
+@pytest.mark.unit
+def test_batch_runs_under_the_longest_deadline_and_waits_are_bounded():
+    import contextvars
+    import time
+
+    import deadline
+    from embedding_batcher import EmbeddingBatcher
+    from errors import GatewayTimeoutException
+
+    batcher = EmbeddingBatcher(max_wait_ms=100, max_items=2)
+    seen = []
+    release = threading.Event()
+
+    def call(inputs):
+        seen.append(deadline.current().budget)
+        release.wait(5)
+        return _fake_call([])(inputs)
+
+    outcomes = {}
+
+    def run(text, seconds):
+        deadline._current.set(deadline.Deadline(seconds))
+        try:
+            outcomes[text] = batcher.embed("m", text, call)["data"][0]["embedding"]
+        except GatewayTimeoutException:
+            outcomes[text] = "timeout"
+
+    short = threading.Thread(target=contextvars.copy_context().run, args=(run, "a", 0.3))
+    long = threading.Thread(target=contextvars.copy_context().run, args=(run, "bb", 30))
+    started = time.monotonic()
+    short.start()
+    long.start()
+    short.join()
+    assert outcomes == {"a": "timeout"} and time.monotonic() - started < 2
+    release.set()
+    long.join()
+    assert outcomes["bb"] == [2.0]
+    assert seen == [30]
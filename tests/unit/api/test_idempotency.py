@@ -0,0 +1,96 @@
+import pytest
+
+CHAT = {"model": "claude-instant", "messages": [{"role": "user", "content": "hello there"}]}
+
+
+def _completions(harness):
+    return [call for kind, call in harness.provider.calls if kind == "completion"]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_retry_with_same_key_replays_response(lambda_harness):
+    headers = {"Idempotency-Key": "req-1"}
+    first = lambda_harness.post("/chat/completions", body=CHAT, headers=headers)
+    second = lambda_harness.post("/chat/completions", body=CHAT, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert len(_completions(lambda_harness)) == 1
+
+    lambda_harness.post("/chat/completions", body=CHAT, headers={"Idempotency-Key": "req-2"})
+    lambda_harness.post("/chat/completions", body=CHAT)
+    assert len(_completions(lambda_harness)) == 3
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_key_reused_with_different_body_is_422(lambda_harness):
+    headers = {"Idempotency-Key": "req-1"}
+    assert lambda_harness.post("/chat/completions", body=CHAT, headers=headers).status_code == 200
+    other = {**CHAT, "messages": [{"role": "user", "content": "something else"}]}
+    resp = lambda_harness.post("/chat/completions", body=other, headers=headers)
+    assert resp.status_code == 422
+    assert len(_completions(lambda_harness)) == 1
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_keys_are_scoped_per_caller(lambda_harness):
+    for token in ("key-a", "key-b"):
+        headers = {"Idempotency-Key": "req-1", "Authorization": f"Bearer {token}"}
+        assert lambda_harness.post("/chat/completions", body=CHAT, headers=headers).status_code == 200
+    assert len(_completions(lambda_harness)) == 2
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_in_progress_key_is_409(lambda_harness):
+    import idempotency
+    import state
+
+    headers = {"Idempotency-Key": "req-1"}
+    assert lambda_harness.post("/chat/completions", body=CHAT, headers=headers).status_code == 200
+    store = state.get_store()
+    (key,) = [k for k in store._items if k.startswith("idem#")]
+    store.put(key, {**store.get(key), "status": "in_progress", "expires": 2**40})
+    resp = lambda_harness.post("/chat/completions", body=CHAT, headers=headers)
+    assert resp.status_code == 409
+    assert int(resp.headers["retry-after"]) >= 1
+    assert idempotency.REPLAYED_HEADER.lower() not in resp.headers
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_server_errors_are_not_stored(lambda_harness):
+    lambda_harness.provider.errors.append(RuntimeError("boom"))
+    headers = {"Idempotency-Key": "req-1"}
+    assert lambda_harness.post("/chat/completions", body=CHAT, headers=headers).status_code == 500
+    resp = lambda_harness.post("/chat/completions", body=CHAT, headers=headers)
+    assert resp.status_code == 200
+    assert "idempotent-replayed" not in resp.headers
+
+
+@pytest.mark.unit
+@pytest.mark.api
+@pytest.mark.users
+def test_retried_user_creation_is_replayed(lambda_harness):
+    headers = {**lambda_harness.auth_headers("admin", groups=("admin",)), "Idempotency-Key": "u-1"}
+    user = {"username": "bob", "email": "bob@example.com", "password": "pw-123456789!"}
+    first = lambda_harness.post("/users", body=user, headers=headers)
+    second = lambda_harness.post("/users", body=user, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json()
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_client_errors_are_stored(lambda_harness):
+    headers = {"Idempotency-Key": "req-1"}
+    unservable = {**CHAT, "model": "auto", "max_tokens": 10**9}  # Raises BadRequestException.
+    first = lambda_harness.post("/chat/completions", body=unservable, headers=headers)
+    second = lambda_harness.post("/chat/completions", body=unservable, headers=headers)
+    assert first.status_code == second.status_code == 400
+    assert second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
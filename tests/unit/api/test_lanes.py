@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+CONFIG = {"provider": "bedrock", "regions": ["us-east-1"]}
+
+CHAT_BODY = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}]}
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    import limiter
+    import state
+
+    monkeypatch.setattr(state, "_store", state.MemoryStateStore())
+    monkeypatch.setattr(limiter, "_limiters", {})
+    monkeypatch.setattr(limiter, "_waiting", {"interactive": 0, "batch": 0})
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_MAX", 4.0)
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_MIN", 1.0)
+    return limiter
+
+
+@pytest.mark.unit
+def test_rules_only_demote():
+    import lanes
+
+    assert lanes.lowest() == "interactive"
+    assert lanes.lowest("interactive", None, "batch") == "batch"
+    assert lanes.lowest("bogus") == "interactive"
+    assert lanes.permission_lane("chat, priority:batch") == "batch"
+    assert lanes.permission_lane("chat,embeddings") is None
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_classify_by_header_route_and_permission(lambda_harness, monkeypatch):
+    import lanes
+
+    def event(headers=None, path="/v1/chat/completions"):
+        return {"headers": headers or {}, "path": path}
+
+    assert lanes.classify(event({"x-pennyworth-priority": "Batch"})) == "batch"
+    assert lanes.classify(event({"Authorization": "Bearer some-api-key"})) == "interactive"
+    monkeypatch.setattr(lanes, "_batch_routes", ["/v1/embeddings"])
+    assert lanes.classify(event(path="/v1/embeddings")) == "batch"
+
+    batch_user = lambda_harness.auth_headers(**{"custom:permissions": "chat,priority:batch"})
+    assert lanes.classify(event(batch_user)) == "batch"
+    promoted = {**batch_user, "X-Pennyworth-Priority": "interactive"}
+    assert lanes.classify(event(promoted)) == "batch"
+    assert lanes.classify(event(lambda_harness.auth_headers())) == "interactive"
+
+
+@pytest.mark.unit
+def test_batch_lane_holds_only_its_share(limits, monkeypatch):
+    import lanes
+
+    monkeypatch.setattr(lanes, "PENNYWORTH_BATCH_LANE_SHARE", 0.5)
+    lanes.enter("batch")
+    batch = [limits.acquire("m", CONFIG, "us-east-1") for _ in range(8)]
+    assert sum(lease is not None for lease in batch) == 2
+
+    lanes.enter("interactive")
+    interactive = [limits.acquire("m", CONFIG, "us-east-1") for _ in range(16)]
+    assert sum(lease is not None for lease in interactive) == 2
+
+
+@pytest.mark.unit
+def test_batch_gives_way_to_waiting_interactive_calls(limits, monkeypatch):
+    import lanes
+    from errors import TooManyRequestsException
+
+    monkeypatch.setattr(lanes, "PENNYWORTH_BATCH_LANE_WAIT_MS", 60)
+    limits._waiting["interactive"] = 1
+    lanes.enter("batch")
+    assert limits.acquire("m", CONFIG, "us-east-1") is None
+    with pytest.raises(TooManyRequestsException):
+        limits.acquire("m", CONFIG, "us-east-1", wait=True)
+    assert limits._waiting["batch"] == 0
+
+    limits._waiting["interactive"] = 0
+    assert limits.acquire("m", CONFIG, "us-east-1") is not None
+    lanes.enter("interactive")
+
+
+@pytest.mark.unit
+def test_batch_jobs_run_in_the_batch_lane(monkeypatch):
+    import batches
+    import lanes
+
+    url = next(iter(batches.ENDPOINT_HANDLERS))
+    monkeypatch.setitem(batches.ENDPOINT_HANDLERS, url, lambda body: ({"lane": lanes.current()}, 200))
+    ok, line = batches._execute({"url": url, "custom_id": "c1", "body": {}})
+    assert ok and line["response"]["body"] == {"lane": "batch"}
+    lanes.enter("interactive")
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_lane_is_a_metric_dimension(lambda_harness, monkeypatch, capsys):
+    import limiter
+
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_MAX", 4.0)
+    capsys.readouterr()
+    headers = {"X-Pennyworth-Priority": "batch"}
+    assert lambda_harness.post("/chat/completions", body=CHAT_BODY, headers=headers).status_code == 200
+    assert lambda_harness.get("/models").status_code == 200
+    docs = [json.loads(l) for l in capsys.readouterr().out.splitlines() if l.startswith('{"_aws"')]
+    assert [doc["lane"] for doc in docs] == ["batch", "none"]
+    assert ["service", "lane"] in docs[0]["_aws"]["CloudWatchMetrics"][0]["Dimensions"]
@@ -0,0 +1,175 @@
+import time
+
+import litellm
+import pytest
+
+CONFIG = {"provider": "bedrock", "regions": ["us-east-1", "us-west-2"]}
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    import limiter
+    import regions
+    import state
+
+    store = state.MemoryStateStore()
+    monkeypatch.setattr(state, "_store", store)
+    monkeypatch.setattr(limiter, "_limiters", {})
+    monkeypatch.setattr(regions, "_stats", {})
+    monkeypatch.setattr(regions, "PENNYWORTH_AWS_REGION", "us-east-1")
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_MAX", 4.0)
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_MIN", 1.0)
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_BACKOFF", 0.5)
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_WAIT_MS", 50)
+    return limiter, store
+
+
+def _throttle():
+    return litellm.RateLimitError("ThrottlingException: slow down", "bedrock", "m")
+
+
+@pytest.mark.unit
+def test_limit_backs_off_once_per_cooldown_and_grows_back(limits):
+    limiter, store = limits
+    container = limiter.AdaptiveLimiter("bedrock#us-east-1#m", store)
+    assert container.limit() == 4
+
+    container.throttled()
+    container.throttled()
+    assert container.limit() == 2
+
+    store.delete(f"{container.key}#cooldown")
+    container.throttled()
+    container.throttled()
+    assert container.limit() == 1
+
+    container.succeeded()
+    assert container.limit() == 2
+    container.succeeded()
+    assert container.limit() == 2
+    container.succeeded()
+    assert container.limit() == 3
+
+
+@pytest.mark.unit
+def test_containers_share_the_limit(limits, monkeypatch):
+    limiter, store = limits
+    monkeypatch.setattr(limiter, "LIMIT_CACHE_SECONDS", 0)
+    first = limiter.AdaptiveLimiter("bedrock#us-east-1#m", store)
+    second = limiter.AdaptiveLimiter("bedrock#us-east-1#m", store)
+
+    first.throttled()
+    second.throttled()
+    assert second.limit() == 2
+    leases = [lease for lease in (first.try_acquire(60) for _ in range(8)) if lease]
+    leases += [lease for lease in (second.try_acquire(60) for _ in range(8)) if lease]
+    assert len(leases) == 2
+    leases[0].release()
+    assert second.try_acquire(60) is not None
+
+
+@pytest.mark.unit
+def test_lost_leases_expire(limits, monkeypatch):
+    limiter, store = limits
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_MAX", 1.0)
+    container = limiter.AdaptiveLimiter("bedrock#us-east-1#m", store)
+    assert container.try_acquire(0.05) is not None
+    assert container.try_acquire(0.05) is None
+    time.sleep(0.06)
+    assert container.try_acquire(0.05) is not None
+
+
+@pytest.mark.unit
+def test_full_region_spills_over_then_sheds(limits, monkeypatch):
+    import regions
+    from errors import TooManyRequestsException
+
+    limiter, _ = limits
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_MAX", 1.0)
+    east = limiter.get("bedrock", "us-east-1", "m").try_acquire(60)
+
+    assert regions.invoke("m", CONFIG, lambda region: region) == "us-west-2"
+
+    west = limiter.get("bedrock", "us-west-2", "m").try_acquire(60)
+    started = time.monotonic()
+    with pytest.raises(TooManyRequestsException) as shed:
+        regions.invoke("m", CONFIG, lambda region: region)
+    assert time.monotonic() - started >= 0.05
+    assert shed.value.headers == {"Retry-After": "1"}
+
+    east.release()
+    west.release()
+    assert regions.invoke("m", CONFIG, lambda region: region) in CONFIG["regions"]
+
+
+@pytest.mark.unit
+def test_throttles_shrink_the_called_region(limits):
+    import regions
+
+    limiter, _ = limits
+
+    def call(region):
+        if region == "us-east-1":
+            raise _throttle()
+        return region
+
+    assert regions.invoke("m", CONFIG, call) == "us-west-2"
+    assert limiter.get("bedrock", "us-east-1", "m").limit() == 2
+    assert limiter.get("bedrock", "us-west-2", "m").limit() == 4
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_shed_request_gets_429(lambda_harness, monkeypatch):
+    import limiter
+    import regions
+    from model_router import get_model_config
+
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_MAX", 1.0)
+    monkeypatch.setattr(limiter, "PENNYWORTH_CONCURRENCY_LIMIT_WAIT_MS", 0)
+    config = get_model_config("claude-instant")
+    held = [
+        limiter.get(config.get("provider", "bedrock"), region, "claude-instant").try_acquire(60)
+        for region in regions.model_regions(config)
+    ]
+    body = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}]}
+    resp = lambda_harness.post("/chat/completions", body=body)
+    assert resp.status_code == 429
+    assert resp.headers["retry-after"] == "1"
+
+    for lease in held:
+        lease.release()
+    assert lambda_harness.post("/chat/completions", body=body).status_code == 200
+
+
+@pytest.mark.unit
+def test_streams_hold_their_slot_until_drained(limits):
+    import regions
+
+    limiter, store = limits
+
+    def slots():
+        return [k for k in store._items if "#slot#" in k]
+
+    def chunks(fail=False):
+        yield "a"
+        if fail:
+            raise _throttle()
+        yield "b"
+
+    stream = regions.invoke("m", CONFIG, lambda region: chunks(), stream=True)
+    assert len(slots()) == 1 and regions._get("m", "us-east-1").inflight == 1
+    assert list(stream) == ["a", "b"]
+    assert slots() == [] and regions._get("m", "us-east-1").inflight == 0
+
+    closed = regions.invoke("m", CONFIG, lambda region: chunks(), stream=True)
+    next(closed)
+    closed.close()
+    assert slots() == []
+
+    failing = regions.invoke("m", CONFIG, lambda region: chunks(fail=True), stream=True)
+    with pytest.raises(litellm.RateLimitError):
+        list(failing)
+    assert slots() == []
+    assert regions.snapshot("m", CONFIG)["us-east-1"]["throttles"] == 1
+    assert limiter.get("bedrock", "us-east-1", "m").limit() == 2  # The mid-stream throttle backed off.
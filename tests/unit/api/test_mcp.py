@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+MCP = "/mcp/pennyworth"
+ACCEPT = {"Accept": "application/json, text/event-stream"}
+
+
+@pytest.fixture
+def mcp_session(lambda_harness):
+    import handlers.mcp as mcp
+
+    mcp._session_cache.clear()
+    init = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "initialize",
+        "params": {"protocolVersion": "2025-03-26", "clientInfo": {"name": "pytest"}},
+    }
+    resp = lambda_harness.post(MCP, body=init, headers=ACCEPT)
+    assert resp.status_code == 200
+    assert resp.json()["result"]["protocolVersion"] == "2025-03-26"
+    session_id = resp.headers["mcp-session-id"]
+    return {**ACCEPT, "Mcp-Session-Id": session_id}
+
+
+def _rpc(msg_id, method, params=None):
+    return {"jsonrpc": "2.0", "id": msg_id, "method": method, "params": params or {}}
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_batch_with_notification(lambda_harness, mcp_session):
+    batch = [
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+        _rpc(2, "tools/list"),
+        _rpc(3, "ping"),
+        _rpc(4, "no/such/method"),
+    ]
+    resp = lambda_harness.post(MCP, body=batch, headers=mcp_session)
+    assert resp.status_code == 200
+    by_id = {r["id"]: r for r in resp.json()}
+    assert set(by_id) == {2, 3, 4}
+    assert {t["name"] for t in by_id[2]["result"]["tools"]} == {"list_models", "chat"}
+    assert by_id[3]["result"] == {}
+    assert by_id[4]["error"]["code"] == -32601
+
+    resp = lambda_harness.post(
+        MCP, body={"jsonrpc": "2.0", "method": "notifications/initialized"}, headers=mcp_session
+    )
+    assert resp.status_code == 202
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_session_resumes_in_another_container(lambda_harness, mcp_session):
+    import handlers.mcp as mcp
+
+    mcp._session_cache.clear()  # A different warm container has no local copy.
+    resp = lambda_harness.post(MCP, body=_rpc(2, "resources/list"), headers=mcp_session)
+    assert resp.status_code == 200
+    assert "pennyworth://models" in {r["uri"] for r in resp.json()["result"]["resources"]}
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_tools_list_served_from_container_cache(lambda_harness, mcp_session, monkeypatch):
+    import state
+
+    def fail(*args, **kwargs):
+        raise AssertionError("state store should not be read")
+
+    monkeypatch.setattr(state.get_store(), "get", fail)
+    resp = lambda_harness.post(MCP, body=_rpc(2, "tools/list"), headers=mcp_session)
+    assert resp.status_code == 200
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_chat_tool_calls_provider(lambda_harness, mcp_session):
+    params = {"name": "chat", "arguments": {"model": "claude-instant", "prompt": "hi"}}
+    resp = lambda_harness.post(MCP, body=_rpc(5, "tools/call", params), headers=mcp_session)
+    result = resp.json()["result"]
+    assert result["isError"] is False
+    assert result["content"][0]["text"]
+    assert lambda_harness.provider.calls[0][0] == "completion"
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_sse_get_drains_server_messages(lambda_harness, mcp_session):
+    import handlers.mcp as mcp
+
+    session_id = mcp_session["Mcp-Session-Id"]
+    note = {"jsonrpc": "2.0", "method": "notifications/tools/list_changed"}
+    assert mcp.enqueue_server_message(session_id, note)
+
+    headers = {"Accept": "text/event-stream", "Mcp-Session-Id": session_id}
+    resp = lambda_harness.get(MCP, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "text/event-stream"
+    data = [l[len("data: "):] for l in resp.text.splitlines() if l.startswith("data: ")]
+    assert [json.loads(d) for d in data] == [note]
+
+    resp = lambda_harness.get(MCP, headers=headers)
+    assert "data:" not in resp.text
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_sse_get_ignores_malformed_last_event_id(lambda_harness, mcp_session):
+    import handlers.mcp as mcp
+
+    session_id = mcp_session["Mcp-Session-Id"]
+    note = {"jsonrpc": "2.0", "method": "notifications/tools/list_changed"}
+    assert mcp.enqueue_server_message(session_id, note)
+
+    headers = {"Accept": "text/event-stream", "Mcp-Session-Id": session_id, "Last-Event-ID": "abc"}
+    resp = lambda_harness.get(MCP, headers=headers)
+    assert resp.status_code == 200
+    assert "notifications/tools/list_changed" in resp.text
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_session_errors_and_delete(lambda_harness, mcp_session):
+    assert lambda_harness.post(MCP, body=_rpc(2, "ping"), headers=ACCEPT).status_code == 400
+    resp = lambda_harness.post(MCP, body="{not json", headers=ACCEPT)
+    assert resp.status_code == 400
+    assert resp.json()["error"]["code"] == -32700
+
+    assert lambda_harness.delete(MCP, headers=mcp_session).status_code == 204
+    assert lambda_harness.post(MCP, body=_rpc(3, "ping"), headers=mcp_session).status_code == 404
+    assert lambda_harness.get("/mcp/other", headers=ACCEPT).status_code == 404
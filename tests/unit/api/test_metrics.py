@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+
+def _emf_lines(capsys):
+    lines = []
+    for line in capsys.readouterr().out.splitlines():
+        try:
+            doc = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(doc, dict) and "_aws" in doc:
+            lines.append(doc)
+    return lines
+
+
+def _value(doc, name):
+    value = doc[name]
+    return value[0] if isinstance(value, list) else value
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_chat_emits_one_emf_line_with_usage_and_cost(lambda_harness, capsys):
+    capsys.readouterr()
+    body = {"model": "claude-instant", "messages": [{"role": "user", "content": "one two three"}]}
+    assert lambda_harness.post("/chat/completions", body=body).status_code == 200
+    docs = _emf_lines(capsys)
+    assert len(docs) == 1
+    doc = docs[0]
+    assert doc["route"] == "chat_completions"
+    assert doc["model"] == "claude-instant"
+    assert doc["status"] == "200"
+    assert _value(doc, "Requests") == 1
+    assert _value(doc, "PromptTokens") == 3
+    assert _value(doc, "CompletionTokens") == lambda_harness.provider.completion_tokens
+    expected = (3 * 0.0008 + lambda_harness.provider.completion_tokens * 0.0024) / 1000
+    assert _value(doc, "EstimatedCost") == pytest.approx(expected)
+    assert _value(doc, "CacheHit") == 0
+    assert "UpstreamLatency" in doc
+    directive = doc["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == "Pennyworth"
+    assert ["service", "model"] in directive["Dimensions"]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_streaming_emits_ttft_and_errors(lambda_harness, capsys):
+    capsys.readouterr()
+    body = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}], "stream": True}
+    lambda_harness.post("/chat/completions", body=body)
+    lambda_harness.provider.errors.append(RuntimeError("down"))
+    lambda_harness.post("/chat/completions", body={**body, "stream": False})
+    ok, failed = _emf_lines(capsys)
+    assert "TimeToFirstToken" in ok
+    assert _value(ok, "CompletionTokens") == lambda_harness.provider.completion_tokens
+    assert failed["status"] == "500"
+    assert _value(failed, "Errors") == 1
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_not_found_route_label_and_disable(lambda_harness, capsys, monkeypatch):
+    import metrics
+
+    capsys.readouterr()
+    lambda_harness.get("/nope")
+    (doc,) = _emf_lines(capsys)
+    assert doc["route"] == "not_found"
+    assert doc["model"] == "none"
+
+    monkeypatch.setattr(metrics, "PENNYWORTH_METRICS_ENABLED", False)
+    lambda_harness.get("/version")
+    assert _emf_lines(capsys) == []
@@ -0,0 +1,82 @@
+import pytest
+
+
+def _route(**kwargs):
+    import model_router
+
+    return model_router.select_auto_model(model_router.routing_features(**kwargs))
+
+
+def _chat(text):
+    return [{"role": "user", "content": text}]
+
+
+@pytest.mark.unit
+def test_trivial_request_routes_to_cheapest_model():
+    model, decision = _route(messages=_chat("rename this variable"))
+    assert model == "titan-text"
+    assert decision["rules"] == []
+    assert decision["projected_savings"] > 0
+    assert decision["baseline_model"] == "claude-3-7-sonnet"
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "kwargs,model,rule",
+    [
+        ({"messages": _chat("x" * 10000)}, "claude-instant", "medium_prompt"),
+        ({"messages": _chat("x" * 80000)}, "claude-3-5-haiku", "long_prompt"),
+        ({"messages": _chat("hi"), "max_tokens": 3000}, "claude-3-5-haiku", "long_output"),
+        ({"messages": _chat("hi"), "tools": [{"type": "function"}]}, "claude-3-5-haiku", "tools"),
+        ({"prompt": "y" * 10000}, "claude-instant", "medium_prompt"),
+    ],
+)
+def test_rules_raise_the_minimum_tier(kwargs, model, rule):
+    chosen, decision = _route(**kwargs)
+    assert chosen == model
+    assert rule in decision["rules"]
+
+
+@pytest.mark.unit
+def test_hard_requirements_exclude_models():
+    # claude-instant cannot produce 5000 tokens, and only haiku/sonnet accept tools.
+    assert _route(messages=_chat("hi"), max_tokens=5000)[0] == "claude-3-5-haiku"
+    assert _route(messages=_chat("x" * 10000), tools=[{}], budget_remaining=0)[0] == "claude-3-5-haiku"
+    from errors import BadRequestException
+
+    with pytest.raises(BadRequestException):
+        _route(messages=_chat("hi"), max_tokens=100000)
+
+
+@pytest.mark.unit
+def test_low_budget_waives_tier_rules():
+    assert _route(messages=_chat("hi"), max_tokens=3000, budget_remaining=100)[0] == "claude-3-5-haiku"
+    model, decision = _route(messages=_chat("hi"), max_tokens=3000, budget_remaining=0.5)
+    assert model == "titan-text"
+    assert "low_budget" in decision["rules"]
+
+
+@pytest.mark.unit
+def test_routing_is_deterministic():
+    requests = [_chat("a" * n) for n in (10, 9000, 70000)]
+    first = [_route(messages=m) for m in requests]
+    assert [_route(messages=m) for m in requests] == first
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_auto_chat_dispatches_to_routed_model(lambda_harness):
+    body = {"model": "auto", "messages": _chat("rename this variable")}
+    resp = lambda_harness.post("/chat/completions", body=body)
+    assert resp.status_code == 200
+    kind, call = lambda_harness.provider.calls[-1]
+    assert call["model"] == "amazon.titan-text-lite-v1"
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_unservable_auto_request_is_a_client_error(lambda_harness):
+    body = {"model": "auto", "messages": _chat("hi"), "max_tokens": 100000}
+    resp = lambda_harness.post("/chat/completions", body=body)
+    assert resp.status_code == 400
+    assert "choose a model explicitly" in resp.text
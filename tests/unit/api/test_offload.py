@@ -0,0 +1,63 @@
+import base64
+import io
+import json
+
+import pytest
+
+from tests.utils.fake_aws import FakeS3
+
+
+@pytest.fixture
+def s3_store(lambda_harness, monkeypatch):
+    import storage
+
+    store = storage.S3ObjectStore("pennyworth-files", client=FakeS3())
+    monkeypatch.setattr(storage, "_store", store)
+    return store
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_large_response_redirects_to_presigned_url(lambda_harness, s3_store, monkeypatch):
+    import offload
+
+    expected = lambda_harness.get("/models").text
+    monkeypatch.setattr(offload, "PENNYWORTH_OFFLOAD_THRESHOLD_BYTES", 100)
+    resp = lambda_harness.get("/models")
+    assert resp.status_code == 303
+    location = resp.headers["location"]
+    assert location == resp.json()["url"]
+    assert "X-Amz-Method=get_object" in location
+    assert "server-timing" in resp.headers
+
+    key = location.split(".s3.fake/")[1].split("?")[0]
+    assert s3_store.get(key).decode() == expected
+
+
+@pytest.mark.unit
+def test_body_reader_decodes_base64_in_chunks(monkeypatch):
+    import offload
+
+    monkeypatch.setattr(offload, "CHUNK_CHARS", 8)
+    data = bytes(range(256)) * 10
+    reader = io.BufferedReader(offload._BodyReader(base64.b64encode(data).decode(), True), 16)
+    assert reader.read() == data
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_request_body_from_payload_reference(lambda_harness, s3_store):
+    upload = lambda_harness.post("/payloads").json()
+    assert upload["method"] == "PUT" and "X-Amz-Method=put_object" in upload["url"]
+    _, key = upload["ref"].split("pennyworth-files/", 1)
+    body = {"model": "titan-embed-text", "input": ["a large input"] * 3}
+    s3_store.put(key, json.dumps(body))  # What the client's PUT to the presigned URL does.
+
+    resp = lambda_harness.post("/embeddings", headers={"X-Pennyworth-Body-Ref": upload["ref"]})
+    assert resp.status_code == 200
+    assert len(resp.json()["data"]) == 3
+    assert lambda_harness.provider.calls[-1][1]["input"] == body["input"]
+
+    for ref in ("s3://other-bucket/payloads/x.json", "s3://pennyworth-files/files/x", "nope"):
+        resp = lambda_harness.post("/embeddings", headers={"X-Pennyworth-Body-Ref": ref})
+        assert resp.status_code == 400
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+
+@pytest.mark.unit
+def test_requested_modes():
+    import profiling
+
+    assert profiling.requested_modes({"headers": {}}) is None
+    assert profiling.requested_modes({"headers": {"x-pennyworth-profile": "alloc, Sample"}}) == [
+        "sample",
+        "alloc",
+    ]
+    assert profiling.requested_modes({"headers": {"X-Pennyworth-Profile": "1"}}) == ["sample", "alloc"]
+    assert profiling.requested_modes({"headers": {"X-Pennyworth-Profile": "flame"}}) == []
+
+
+@pytest.mark.unit
+def test_sampler_collapses_stacks(monkeypatch):
+    import time
+
+    import profiling
+
+    monkeypatch.setattr(profiling, "PENNYWORTH_PROFILE_SAMPLE_INTERVAL_MS", 1)
+    session = profiling.ProfileSession(["sample", "cprofile", "alloc"], {"path": "/v1/x"}, None)
+    reports = []
+    monkeypatch.setattr(session, "_write", reports.append)
+
+    def busy_wait():
+        end = time.perf_counter() + 0.05
+        buffers = []
+        while time.perf_counter() < end:
+            buffers.append(bytearray(1024))
+        return len(buffers)
+
+    assert session.run(busy_wait) > 0
+    [report] = reports
+    assert report["samples"] > 0
+    stack, count = report["collapsed"].splitlines()[0].rsplit(" ", 1)
+    assert "busy_wait (test_profiling.py:" in stack.split(";")[-1] and int(count) > 0
+    assert any(row["function"].startswith("busy_wait") for row in report["cprofile"])
+    assert report["allocations"] and report["peak_kb"] > 0
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_admin_request_is_profiled_to_storage(lambda_harness, monkeypatch):
+    import profiling
+    import storage
+
+    monkeypatch.setattr(profiling, "PENNYWORTH_PROFILE_DESTINATION", "storage")
+    headers = {**lambda_harness.auth_headers("admin", groups=("admin",)), "X-Pennyworth-Profile": "sample"}
+    resp = lambda_harness.get("/users", headers=headers)
+
+    assert resp.status_code == 200
+    location = resp.headers["x-pennyworth-profile"]
+    bucket, key = storage.parse_uri(location)
+    assert key.startswith(profiling.PROFILE_PREFIX)
+    report = json.load(storage.get_object_store().open(key))
+    assert report["modes"] == ["sample"] and report["path"].endswith("/users")
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_non_admin_header_is_ignored(lambda_harness, monkeypatch):
+    import profiling
+
+    monkeypatch.setattr(profiling, "ProfileSession", None)
+    resp = lambda_harness.get(
+        "/models", headers={**lambda_harness.auth_headers(), "X-Pennyworth-Profile": "sample"}
+    )
+    assert resp.status_code == 200
+    assert "x-pennyworth-profile" not in resp.headers
+
+
+@pytest.mark.unit
+def test_overlapping_alloc_sessions_share_tracemalloc(monkeypatch):
+    import tracemalloc
+
+    import profiling
+
+    outer = profiling.ProfileSession(["alloc"], {"path": "/v1/a"}, None)
+    inner = profiling.ProfileSession(["alloc"], {"path": "/v1/b"}, None)
+    reports = []
+    monkeypatch.setattr(outer, "_write", reports.append)
+    monkeypatch.setattr(inner, "_write", reports.append)
+
+    def nested():
+        inner.run(lambda: bytearray(4096))
+        return tracemalloc.is_tracing()
+
+    assert outer.run(nested) is True  # The inner session did not stop tracing under the outer one.
+    assert not tracemalloc.is_tracing()
+    assert [bool(r["allocations"]) for r in reports] == [True, True]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_profile_write_failure_does_not_fail_request(lambda_harness, monkeypatch):
+    import profiling
+    import storage
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("bucket unavailable")
+
+    monkeypatch.setattr(profiling, "PENNYWORTH_PROFILE_DESTINATION", "storage")
+    monkeypatch.setattr(storage.get_object_store(), "put", unavailable)
+    headers = {**lambda_harness.auth_headers("admin", groups=("admin",)), "X-Pennyworth-Profile": "sample"}
+    resp = lambda_harness.get("/users", headers=headers)
+
+    assert resp.status_code == 200
+    assert resp.headers["x-pennyworth-profile"] == "unavailable"
@@ -0,0 +1,102 @@
+import pytest
+
+CACHING = {"model_id": "us.anthropic.claude-3-5-haiku-20241022-v1:0", "supports_prompt_caching": True}
+PLAIN = {"model_id": "anthropic.claude-v2"}
+TOOLS = [
+    {"type": "function", "function": {"name": "read_file", "parameters": {"type": "object"}}},
+    {"type": "function", "function": {"name": "grep", "parameters": {"type": "object"}}},
+]
+
+
+def _messages(question):
+    return [
+        {"role": "system", "content": "You are a coding assistant. " + "context " * 50},
+        {"role": "user", "content": question},
+    ]
+
+
+@pytest.mark.unit
+def test_cache_points_added_on_tools_and_system_prompt():
+    import prompt_cache
+
+    original = _messages("hi")
+    messages, tools = prompt_cache.prepare(CACHING, original, TOOLS)
+    assert tools[-1]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in tools[0]
+    assert messages[0]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert messages[1] == original[1]
+    assert isinstance(original[0]["content"], str)  # Inputs are not modified.
+    assert "cache_control" not in TOOLS[-1]
+
+
+@pytest.mark.unit
+def test_client_hints_pass_through_or_are_stripped():
+    import prompt_cache
+
+    hinted = [
+        {"role": "system", "content": "rules"},
+        {"role": "user", "content": "big file", "cache_control": {"type": "ephemeral"}},
+    ]
+    messages, tools = prompt_cache.prepare(CACHING, hinted)
+    assert isinstance(messages[0]["content"], str)  # No automatic points.
+    assert messages[1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert tools is None
+
+    messages, _ = prompt_cache.prepare(PLAIN, hinted, TOOLS)
+    assert not any("cache_control" in p for p in messages[1]["content"])
+
+
+@pytest.mark.unit
+def test_at_most_four_cache_points():
+    import prompt_cache
+
+    hint = {"cache_control": {"type": "ephemeral"}}
+    messages = [{"role": "user", "content": f"turn {n}", **hint} for n in range(6)]
+    messages, _ = prompt_cache.prepare(CACHING, messages)
+    hinted = [n for n, m in enumerate(messages) if "cache_control" in m["content"][-1]]
+    assert hinted == [2, 3, 4, 5]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_second_turn_reports_cached_tokens(lambda_harness):
+    body = {"model": "claude-3-5-haiku", "messages": _messages("first"), "tools": TOOLS}
+    first = lambda_harness.post("/chat/completions", body=body).json()["usage"]
+    assert first["prompt_tokens_details"]["cached_tokens"] == 0
+    assert first["cache_creation_input_tokens"] > 0
+
+    body["messages"] = _messages("second")
+    second = lambda_harness.post("/chat/completions", body=body).json()["usage"]
+    assert second["prompt_tokens_details"]["cached_tokens"] == first["cache_creation_input_tokens"]
+    sent = lambda_harness.provider.calls[-1][1]
+    assert sent["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+
+
+@pytest.mark.unit
+def test_cache_writes_are_billed_on_top_of_prompt_tokens():
+    import metrics
+    from model_router import MODEL_MAP
+
+    haiku = MODEL_MAP["claude-3-5-haiku"]
+    written = {"prompt_tokens": 100, "completion_tokens": 10, "cache_creation_input_tokens": 5000}
+    assert metrics.usage_cost(written, haiku) == pytest.approx(0.00512)
+    read = {"prompt_tokens": 5100, "completion_tokens": 10, "prompt_tokens_details": {"cached_tokens": 5000}}
+    assert metrics.usage_cost(read, haiku) == pytest.approx((100 * 0.0008 + 5000 * 0.00008 + 10 * 0.004) / 1000)
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_cache_writing_request_is_charged_for_the_write(lambda_harness, monkeypatch):
+    import budgets
+    import state
+
+    monkeypatch.setattr(budgets, "PENNYWORTH_KEY_MONTHLY_BUDGET_USD", 1.0)
+    body = {"model": "claude-3-5-haiku", "messages": _messages("first"), "tools": TOOLS}
+    usage = lambda_harness.post("/chat/completions", body=body).json()["usage"]
+    expected = (
+        usage["prompt_tokens"] * 0.0008
+        + usage["cache_creation_input_tokens"] * 0.001
+        + usage["completion_tokens"] * 0.004
+    ) / 1000
+    (key,) = [k for k in budgets._cache if k.startswith("spend#key#")]
+    assert state.get_store().get_counter(key, "spent") == round(expected * budgets.MICRO)
@@ -0,0 +1,101 @@
+import json
+
+import litellm
+import pytest
+
+CONFIG = {"regions": ["us-west-2", "us-east-1", "eu-west-1"]}
+
+
+@pytest.fixture
+def fresh_regions(monkeypatch):
+    import regions
+
+    monkeypatch.setattr(regions, "_stats", {})
+    monkeypatch.setattr(regions, "PENNYWORTH_AWS_REGION", "us-east-1")
+    return regions
+
+
+def _throttle():
+    return litellm.RateLimitError("ThrottlingException: slow down", "bedrock", "m")
+
+
+@pytest.mark.unit
+def test_home_region_is_preferred_without_observations(fresh_regions):
+    assert fresh_regions.rank("m", CONFIG) == ["us-east-1", "us-west-2", "eu-west-1"]
+    assert fresh_regions.rank("m", {}) == ["us-east-1"]
+
+
+@pytest.mark.unit
+def test_lower_ewma_latency_wins(fresh_regions):
+    for _ in range(3):
+        fresh_regions._get("m", "us-east-1").observe(0, latency_ms=500)
+        fresh_regions._get("m", "us-west-2").observe(0, latency_ms=100)
+    assert fresh_regions.rank("m", CONFIG)[0] == "us-west-2"
+    # Stats are per model.
+    assert fresh_regions.rank("other", CONFIG)[0] == "us-east-1"
+
+
+@pytest.mark.unit
+def test_throttled_call_spills_over_and_shifts_traffic(fresh_regions):
+    calls = []
+
+    def call(region):
+        calls.append(region)
+        if region == "us-east-1":
+            raise _throttle()
+        return region
+
+    assert fresh_regions.invoke("m", CONFIG, call) == "us-west-2"
+    assert calls == ["us-east-1", "us-west-2"]
+    # The throttled home region now ranks behind the region that answered.
+    assert fresh_regions.rank("m", CONFIG)[0] == "us-west-2"
+    stats = fresh_regions.snapshot("m", CONFIG)
+    assert stats["us-east-1"]["throttles"] == 1 and stats["us-west-2"]["requests"] == 1
+
+
+@pytest.mark.unit
+def test_throttle_rate_decays(fresh_regions, monkeypatch):
+    stats = fresh_regions.RegionStats()
+    stats.observe(100.0, throttled=True)
+    monkeypatch.setattr(fresh_regions, "PENNYWORTH_REGION_THROTTLE_HALF_LIFE", 10)
+    assert stats.decayed_throttle_rate(110.0) == pytest.approx(stats.throttle_rate / 2)
+
+
+@pytest.mark.unit
+def test_other_errors_are_not_retried(fresh_regions):
+    calls = []
+
+    def call(region):
+        calls.append(region)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        fresh_regions.invoke("m", CONFIG, call)
+    assert calls == ["us-east-1"]
+
+
+@pytest.mark.unit
+def test_all_regions_throttled_raises(fresh_regions):
+    def call(region):
+        raise _throttle()
+
+    with pytest.raises(litellm.RateLimitError):
+        fresh_regions.invoke("m", CONFIG, call)
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_chat_spills_over_and_reports_region_metrics(lambda_harness, capsys):
+    lambda_harness.provider.errors.append(_throttle())
+    body = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}]}
+    capsys.readouterr()
+    resp = lambda_harness.post("/chat/completions", body=body)
+    assert resp.status_code == 200
+    first, second = [call["aws_region_name"] for _, call in lambda_harness.provider.calls]
+    assert first != second
+
+    emf = [json.loads(line) for line in capsys.readouterr().out.splitlines() if '"_aws"' in line][-1]
+    assert emf["region"] == second
+    assert emf["RegionSpillovers"] == [1.0] and emf["RegionThrottles"] == [1.0]
+    assert emf["region_stats"][first]["throttles"] == 1
+    assert ["service", "model", "region"] in emf["_aws"]["CloudWatchMetrics"][0]["Dimensions"]
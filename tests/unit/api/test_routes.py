@@ -0,0 +1,101 @@
+import pytest
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_version_and_well_known(lambda_harness):
+    resp = lambda_harness.get("/version")
+    assert resp.status_code == 200
+    assert resp.json()["Version"] == "v1"
+
+    resp = lambda_harness.get("/parameters/well-known")
+    assert resp.status_code == 200
+    assert resp.json()["Region"] == "us-west-2"
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_unknown_route_is_404(lambda_harness):
+    resp = lambda_harness.get("/nope")
+    assert resp.status_code == 404
+    assert resp.json() == {"message": "Not Found"}
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_models_lists_registry(lambda_harness):
+    resp = lambda_harness.get("/models")
+    assert resp.status_code == 200
+    assert "claude-instant" in {m["id"] for m in resp.json()["data"]}
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_chat_completion_uses_fake_provider(lambda_harness):
+    body = {"model": "claude-instant", "messages": [{"role": "user", "content": "hello there"}]}
+    first = lambda_harness.post("/chat/completions", body=body)
+    second = lambda_harness.post("/chat/completions", body=body)
+    assert first.status_code == 200
+    assert first.json()["choices"] == second.json()["choices"]
+    assert first.json()["usage"]["prompt_tokens"] == 2
+    kind, call = lambda_harness.provider.calls[0]
+    assert kind == "completion"
+    assert call["model"] == "anthropic.claude-instant-v1"
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_chat_completion_provider_error_is_500(lambda_harness):
+    lambda_harness.provider.errors.append(RuntimeError("boom"))
+    body = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}]}
+    resp = lambda_harness.post("/chat/completions", body=body)
+    assert resp.status_code == 500
+    assert "boom" in resp.json()["error"]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_chat_completion_validation(lambda_harness):
+    resp = lambda_harness.post("/chat/completions", body={"model": "claude-instant"})
+    assert resp.status_code == 400
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_embeddings(lambda_harness):
+    resp = lambda_harness.post("/embeddings", body={"model": "titan-text", "input": ["a", "b"]})
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert len(data) == 2
+    assert len(data[0]["embedding"]) == lambda_harness.provider.embedding_dim
+
+
+@pytest.mark.unit
+@pytest.mark.api
+@pytest.mark.users
+def test_create_and_list_users_with_jwt(lambda_harness):
+    headers = lambda_harness.auth_headers("admin", groups=("admin",))
+    user = {"username": "bob", "email": "bob@example.com", "password": "pw-123456789!"}
+    resp = lambda_harness.post("/users", body=user, headers=headers)
+    assert resp.status_code == 201
+    assert lambda_harness.aws.cognito_idp.users["bob"]["Groups"] == ["user"]
+
+    resp = lambda_harness.post("/users", body=user, headers=headers)
+    assert resp.status_code == 400
+
+    resp = lambda_harness.get("/users", headers=headers, query={"owner": "b"})
+    assert [u["username"] for u in resp.json()["data"]] == ["bob"]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+@pytest.mark.users
+def test_users_rejects_missing_or_forged_jwt(lambda_harness, fake_jwks):
+    resp = lambda_harness.get("/users")
+    assert resp.status_code == 403
+    forged = lambda_harness.token("admin") + "x"
+    resp = lambda_harness.get("/users", headers={"Authorization": f"Bearer {forged}"})
+    assert resp.status_code == 403
+    expired = fake_jwks.issue_token("admin", expires_in=-60)
+    resp = lambda_harness.get("/users", headers={"Authorization": f"Bearer {expired}"})
+    assert resp.status_code == 403
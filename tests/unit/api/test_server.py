@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+
+
+def _client():
+    import server
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test")
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_server_serves_the_lambda_routes(lambda_harness):
+    async def go():
+        async with _client() as client:
+            version = await client.get(f"{lambda_harness.prefix}/version")
+            missing = await client.get(f"{lambda_harness.prefix}/does-not-exist")
+            users = await client.get(
+                f"{lambda_harness.prefix}/users",
+                headers=lambda_harness.auth_headers("admin", groups=("admin",)),
+                params={"owner": "a"},
+            )
+            return version, missing, users
+
+    version, missing, users = _run(go())
+    assert version.status_code == 200
+    assert version.json() == lambda_harness.get("/version").json()
+    assert missing.status_code == 404
+    assert users.status_code == 200
+    assert "server-timing" in version.headers
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_concurrent_requests_do_not_share_request_state(lambda_harness):
+    lambda_harness.provider.latency = 0.02
+    prompts = [f"prompt number {n}" for n in range(16)]
+
+    def body(prompt):
+        return {"model": "claude-instant", "messages": [{"role": "user", "content": prompt}]}
+
+    async def go():
+        async with _client() as client:
+            return await asyncio.gather(
+                *(client.post(f"{lambda_harness.prefix}/chat/completions", json=body(p)) for p in prompts)
+            )
+
+    responses = _run(go())
+    expected = [lambda_harness.post("/chat/completions", body=body(p)).json() for p in prompts]
+    for response, want in zip(responses, expected):
+        assert response.status_code == 200
+        assert response.json()["choices"] == want["choices"]
+
+
+@pytest.mark.unit
+def test_build_event_maps_request_parts():
+    import server
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/v1/files",
+        "query_string": b"a=1&a=2&b=",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=x"), (b"x-test", b"1")],
+        "client": ("10.0.0.9", 1234),
+    }
+    event = server.build_event(scope, b"\x00\x01")
+    assert event["isBase64Encoded"] is True and event["body"] == "AAE="
+    assert event["multiValueQueryStringParameters"] == {"a": ["1", "2"], "b": [""]}
+    assert event["requestContext"]["identity"]["sourceIp"] == "10.0.0.9"
+    assert server.build_event({**scope, "headers": []}, b"")["body"] is None
@@ -0,0 +1,54 @@
+import pytest
+
+
+def _phases(header):
+    phases = {}
+    for entry in header.split(", "):
+        name, _, rest = entry.partition(";dur=")
+        phases[name] = float(rest.split(";")[0])
+    return phases
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_server_timing_header_breaks_down_phases(lambda_harness):
+    lambda_harness.provider.latency = 0.02
+    body = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}]}
+    resp = lambda_harness.post("/chat/completions", body=body)
+    phases = _phases(resp.headers["server-timing"])
+    assert {"route", "upstream", "encode", "total"} <= set(phases)
+    assert phases["upstream"] >= 20
+    assert phases["total"] >= phases["upstream"]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_server_timing_auth_and_credential_phases(lambda_harness):
+    resp = lambda_harness.get("/users", headers=lambda_harness.auth_headers("admin"))
+    phases = _phases(resp.headers["server-timing"])
+    assert "auth" in phases and "cred" in phases
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_streaming_records_time_to_first_byte(lambda_harness):
+    lambda_harness.provider.latency = 0.01
+    lambda_harness.provider.tokens_per_second = 500
+    body = {"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}], "stream": True}
+    resp = lambda_harness.post("/chat/completions", body=body)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "text/event-stream"
+    assert resp.text.endswith("data: [DONE]\n\n")
+    phases = _phases(resp.headers["server-timing"])
+    assert 10 <= phases["ttfb"] < phases["upstream"]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_server_timing_can_be_disabled(lambda_harness, monkeypatch):
+    import timing
+
+    monkeypatch.setattr(timing, "PENNYWORTH_SERVER_TIMING", False)
+    resp = lambda_harness.get("/version")
+    assert resp.status_code == 200
+    assert "server-timing" not in resp.headers
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from tests.utils.fake_aws import FakeDynamoDB
+
+
+@pytest.fixture(params=["memory", "dynamodb"])
+def store(request):
+    import state
+
+    if request.param == "memory":
+        return state.MemoryStateStore()
+    return state.DynamoStateStore("pennyworth-state", client=FakeDynamoDB())
+
+
+@pytest.mark.unit
+def test_put_get_delete(store):
+    assert store.get("a") is None
+    assert store.put("a", {"x": 1})
+    assert store.get("a") == {"x": 1}
+    assert not store.put("a", {"x": 2}, if_absent=True)
+    store.delete("a")
+    assert store.get("a") is None
+
+
+@pytest.mark.unit
+def test_expired_items_are_absent(store, monkeypatch):
+    import state
+
+    store.put("a", {"x": 1}, ttl_seconds=60)
+    assert store.get("a") == {"x": 1}
+    later = time.time() + 61
+    monkeypatch.setattr(state.time, "time", lambda: later)
+    assert store.get("a") is None
+
+
+@pytest.mark.unit
+def test_increment(store):
+    assert store.increment("c", "tokens", 5, ttl_seconds=60) == 5
+    assert store.increment("c", "tokens", 2.5) == 7.5
+    assert store.get_counter("c", "tokens") == 7.5
+    assert store.get_counter("missing", "tokens") == 0
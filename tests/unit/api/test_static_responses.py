@@ -0,0 +1,63 @@
+import pytest
+
+
+@pytest.mark.unit
+@pytest.mark.api
+@pytest.mark.parametrize("path", ["/version", "/parameters/well-known", "/models"])
+def test_static_routes_revalidate_with_etag(lambda_harness, path):
+    first = lambda_harness.get(path)
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "application/json"
+    assert first.headers["cache-control"].startswith("public, max-age=")
+    etag = first.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+
+    again = lambda_harness.get(path)
+    assert again.headers["etag"] == etag and again.text == first.text
+
+    for header in (etag, f'"stale", W/{etag}', "*"):
+        not_modified = lambda_harness.get(path, headers={"If-None-Match": header})
+        assert not_modified.status_code == 304
+        assert not_modified.text == ""
+        assert not_modified.headers["etag"] == etag
+
+    stale = lambda_harness.get(path, headers={"If-None-Match": '"stale"'})
+    assert stale.status_code == 200 and stale.json() == first.json()
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_static_response_is_encoded_once(lambda_harness, monkeypatch):
+    import static_responses
+
+    calls = []
+
+    def handler():
+        calls.append(1)
+        return {"Version": "x"}, 200
+
+    monkeypatch.setattr(static_responses, "_routes", dict(static_responses._routes))
+    monkeypatch.setattr(static_responses, "_responses", dict(static_responses._responses))
+    static_responses.register("version", handler, "public, max-age=60")
+    for _ in range(3):
+        assert lambda_harness.get("/version").json() == {"Version": "x"}
+    assert calls == [1]
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_long_static_bodies_are_not_logged(lambda_harness, monkeypatch):
+    import api
+    import static_responses
+
+    logged = []
+    monkeypatch.setattr(api.logger, "info", logged.append)
+    monkeypatch.setattr(static_responses, "_routes", dict(static_responses._routes))
+    monkeypatch.setattr(static_responses, "_responses", dict(static_responses._responses))
+    body = {"Version": "x" * 5000}
+    static_responses.register("version", lambda: (body, 200), "public, max-age=60")
+
+    assert lambda_harness.get("/version").json() == body
+    returning = [r for r in logged if isinstance(r, dict) and r.get("msg") == "lambda_handler returning"]
+    assert returning and "x" * 5000 not in returning[0]["response"]
+    assert "chars>" in returning[0]["response"]
@@ -0,0 +1,94 @@
+import pytest
+
+
+class _RecordingTracer:
+    def __init__(self):
+        self.subsegments = []
+        self.metadata = {}
+
+    def capture_method(self, func, capture_response=True):
+        assert capture_response is False
+
+        def traced(*args, **kwargs):
+            self.subsegments.append(func.__name__)
+            return func(*args, **kwargs)
+
+        return traced
+
+    def put_metadata(self, key, value):
+        self.metadata[key] = value
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    import tracing
+
+    recorder = _RecordingTracer()
+    monkeypatch.setattr(tracing, "tracer", recorder)
+    monkeypatch.setattr(tracing, "_layers", {"route", "handler"})
+    monkeypatch.setattr(tracing, "PENNYWORTH_TRACE_RESPONSE_MAX_BYTES", 0)
+    token = tracing._sampled.set(True)
+    yield tracing, recorder
+    tracing._sampled.reset(token)
+
+
+@pytest.mark.unit
+def test_layers_outside_the_policy_are_not_wrapped(policy):
+    tracing, recorder = policy
+
+    def extract():
+        return "token"
+
+    assert tracing.capture("auth")(extract) is extract
+    traced = tracing.capture("handler")(lambda: "body")
+    assert traced() == "body"
+    assert recorder.subsegments == ["<lambda>"]
+    assert tracing.enabled_layers("all") == set(tracing.LAYERS)
+    assert tracing.enabled_layers("none") == set()
+
+
+@pytest.mark.unit
+def test_unsampled_requests_skip_subsegments(policy, monkeypatch):
+    tracing, recorder = policy
+    monkeypatch.setattr(
+        tracing, "_rules", tracing.parse_sampling("/v1/models=0, POST /v1/chat/*=1, bogus, *=0.5")
+    )
+    traced = tracing.capture("route")(lambda: "ok")
+
+    assert tracing.start({"httpMethod": "GET", "path": "/v1/models"}) is False
+    assert traced() == "ok" and recorder.subsegments == []
+    assert tracing.start({"httpMethod": "POST", "path": "/v1/chat/completions"}) is True
+    traced()
+    assert recorder.subsegments == ["<lambda>"]
+    assert tracing.sample_rate("GET", "/v1/chat/completions") == 0.5
+    assert tracing.sample_rate("GET", "/v1/version") == 0.5
+
+
+@pytest.mark.unit
+def test_response_capture_respects_size_limit(policy, monkeypatch):
+    tracing, recorder = policy
+    monkeypatch.setattr(tracing, "PENNYWORTH_TRACE_RESPONSE_MAX_BYTES", 20)
+
+    def small():
+        return {"ok": True}, 200
+
+    def large():
+        return {"text": "x" * 100}, 200
+
+    tracing.capture("handler")(small)()
+    tracing.capture("handler")(large)()
+    assert recorder.metadata == {"small response": '{"ok": true}'}
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_routes_run_with_sampling_off(lambda_harness, monkeypatch):
+    import tracing
+
+    monkeypatch.setattr(tracing, "_rules", [("*", 0.0)])
+    resp = lambda_harness.post(
+        "/chat/completions",
+        body={"model": "claude-instant", "messages": [{"role": "user", "content": "hi"}]},
+    )
+    assert resp.status_code == 200
+    assert tracing._sampled.get() is False
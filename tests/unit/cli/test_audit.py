@@ -0,0 +1,86 @@
+import pytest
+
+from src.cli.audit import build_key_filter, scan_key_pages, key_status
+from src.shared.pagination import encode_cursor, decode_cursor
+
+
+class PagedScanClient:
+    """Minimal DynamoDB client stand-in that pages through fixed items."""
+
+    def __init__(self, items, page_size=2):
+        self.items = items
+        self.page_size = page_size
+        self.calls = []
+
+    def scan(self, **kwargs):
+        self.calls.append(kwargs)
+        segment = kwargs.get("Segment", 0)
+        total = kwargs.get("TotalSegments", 1)
+        mine = [i for n, i in enumerate(self.items) if n % total == segment]
+        start = int(kwargs["ExclusiveStartKey"]["pos"]["N"]) if "ExclusiveStartKey" in kwargs else 0
+        page = mine[start : start + self.page_size]
+        resp = {"Items": page}
+        if start + self.page_size < len(mine):
+            resp["LastEvaluatedKey"] = {"pos": {"N": str(start + self.page_size)}}
+        return resp
+
+
+def _items(n):
+    return [{"api_key_hash": {"S": f"h{i}"}, "owner": {"S": "alice"}} for i in range(n)]
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_cursor_round_trip():
+    key = {"api_key_hash": {"S": "abc"}}
+    assert decode_cursor(encode_cursor(key)) == key
+    assert encode_cursor(None) is None
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor!")
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_build_key_filter_owner_and_status():
+    f = build_key_filter(owner="alice", status="active", now="2025-01-01T00:00:00Z")
+    assert "#owner = :owner" in f["FilterExpression"]
+    assert "#expiry >= :now" in f["FilterExpression"]
+    assert f["ExpressionAttributeValues"][":owner"] == {"S": "alice"}
+    assert build_key_filter() == {}
+    with pytest.raises(ValueError):
+        build_key_filter(status="bogus")
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_scan_streams_pages_and_resumes():
+    ddb = PagedScanClient(_items(5))
+    pages = list(scan_key_pages(ddb, "keys", owner="alice", page_size=2))
+    assert [len(p["items"]) for p in pages] == [2, 2, 1]
+    assert pages[-1]["next_cursor"] is None
+    assert ddb.calls[0]["FilterExpression"] == "#owner = :owner"
+
+    resumed = list(scan_key_pages(ddb, "keys", cursor=pages[0]["next_cursor"]))
+    assert [i["api_key_hash"] for p in resumed for i in p["items"]] == ["h2", "h3", "h4"]
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_parallel_segments_cover_all_items():
+    ddb = PagedScanClient(_items(9))
+    pages = list(scan_key_pages(ddb, "keys", segments=3))
+    hashes = sorted(i["api_key_hash"] for p in pages for i in p["items"])
+    assert hashes == sorted(f"h{i}" for i in range(9))
+    assert {c["TotalSegments"] for c in ddb.calls} == {3}
+    with pytest.raises(ValueError):
+        list(scan_key_pages(ddb, "keys", segments=2, cursor=pages[0]["next_cursor"] or "x"))
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_key_status():
+    now = "2025-01-01T00:00:00Z"
+    assert key_status({"status": "revoked"}, now) == "revoked"
+    assert key_status({"expiry": "2024-06-01"}, now) == "expired"
+    assert key_status({"expiry": "2026-06-01"}, now) == "active"
+    assert key_status({}, now) == "active"
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from src.cli.bench import parse_mix, percentile, run_bench, summarize, format_report
+from tests.utils.mock_openai import MockOpenAIServer
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_parse_mix():
+    assert parse_mix("chat=70, embeddings=20,models") == [
+        ("chat", 70.0),
+        ("embeddings", 20.0),
+        ("models", 1.0),
+    ]
+    for bad in ("", "chat=0", "images=1", "chat=x"):
+        with pytest.raises(ValueError):
+            parse_mix(bad)
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99.9) == 100
+    assert percentile(values, 100) == 100
+    assert percentile([], 50) is None
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_closed_loop_against_mock_server():
+    with MockOpenAIServer() as server:
+        run = asyncio.run(
+            run_bench(
+                server.url,
+                mix="chat=1,embeddings=1,models=1",
+                concurrency=4,
+                total_requests=30,
+                duration=10,
+                token="t",
+                seed=1,
+            )
+        )
+    summary = summarize(run)
+    overall = summary["kinds"]["all"]
+    assert overall["count"] == 30
+    assert overall["errors"] == 0
+    assert overall["status_codes"] == {"200": 30}
+    assert summary["kinds"]["chat"]["prompt_tokens"] == 5 * summary["kinds"]["chat"]["count"]
+    assert server.requests[0][2]["Authorization"] == "Bearer t"
+    assert "Percentile" in format_report(summary)
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_open_loop_streaming_records_ttft():
+    with MockOpenAIServer(stream_tokens=("a", "b", "c")) as server:
+        run = asyncio.run(
+            run_bench(server.url, mix="chat", rps=50, duration=0.3, stream=True, seed=2)
+        )
+    summary = summarize(run)
+    chat = summary["kinds"]["chat"]
+    assert summary["mode"] == "open"
+    assert 10 <= chat["count"] <= 16
+    assert chat["ttft_ms"]["p50"] is not None
+    assert chat["ttft_ms"]["p100"] <= chat["latency_ms"]["p100"]
+    assert chat["completion_tokens"] == 3 * chat["count"]
@@ -0,0 +1,134 @@
+import base64
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+import pytest
+
+from src.cli.proxy import PennyworthProxy, ResponseCache, SessionCredentials, build_server, session_expiry
+from tests.utils.mock_openai import MockOpenAIServer
+
+
+def _jwt(exp, name="dev"):
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+
+    return f"{part({'alg': 'none'})}.{part({'exp': exp, 'sub': name})}.sig"
+
+
+def _session(exp, name="dev"):
+    return {"jwt_token": _jwt(exp, name), "aws_credentials": {"Expiration": "2999-01-01T00:00:00+00:00"}}
+
+
+@contextmanager
+def _running_proxy(upstream_url, session, cache=None, refresh=lambda s: None):
+    credentials = SessionCredentials(session, refresh=refresh)
+    forwarder = PennyworthProxy(upstream_url, credentials, pool_size=4, cache=cache)
+    httpd = build_server(forwarder)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}/v1"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        forwarder.close()
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_proxy_forwards_with_session_token_and_caches():
+    session = _session(time.time() + 3600)
+    chat = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    with MockOpenAIServer() as upstream, _running_proxy(upstream.url, session, cache=ResponseCache()) as url:
+        with httpx.Client(base_url=url) as client:
+            first = client.post("/chat/completions", json=chat, headers={"Authorization": "Bearer local"})
+            second = client.post("/chat/completions", json=chat)
+            models = client.get("/models")
+            missing = client.get(url.replace("/v1", "/other"))
+    assert first.status_code == 200 and first.json()["choices"][0]["message"]["content"] == "ok"
+    assert first.headers["x-pennyworth-proxy-cache"] == "miss"
+    assert second.headers["x-pennyworth-proxy-cache"] == "hit"
+    assert second.json() == first.json()
+    assert models.json()["data"][0]["id"] == "mock-model"
+    assert missing.status_code == 404
+    # The cached request never reached the API; the session token replaced the local one.
+    assert [(m, p) for m, p, _, _ in upstream.requests] == [("POST", "/v1/chat/completions"), ("GET", "/v1/models")]
+    assert upstream.requests[0][2]["Authorization"] == f"Bearer {session['jwt_token']}"
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_proxy_relays_streams_uncached():
+    chat = {"model": "m", "stream": True, "messages": [{"role": "user", "content": "hi"}]}
+    with MockOpenAIServer(stream_tokens=("a", "b")) as upstream, _running_proxy(
+        upstream.url, _session(time.time() + 3600), cache=ResponseCache()
+    ) as url:
+        with httpx.Client(base_url=url) as client:
+            bodies = [client.post("/chat/completions", json=chat).text for _ in range(2)]
+    assert len(upstream.requests) == 2
+    assert bodies[0].count("data: ") == 3 and bodies[0].endswith("data: [DONE]\n\n")
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_credentials_refresh_ahead_of_expiry():
+    now = time.time()
+    renewed = _session(now + 3600, name="renewed")
+    credentials = SessionCredentials(_session(now + 1000), margin=300, refresh=lambda s: renewed)
+    assert credentials.refresh_if_needed(now) is False
+    assert credentials.refresh_if_needed(now + 800) is True
+    assert credentials.token() == renewed["jwt_token"]
+
+    failing = SessionCredentials(_session(now + 100), refresh=lambda s: None)
+    assert failing.refresh_if_needed(now) is False
+    assert failing.token() == _jwt(now + 100)
+    assert session_expiry({"jwt_token": "opaque", "aws_credentials": {"Expiration": "2030-01-01T00:00:00Z"}}) == 1893456000.0
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_proxy_renews_an_expired_token_before_sending():
+    # E.g. the machine slept through the background renewal.
+    renewed = _session(time.time() + 3600, name="renewed")
+    with MockOpenAIServer(check_expiry=True) as upstream, _running_proxy(
+        upstream.url, _session(time.time() - 60), refresh=lambda s: renewed
+    ) as url:
+        resp = httpx.get(f"{url}/models")
+    assert resp.status_code == 200
+    assert [r[2]["Authorization"] for r in upstream.requests] == [f"Bearer {renewed['jwt_token']}"]
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_proxy_renews_and_retries_once_when_the_api_rejects_an_expired_token():
+    renewed = _session(time.time() + 3600, name="renewed")
+    attempts = []
+
+    def refresh(session):
+        attempts.append(session)
+        return renewed if len(attempts) > 1 else None  # The renewal before sending fails.
+
+    chat = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    with MockOpenAIServer(check_expiry=True) as upstream, _running_proxy(
+        upstream.url, _session(time.time() - 60), refresh=refresh
+    ) as url:
+        resp = httpx.post(f"{url}/chat/completions", json=chat)
+    assert resp.status_code == 200
+    assert len(attempts) == 2 and len(upstream.requests) == 2
+    assert upstream.requests[1][2]["Authorization"] == f"Bearer {renewed['jwt_token']}"
+
+
+@pytest.mark.unit
+@pytest.mark.cli
+def test_cache_key_skips_streams_and_writes():
+    assert ResponseCache.key("POST", "/v1/embeddings", b'{"input": "x"}') is not None
+    assert ResponseCache.key("POST", "/v1/chat/completions", b'{"stream": true}') is None
+    assert ResponseCache.key("POST", "/v1/files", b"{}") is None
+    assert ResponseCache.key("DELETE", "/v1/models/x", b"") is None
+    cache = ResponseCache(max_entries=1, ttl=60)
+    cache.put("a", (200, [], b"a"))
+    cache.put("b", (200, [], b"b"))
+    assert cache.get("a") is None and cache.get("b") == (200, [], b"b")
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.cli.bench import summarize
+from src.cli.replay import build_replay_request, load_shapes, run_replay
+
+CHAT = {
+    "ts": 100.0,
+    "route": "chat_completions",
+    "model": "claude-instant",
+    "message_chars": [30, 5, 12],
+    "completion_tokens": 16,
+    "stream": True,
+}
+
+
+@pytest.mark.unit
+def test_load_shapes_reads_files_and_exported_logs(tmp_path):
+    capture = tmp_path / "capture.jsonl"
+    log_record = {"level": "INFO", "message": {"msg": "request shape", "shape": {**CHAT, "ts": 99.5}}}
+    capture.write_text(
+        "\n".join(
+            [
+                json.dumps({"ts": 101.0, "route": "list_models"}),
+                "2026-10-19T10:00:00Z\t" + json.dumps(log_record),
+                json.dumps({"level": "INFO", "message": "unrelated"}),
+                "not json",
+            ]
+        )
+    )
+    assert [s["route"] for s in load_shapes(str(capture))] == ["chat_completions", "list_models"]
+
+
+@pytest.mark.unit
+def test_build_replay_request_reproduces_sizes():
+    method, path, body = build_replay_request(CHAT, model="other")
+    assert (method, path) == ("POST", "/chat/completions")
+    assert [len(m["content"]) for m in body["messages"]] == [30, 5, 12]
+    assert body["messages"][-1]["role"] == "user"
+    assert body["model"] == "other" and body["max_tokens"] == 16 and body["stream"] is True
+    _, _, embed = build_replay_request({"route": "embeddings", "model": "m", "input_chars": [3, 4]})
+    assert [len(i) for i in embed["input"]] == [3, 4]
+    assert build_replay_request({"route": "list_models"}) == ("GET", "/models", None)
+    assert build_replay_request({"route": "upload_file"}) is None
+
+
+@pytest.mark.unit
+@pytest.mark.api
+def test_replay_against_the_fake_provider(lambda_harness):
+    import server
+
+    shapes = [
+        {**CHAT, "ts": 0.0, "stream": False},
+        {**CHAT, "ts": 0.2},
+        {"ts": 0.4, "route": "embeddings", "model": "titan-embed-text", "input_chars": [10, 20]},
+        {"ts": 0.6, "route": "list_models"},
+        {"ts": 0.8, "route": "delete_file"},
+    ]
+    run = asyncio.run(
+        run_replay(
+            f"http://replay{lambda_harness.prefix}",
+            shapes,
+            speedup=8.0,
+            transport=httpx.ASGITransport(app=server.app),
+        )
+    )
+
+    assert run["skipped"] == 1 and run["dropped"] == 0
+    assert run["elapsed_s"] >= 0.6 / 8
+    summary = summarize(run)
+    assert summary["kinds"]["all"]["count"] == 4 and summary["kinds"]["all"]["errors"] == 0
+    assert summary["kinds"]["chat_completions"]["ttft_ms"]["p100"] is not None
+    assert set(summary["kinds"]) == {"all", "chat_completions", "embeddings", "list_models"}
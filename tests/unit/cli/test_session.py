@@ -0,0 +1,19 @@
+import os
+import stat
+
+import pytest
+
+import src.shared.session as session
+
+
+@pytest.mark.unit
+def test_session_file_is_owner_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(session, "SESSION_DIR", str(tmp_path))
+    path = tmp_path / session.SESSION_FILE
+    path.write_text("{}")
+    path.chmod(0o644)
+
+    session._save_session({"jwt_token": "t", "aws_credentials": {"Expiration": "2030-01-01T00:00:00Z"}})
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert session._load_session()["jwt_token"] == "t"
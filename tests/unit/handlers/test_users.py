@@ -0,0 +1,95 @@
+import pytest
+
+from src.shared.pagination import encode_cursor
+
+
+class FakeCognito:
+    def __init__(self, users, next_token=None):
+        self.users = users
+        self.next_token = next_token
+        self.requests = []
+
+    def list_users(self, **kwargs):
+        self.requests.append(kwargs)
+        resp = {"Users": self.users}
+        if self.next_token:
+            resp["PaginationToken"] = self.next_token
+        return resp
+
+
+class FakeSession:
+    def __init__(self, cognito):
+        self.cognito = cognito
+
+    def client(self, name):
+        return self.cognito
+
+
+class FakeEvent:
+    def __init__(self, params):
+        self.query_string_parameters = params
+        self.raw_event = {"headers": {}}
+
+
+def _user(name, enabled=True, status="CONFIRMED"):
+    return {
+        "Username": name,
+        "Enabled": enabled,
+        "UserStatus": status,
+        "Attributes": [{"Name": "email", "Value": f"{name}@example.com"}],
+    }
+
+
+@pytest.fixture
+def users_module():
+    from handlers import users
+
+    return users
+
+
+def _install(users_module, monkeypatch, cognito):
+    monkeypatch.setattr(
+        users_module, "get_user_boto3_session", lambda raw_event: FakeSession(cognito)
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.handlers
+@pytest.mark.users
+def test_list_users_returns_cursor(users_module, monkeypatch):
+    cognito = FakeCognito([_user("alice")], next_token="tok-2")
+    _install(users_module, monkeypatch, cognito)
+    body, status = users_module.list_users_handler(
+        FakeEvent({"limit": "1", "cursor": encode_cursor("tok-1"), "status": "active"})
+    )
+    assert status == 200
+    assert body["data"][0]["username"] == "alice"
+    assert body["data"][0]["attributes"]["email"] == "alice@example.com"
+    assert body["has_more"] is True
+    assert body["next_cursor"] == encode_cursor("tok-2")
+    request = cognito.requests[0]
+    assert request["Limit"] == 1
+    assert request["PaginationToken"] == "tok-1"
+    assert request["Filter"] == 'status = "Enabled"'
+
+
+@pytest.mark.unit
+@pytest.mark.handlers
+@pytest.mark.users
+def test_list_users_owner_filter_wins_and_status_applied_locally(users_module, monkeypatch):
+    cognito = FakeCognito([_user("al1"), _user("al2", enabled=False)])
+    _install(users_module, monkeypatch, cognito)
+    body, _ = users_module.list_users_handler(FakeEvent({"owner": "al", "status": "disabled"}))
+    assert cognito.requests[0]["Filter"] == 'username ^= "al"'
+    assert [u["username"] for u in body["data"]] == ["al2"]
+    assert body["next_cursor"] is None
+
+
+@pytest.mark.unit
+@pytest.mark.handlers
+@pytest.mark.users
+@pytest.mark.parametrize("params", [{"limit": "0"}, {"limit": "x"}, {"cursor": "%%%"}])
+def test_list_users_rejects_bad_params(users_module, monkeypatch, params):
+    _install(users_module, monkeypatch, FakeCognito([]))
+    with pytest.raises(users_module.BadRequestException):
+        users_module.list_users_handler(FakeEvent(params))
@@ -0,0 +1,320 @@
+"""Local stand-ins for the AWS services the Lambda talks to (Cognito, DynamoDB, S3, Lambda)."""
+
+import copy
+import io
+import time
+import uuid
+
+import rsa
+from botocore.exceptions import ClientError
+from jose import jwk, jwt
+
+
+class FakeCognitoJWKS:
+    """
+    Signs Cognito-style ID tokens with a local RSA key and exposes the matching JWKS.
+    Generating the key is slow, so create one per test session.
+    """
+
+    def __init__(self, region, user_pool_id, client_id, kid="harness-key"):
+        self.region = region
+        self.user_pool_id = user_pool_id
+        self.client_id = client_id
+        self.kid = kid
+        _, private_key = rsa.newkeys(2048)
+        self.private_pem = private_key.save_pkcs1().decode()
+        public = jwk.construct(self.private_pem, "RS256").public_key().to_dict()
+        public.update({"kid": kid, "alg": "RS256", "use": "sig"})
+        self.jwks = {"keys": [public]}
+
+    @property
+    def issuer(self):
+        return f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}"
+
+    def issue_token(self, username="harness-user", groups=("user",), expires_in=3600, **claims):
+        now = int(time.time())
+        payload = {
+            "sub": str(uuid.uuid5(uuid.NAMESPACE_DNS, username)),
+            "iss": self.issuer,
+            "aud": self.client_id,
+            "token_use": "id",
+            "cognito:username": username,
+            "cognito:groups": list(groups),
+            "iat": now,
+            "exp": now + expires_in,
+            **claims,
+        }
+        return jwt.encode(payload, self.private_pem, algorithm="RS256", headers={"kid": self.kid})
+
+    def install(self, monkeypatch, auth_module):
+        """Serve this JWKS from auth.get_jwks without any network access."""
+        monkeypatch.setattr(auth_module, "_JWKS", self.jwks)
+        return self
+
+
+class _Exceptions:
+    """Mimics the `client.exceptions` namespace of boto3 clients."""
+
+    class UsernameExistsException(ClientError):
+        pass
+
+    class UserNotFoundException(ClientError):
+        pass
+
+    class ConditionalCheckFailedException(ClientError):
+        pass
+
+
+def _client_error(cls, code, message):
+    return cls({"Error": {"Code": code, "Message": message}}, code)
+
+
+class FakeCognitoIdentity:
+    """cognito-identity client: hands out static temporary credentials."""
+
+    def get_id(self, IdentityPoolId, Logins):
+        return {"IdentityId": f"{IdentityPoolId}:harness"}
+
+    def get_credentials_for_identity(self, IdentityId, Logins):
+        return {
+            "Credentials": {
+                "AccessKeyId": "AKIAHARNESS",
+                "SecretKey": "harness-secret",
+                "SessionToken": "harness-session",
+                "Expiration": "2099-01-01T00:00:00Z",
+            }
+        }
+
+
+class FakeCognitoIdp:
+    """cognito-idp client holding users in memory."""
+
+    exceptions = _Exceptions
+
+    def __init__(self):
+        self.users = {}
+
+    def admin_create_user(self, UserPoolId, Username, UserAttributes=(), **kwargs):
+        if Username in self.users:
+            raise _client_error(
+                _Exceptions.UsernameExistsException, "UsernameExistsException", "exists"
+            )
+        self.users[Username] = {
+            "Username": Username,
+            "Enabled": True,
+            "UserStatus": "FORCE_CHANGE_PASSWORD",
+            "Attributes": list(UserAttributes),
+            "Groups": [],
+        }
+        return {"User": self.users[Username]}
+
+    def admin_set_user_password(self, UserPoolId, Username, Password, Permanent=False):
+        self.users[Username]["UserStatus"] = "CONFIRMED" if Permanent else "FORCE_CHANGE_PASSWORD"
+
+    def admin_add_user_to_group(self, UserPoolId, Username, GroupName):
+        self.users[Username]["Groups"].append(GroupName)
+
+    def list_users(self, UserPoolId, Limit=60, PaginationToken=None, Filter=None):
+        names = sorted(self.users)
+        if Filter and Filter.startswith("username ^="):
+            prefix = Filter.split('"')[1]
+            names = [n for n in names if n.startswith(prefix)]
+        start = int(PaginationToken or 0)
+        page = names[start : start + Limit]
+        resp = {"Users": [self.users[n] for n in page]}
+        if start + Limit < len(names):
+            resp["PaginationToken"] = str(start + Limit)
+        return resp
+
+
+class FakeDynamoDB:
+    """
+    Low-level DynamoDB client over in-memory tables keyed by the item's hash key.
+    Supports put/get/delete, conditional puts on attribute_not_exists, ADD/SET
+    updates, and paginated (optionally segmented) scans. Filter expressions are
+    not evaluated.
+    """
+
+    exceptions = _Exceptions
+
+    def __init__(self, key_attribute="pk"):
+        self.key_attribute = key_attribute
+        self.tables = {}
+
+    def _table(self, name):
+        return self.tables.setdefault(name, {})
+
+    def _key(self, item_or_key):
+        value = item_or_key[self.key_attribute]
+        return next(iter(value.values()))
+
+    def put_item(self, TableName, Item, ConditionExpression=None, **kwargs):
+        table = self._table(TableName)
+        key = self._key(Item)
+        if ConditionExpression and "attribute_not_exists" in ConditionExpression and key in table:
+            raise _client_error(
+                _Exceptions.ConditionalCheckFailedException,
+                "ConditionalCheckFailedException",
+                "The conditional request failed",
+            )
+        table[key] = copy.deepcopy(Item)
+        return {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        item = self._table(TableName).get(self._key(Key))
+        return {"Item": copy.deepcopy(item)} if item is not None else {}
+
+    def delete_item(self, TableName, Key, **kwargs):
+        self._table(TableName).pop(self._key(Key), None)
+        return {}
+
+    def update_item(
+        self,
+        TableName,
+        Key,
+        UpdateExpression,
+        ExpressionAttributeValues=None,
+        ExpressionAttributeNames=None,
+        ReturnValues=None,
+        **kwargs,
+    ):
+        table = self._table(TableName)
+        key = self._key(Key)
+        item = table.setdefault(key, copy.deepcopy(Key))
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        for clause in _split_update(UpdateExpression):
+            action, _, rest = clause.partition(" ")
+            for assignment in rest.split(","):
+                assignment = assignment.strip()
+                if action == "ADD":
+                    attr, placeholder = assignment.split()
+                    attr = names.get(attr, attr)
+                    current = float(item.get(attr, {"N": "0"})["N"])
+                    item[attr] = {"N": _num(current + float(values[placeholder]["N"]))}
+                elif action == "SET":
+                    attr, placeholder = [p.strip() for p in assignment.split("=")]
+                    item[names.get(attr, attr)] = copy.deepcopy(values[placeholder])
+        return {"Attributes": copy.deepcopy(item)} if ReturnValues else {}
+
+    def scan(self, TableName, Limit=None, ExclusiveStartKey=None, Segment=0, TotalSegments=1, **kwargs):
+        keys = sorted(self._table(TableName))
+        keys = [k for n, k in enumerate(keys) if n % TotalSegments == Segment]
+        start = keys.index(self._key(ExclusiveStartKey)) + 1 if ExclusiveStartKey else 0
+        end = start + Limit if Limit else len(keys)
+        page = keys[start:end]
+        resp = {"Items": [copy.deepcopy(self._table(TableName)[k]) for k in page]}
+        if end < len(keys) and page:
+            resp["LastEvaluatedKey"] = {self.key_attribute: {"S": page[-1]}}
+        return resp
+
+
+def _split_update(expression):
+    """Split 'SET a = :a ADD b :b' into ['SET a = :a', 'ADD b :b']."""
+    clauses, current = [], []
+    for word in expression.split():
+        if word in ("SET", "ADD") and current:
+            clauses.append(" ".join(current))
+            current = []
+        current.append(word)
+    if current:
+        clauses.append(" ".join(current))
+    return clauses
+
+
+def _num(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class FakeS3:
+    """S3 client over an in-memory {bucket: {key: bytes}} map."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body.read() if hasattr(Body, "read") else Body
+        self.buckets.setdefault(Bucket, {})[Key] = data.encode() if isinstance(data, str) else bytes(data)
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        data = self.buckets.get(Bucket, {}).get(Key)
+        if data is None:
+            raise _client_error(ClientError, "NoSuchKey", "The specified key does not exist.")
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.buckets.get(Bucket, {}).pop(Key, None)
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj.read())
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600, **kwargs):
+        return (
+            f"https://{Params['Bucket']}.s3.fake/{Params['Key']}"
+            f"?X-Amz-Method={ClientMethod}&X-Amz-Expires={ExpiresIn}"
+        )
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, MaxKeys=1000, **kwargs):
+        keys = sorted(k for k in self.buckets.get(Bucket, {}) if k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start : start + MaxKeys]
+        resp = {"Contents": [{"Key": k} for k in page], "IsTruncated": start + MaxKeys < len(keys)}
+        if resp["IsTruncated"]:
+            resp["NextContinuationToken"] = str(start + MaxKeys)
+        return resp
+
+
+class FakeLambda:
+    """Lambda client recording asynchronous invocations in `invocations`."""
+
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, FunctionName, Payload=b"", InvocationType="RequestResponse", **kwargs):
+        self.invocations.append((FunctionName, InvocationType, Payload))
+        return {"StatusCode": 202 if InvocationType == "Event" else 200}
+
+
+class FakeBoto3Session:
+    """boto3.Session stand-in returning the fake clients above."""
+
+    def __init__(self, clients, **kwargs):
+        self.clients = clients
+        self.kwargs = kwargs
+
+    def client(self, name, **kwargs):
+        return self.clients[name]
+
+
+class FakeAWS:
+    """
+    Bundle of fake clients, patched into the Lambda's `auth` module so that
+    boto3.client(...) and boto3.Session(...) never reach AWS.
+    """
+
+    def __init__(self):
+        self.cognito_identity = FakeCognitoIdentity()
+        self.cognito_idp = FakeCognitoIdp()
+        self.dynamodb = FakeDynamoDB()
+        self.s3 = FakeS3()
+        self.lambda_ = FakeLambda()
+        self.clients = {
+            "cognito-identity": self.cognito_identity,
+            "cognito-idp": self.cognito_idp,
+            "dynamodb": self.dynamodb,
+            "s3": self.s3,
+            "lambda": self.lambda_,
+        }
+
+    def client(self, name, **kwargs):
+        return self.clients[name]
+
+    def session(self, **kwargs):
+        return FakeBoto3Session(self.clients, **kwargs)
+
+    def install(self, monkeypatch, auth_module):
+        monkeypatch.setattr(auth_module.boto3, "client", self.client)
+        monkeypatch.setattr(auth_module.boto3, "Session", self.session)
+        return self
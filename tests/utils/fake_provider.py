@@ -0,0 +1,177 @@
+"""Deterministic fake LLM provider standing in for LiteLLM/Bedrock in local tests."""
+
+import hashlib
+import random
+import time
+
+import litellm
+from litellm.types.utils import Delta, ModelResponseStream, StreamingChoices
+
+
+class FakeProvider:
+    """
+    Replaces litellm.completion / litellm.embedding with deterministic responses.
+
+    - latency: fixed seconds added before the first token (time to first byte)
+    - tokens_per_second: generation rate; adds completion_tokens / rate seconds
+    - completion_tokens: number of tokens in every completion
+    - embedding_dim: length of each embedding vector
+    - errors: exceptions raised (in order) by the next calls, one per call
+    - error_rate: probability of raising `error_factory()` on a call (seeded)
+    Every call is recorded in `calls` as (kind, kwargs).
+
+    Prompt caching is simulated: the prefix up to the last cache_control hint
+    (tools first, then messages) is written to the cache on first sight and
+    reported as cached_tokens when a later call repeats it.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        tokens_per_second=None,
+        completion_tokens=8,
+        embedding_dim=8,
+        errors=None,
+        error_rate=0.0,
+        error_factory=None,
+        seed=0,
+        sleep=time.sleep,
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.embedding_dim = embedding_dim
+        self.errors = list(errors or [])
+        self.error_rate = error_rate
+        self.error_factory = error_factory or (
+            lambda: litellm.RateLimitError(
+                message="ThrottlingException: fake throttle",
+                llm_provider="bedrock",
+                model="fake",
+            )
+        )
+        self.rng = random.Random(seed)
+        self.sleep = sleep
+        self.calls = []
+        self.prompt_cache = set()
+
+    def install(self, monkeypatch):
+        """Patch LiteLLM entry points used by the handlers."""
+        monkeypatch.setattr(litellm, "completion", self.completion)
+        monkeypatch.setattr(litellm, "embedding", self.embedding)
+        return self
+
+    def _maybe_fail(self):
+        if self.errors:
+            raise self.errors.pop(0)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise self.error_factory()
+
+    @staticmethod
+    def count_tokens(messages=None, prompt=None):
+        """Whitespace token count of the request text (deterministic and cheap)."""
+        if prompt is not None:
+            return len(str(prompt).split())
+        total = 0
+        for m in messages or []:
+            content = m.get("content")
+            if isinstance(content, list):
+                content = " ".join(str(p.get("text", "")) for p in content)
+            total += len(str(content or "").split())
+        return total
+
+    def _tokens(self, seed_text):
+        digest = hashlib.sha256(seed_text.encode()).hexdigest()
+        return [f"tok{digest[i % 32]}" for i in range(self.completion_tokens)]
+
+    def completion(self, model=None, messages=None, prompt=None, stream=False, **kwargs):
+        self.calls.append(("completion", {"model": model, "messages": messages, "prompt": prompt, "stream": stream, **kwargs}))
+        self._maybe_fail()
+        cache_usage = self._cache_usage(messages, kwargs.get("tools"))
+        # As LiteLLM reports Anthropic/Bedrock usage: cache reads are part of
+        # prompt_tokens, cache writes are not.
+        prompt_tokens = self.count_tokens(messages, prompt) - cache_usage.get("cache_creation_input_tokens", 0)
+        tokens = self._tokens(f"{model}:{messages}:{prompt}")
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+            **cache_usage,
+        }
+        if stream:
+            include_usage = (kwargs.get("stream_options") or {}).get("include_usage")
+            return self._stream(model, tokens, usage if include_usage else None)
+        self.sleep(self.latency + self._generation_time(len(tokens)))
+        return litellm.ModelResponse(
+            id="chatcmpl-fake",
+            model=model,
+            choices=[
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": " ".join(tokens)},
+                }
+            ],
+            usage=usage,
+        )
+
+    @staticmethod
+    def _hinted(item):
+        content = item.get("content")
+        parts = content if isinstance(content, list) else []
+        return "cache_control" in item or any(
+            isinstance(p, dict) and "cache_control" in p for p in parts
+        )
+
+    def _cache_usage(self, messages, tools):
+        items = list(tools or []) + list(messages or [])
+        hinted = [n for n, item in enumerate(items) if self._hinted(item)]
+        if not hinted:
+            return {}
+        prefix = items[: hinted[-1] + 1]
+        key = hashlib.sha256(repr(prefix).encode()).hexdigest()
+        cached = self.count_tokens([m for m in prefix if "role" in m])
+        if key in self.prompt_cache:
+            return {"cache_read_input_tokens": cached, "cache_creation_input_tokens": 0}
+        self.prompt_cache.add(key)
+        return {"cache_read_input_tokens": 0, "cache_creation_input_tokens": cached}
+
+    def _generation_time(self, n_tokens):
+        return n_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _stream(self, model, tokens, usage):
+        self.sleep(self.latency)
+        per_token = self._generation_time(1)
+        for n, token in enumerate(tokens):
+            if n:
+                self.sleep(per_token)
+            yield ModelResponseStream(
+                id="chatcmpl-fake",
+                model=model,
+                choices=[StreamingChoices(index=0, delta=Delta(content=("" if n == 0 else " ") + token))],
+            )
+        last = ModelResponseStream(
+            id="chatcmpl-fake",
+            model=model,
+            choices=[StreamingChoices(index=0, delta=Delta(), finish_reason="stop")],
+        )
+        if usage is not None:  # Like LiteLLM, only with stream_options={"include_usage": True}.
+            last.usage = litellm.Usage(**usage)
+        yield last
+
+    def embedding(self, model=None, input=None, **kwargs):
+        self.calls.append(("embedding", {"model": model, "input": input, **kwargs}))
+        self._maybe_fail()
+        inputs = input if isinstance(input, list) else [input]
+        self.sleep(self.latency)
+        data = []
+        for index, text in enumerate(inputs):
+            digest = hashlib.sha256(f"{model}:{text}".encode()).digest()
+            vector = [digest[i % len(digest)] / 255.0 for i in range(self.embedding_dim)]
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(str(t).split()) for t in inputs)
+        return litellm.EmbeddingResponse(
+            model=model,
+            data=data,
+            usage={"prompt_tokens": tokens, "total_tokens": tokens},
+        )
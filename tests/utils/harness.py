@@ -0,0 +1,118 @@
+"""In-process harness: invokes api.lambda_handler with synthetic API Gateway events."""
+
+import base64
+import json
+import time
+import uuid
+
+
+def make_event(method, path, headers=None, body=None, query=None):
+    """
+    Build an API Gateway REST (v1 proxy) event as delivered to the Lambda.
+    `body` may be a dict (JSON encoded), str or bytes.
+    """
+    headers = dict(headers or {})
+    is_base64 = False
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body)
+        headers.setdefault("Content-Type", "application/json")
+    elif isinstance(body, bytes):
+        body = base64.b64encode(body).decode()
+        is_base64 = True
+    request_id = str(uuid.uuid4())
+    return {
+        "resource": "/{proxy+}",
+        "path": path,
+        "httpMethod": method,
+        "headers": headers,
+        "multiValueHeaders": {k: [v] for k, v in headers.items()},
+        "queryStringParameters": dict(query) if query else None,
+        "multiValueQueryStringParameters": {k: [v] for k, v in query.items()} if query else None,
+        "pathParameters": {"proxy": path.lstrip("/")},
+        "stageVariables": None,
+        "requestContext": {
+            "resourcePath": "/{proxy+}",
+            "httpMethod": method,
+            "path": f"/Prod{path}",
+            "stage": "Prod",
+            "requestId": request_id,
+            "requestTimeEpoch": int(time.time() * 1000),
+            "identity": {"sourceIp": "127.0.0.1", "userAgent": "pennyworth-harness"},
+        },
+        "body": body,
+        "isBase64Encoded": is_base64,
+    }
+
+
+class FakeLambdaContext:
+    """Minimal LambdaContext with a wall-clock deadline."""
+
+    function_name = "pennyworth-harness"
+    function_version = "$LATEST"
+    invoked_function_arn = "arn:aws:lambda:us-west-2:123456789012:function:pennyworth-harness"
+    memory_limit_in_mb = 512
+    log_group_name = "/aws/lambda/pennyworth-harness"
+    log_stream_name = "harness"
+
+    def __init__(self, timeout_ms=30000):
+        self.aws_request_id = str(uuid.uuid4())
+        self._deadline = time.monotonic() + timeout_ms / 1000.0
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class HarnessResponse:
+    """Lambda proxy response with case-insensitive single-value headers."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.status_code = raw["statusCode"]
+        headers = {}
+        for name, values in (raw.get("multiValueHeaders") or {}).items():
+            headers[name.lower()] = values[-1] if isinstance(values, list) else values
+        for name, value in (raw.get("headers") or {}).items():
+            headers[name.lower()] = value
+        self.headers = headers
+        body = raw.get("body") or ""
+        if raw.get("isBase64Encoded"):
+            body = base64.b64decode(body).decode()
+        self.text = body
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class LambdaHarness:
+    """
+    Drives api.lambda_handler in-process. Construct via the `lambda_harness`
+    fixture, which installs the fake provider, JWKS and AWS clients first.
+    """
+
+    def __init__(self, api_module, jwks=None, api_version="v1"):
+        self.api = api_module
+        self.jwks = jwks
+        self.prefix = f"/{api_version}"
+
+    def token(self, username="harness-user", groups=("user",), **claims):
+        return self.jwks.issue_token(username=username, groups=groups, **claims)
+
+    def auth_headers(self, username="harness-user", groups=("user",), **claims):
+        return {"Authorization": f"Bearer {self.token(username, groups, **claims)}"}
+
+    def invoke(self, method, path, headers=None, body=None, query=None, timeout_ms=30000):
+        if not path.startswith(self.prefix + "/"):
+            path = self.prefix + path
+        event = make_event(method, path, headers=headers, body=body, query=query)
+        raw = self.api.lambda_handler(event, FakeLambdaContext(timeout_ms))
+        return HarnessResponse(raw)
+
+    def get(self, path, **kwargs):
+        return self.invoke("GET", path, **kwargs)
+
+    def post(self, path, body=None, **kwargs):
+        return self.invoke("POST", path, body=body, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.invoke("DELETE", path, **kwargs)
+
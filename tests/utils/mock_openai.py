@@ -0,0 +1,130 @@
+"""Local OpenAI-compatible mock server for offline CLI tests."""
+
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Serves /v1/models, /v1/chat/completions (optionally streamed) and /v1/embeddings."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _expired(self):
+        """With check_expiry, whether the bearer token is a JWT past its `exp`."""
+        if not self.server.check_expiry:
+            return False
+        token = (self.headers.get("Authorization") or "").removeprefix("Bearer ")
+        try:
+            payload = token.split(".")[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+            return float(claims["exp"]) < time.time()
+        except (IndexError, KeyError, TypeError, ValueError):
+            return False
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path, dict(self.headers), None))
+        if self._expired():
+            # As the API does for an expired Cognito JWT.
+            self._send_json(403, {"error": "Invalid or expired Cognito JWT: Signature has expired"})
+        elif self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"data": [{"id": "mock-model"}]}, {"ETag": '"mock"'})
+        else:
+            self._send_json(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        body = self._read_json()
+        self.server.requests.append(("POST", self.path, dict(self.headers), body))
+        time.sleep(self.server.latency)
+        if self._expired():
+            self._send_json(403, {"error": "Invalid or expired Cognito JWT: Signature has expired"})
+        elif self.path.endswith("/chat/completions"):
+            if body.get("stream"):
+                return self._stream_chat()
+            self._send_json(
+                200,
+                {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}}],
+                    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+                },
+            )
+        elif self.path.endswith("/embeddings"):
+            self._send_json(
+                200,
+                {
+                    "object": "list",
+                    "data": [{"object": "embedding", "index": 0, "embedding": [0.0, 1.0]}],
+                    "usage": {"prompt_tokens": 3, "total_tokens": 3},
+                },
+            )
+        else:
+            self._send_json(404, {"message": "Not Found"})
+
+    def _stream_chat(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for n, token in enumerate(self.server.stream_tokens):
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            if n == len(self.server.stream_tokens) - 1:
+                chunk["usage"] = {"prompt_tokens": 5, "completion_tokens": n + 1}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class MockOpenAIServer:
+    """
+    Runs MockOpenAIHandler on an ephemeral localhost port in a background thread.
+    Use as a context manager; `url` is the base URL including /v1. With
+    check_expiry, requests bearing an expired JWT get 403.
+    """
+
+    def __init__(self, latency=0.0, stream_tokens=("Hello", " world"), check_expiry=False):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), MockOpenAIHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.stream_tokens = list(stream_tokens)
+        self.httpd.check_expiry = check_expiry
+        self.httpd.requests = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()